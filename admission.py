@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+
+import httpx
+from fastapi.responses import JSONResponse
+from starlette import status
+
+# Admission control in front of every upstream (each SLAMTEC controller and
+# the medicalbot backend). A request waits for a slot in its priority class;
+# when the class queue is full or the wait exceeds its limit it is shed and
+# the client gets 429 with Retry-After instead of a pile-up of timeouts. A
+# shed after the request already sent a write upstream is answered with 503
+# and the writes that went out, since retrying it blindly is not safe.
+PRIORITY_HIGH = 0       # capture and navigation
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2        # status polling
+PRIORITY_NAMES = ("high", "normal", "low")
+
+QUEUE_TIMEOUT = {PRIORITY_HIGH: 5.0, PRIORITY_NORMAL: 2.0, PRIORITY_LOW: 0.5}    # seconds
+MAX_QUEUE = {PRIORITY_HIGH: 64, PRIORITY_NORMAL: 32, PRIORITY_LOW: 16}
+RETRY_AFTER_SECONDS = 1
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Routes that read robot status; everything not listed is NORMAL
+LOW_PRIORITY_ROUTES = (
+    "/webhook/battery-status/", "/webhook/battery-health/", "/webhook/robot-state/",
+    "/webhook/robots/", "/webhook/health-check/", "/webhook/map/", "/webhook/poi-distances/",
+    "/webhook/trajectory/", "/webhook/admission/", "/webhook/pois/", "/webhook/arm-state/",
+    "/webhook/outbox/", "/webhook/profiling/",
+)
+HIGH_PRIORITY_ROUTES = (
+    "/webhook/trigger-slot-position/", "/webhook/create-room-entry-position/",
+    "/webhook/create-room-exit-position/", "/webhook/skip-slot/",
+)
+
+_current_priority = contextvars.ContextVar("current_priority", default=PRIORITY_NORMAL)
+_current_shed = contextvars.ContextVar("current_shed", default=None)
+_current_writes = contextvars.ContextVar("current_writes", default=None)
+
+admission_controllers = {}
+
+
+class Overloaded(httpx.TransportError):
+    """Raised instead of sending when an upstream's admission queue sheds the call."""
+
+    def __init__(self, message: str, request=None, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(message, request=request)
+        self.retry_after = retry_after
+
+
+def route_priority(path: str) -> int:
+    if path.startswith(HIGH_PRIORITY_ROUTES):
+        return PRIORITY_HIGH
+    if path.startswith(LOW_PRIORITY_ROUTES):
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def set_priority(priority: int):
+    """Priority for upstream calls made from the current task (and tasks it creates)."""
+    return _current_priority.set(priority)
+
+
+class AdmissionController:
+    """A concurrency limit with one FIFO queue per priority class; a freed
+    slot always goes to the oldest waiter of the highest waiting class."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self.queues = {priority: deque() for priority in QUEUE_TIMEOUT}
+        self.admitted = {priority: 0 for priority in QUEUE_TIMEOUT}
+        self.shed_full = {priority: 0 for priority in QUEUE_TIMEOUT}
+        self.shed_timeout = {priority: 0 for priority in QUEUE_TIMEOUT}
+        self.max_wait = {priority: 0.0 for priority in QUEUE_TIMEOUT}
+        admission_controllers[name] = self
+
+    def _next_waiter(self):
+        for priority in sorted(self.queues):
+            if self.queues[priority]:
+                return self.queues[priority].popleft()
+        return None
+
+    def release(self):
+        waiter = self._next_waiter()
+        if waiter is not None:
+            # Hand the slot over directly, in_use stays the same
+            waiter.set_result(None)
+        else:
+            self.in_use -= 1
+
+    async def acquire(self, priority: int = None, request=None):
+        priority = _current_priority.get() if priority is None else priority
+        # Queues only hold live waiters, so a free slot with empty queues is ours
+        if self.in_use < self.limit and not any(self.queues.values()):
+            self.in_use += 1
+            self.admitted[priority] += 1
+            return
+
+        queue = self.queues[priority]
+        if len(queue) >= MAX_QUEUE[priority]:
+            self.shed_full[priority] += 1
+            raise Overloaded(f"{self.name} queue for {PRIORITY_NAMES[priority]} priority is full", request=request)
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), QUEUE_TIMEOUT[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as we gave up, pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                queue.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.shed_timeout[priority] += 1
+            raise Overloaded(f"{self.name} queue wait exceeded {QUEUE_TIMEOUT[priority]}s", request=request) from None
+
+        self.admitted[priority] += 1
+        self.max_wait[priority] = max(self.max_wait[priority], time.monotonic() - started)
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "queued": {PRIORITY_NAMES[p]: len(q) for p, q in self.queues.items()},
+            "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+            "shed_queue_full": {PRIORITY_NAMES[p]: n for p, n in self.shed_full.items()},
+            "shed_timeout": {PRIORITY_NAMES[p]: n for p, n in self.shed_timeout.items()},
+            "max_wait_ms": {PRIORITY_NAMES[p]: round(v * 1000, 1) for p, v in self.max_wait.items()},
+        }
+
+
+class AdmissionTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport so every call goes through an AdmissionController."""
+
+    def __init__(self, controller: AdmissionController, transport: httpx.AsyncBaseTransport):
+        self.controller = controller
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        await admit(self.controller, request)
+        try:
+            return await self.transport.handle_async_request(request)
+        finally:
+            self.controller.release()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+async def admit(controller: AdmissionController, request=None):
+    try:
+        await controller.acquire(request=request)
+    except Overloaded as e:
+        shed = _current_shed.get()
+        if shed is not None:
+            shed.append(e)
+        raise
+    # Once admitted a write may reach the upstream, whatever happens to the response
+    writes = _current_writes.get()
+    if writes is not None and request is not None and request.method not in SAFE_METHODS:
+        writes.append(f"{request.method} {request.url}")
+
+
+def shed_handled(error):
+    """Called by code that catches a shed call and carries on without it, so
+    a later unrelated error response of the request is not rewritten."""
+    shed = _current_shed.get()
+    if shed is not None and error in shed:
+        shed.remove(error)
+
+
+class AdmissionMiddleware:
+    """Sets the request's priority class and turns a shed upstream call that
+    nobody handled (see shed_handled) into 429 + Retry-After when the handler
+    answered with an error. A handler that
+    got past the shed keeps its response; one that fails after a write was
+    admitted gets 503 listing the writes, as the request was partly applied."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        shed = []
+        writes = []
+        priority_token = _current_priority.set(route_priority(scope["path"]))
+        shed_token = _current_shed.set(shed)
+        writes_token = _current_writes.set(writes)
+        replaced = False
+
+        async def guarded_send(message):
+            nonlocal replaced
+            if message["type"] == "http.response.start" and shed and message["status"] >= 400:
+                replaced = True
+                if writes:
+                    response = JSONResponse(
+                        {'status': 'error', 'message': f'Upstream busy after a partial update: {shed[0]}', 'data': {'applied': writes}},
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={"Retry-After": str(shed[0].retry_after)},
+                    )
+                else:
+                    response = JSONResponse(
+                        {'status': 'error', 'message': f'Upstream busy: {shed[0]}', 'data': None},
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": str(shed[0].retry_after)},
+                    )
+                return await response(scope, receive, send)
+            if replaced:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, guarded_send)
+        finally:
+            _current_priority.reset(priority_token)
+            _current_shed.reset(shed_token)
+            _current_writes.reset(writes_token)
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import time
+
+import websockets
+
+from flight_recorder import open_recorder
+
+# Latest arm / joint state, pushed by the arm's socket server and kept in
+# memory so request handlers can check readiness without any I/O.
+ARM_CHANNELS = {
+    "arm-status": "ws://192.168.1.73:8000/ws/socket-server/refresh-arm-data-value/",
+    "joint-status": "ws://192.168.1.73:8000/ws/socket-server/refresh-joint-data-value/",
+    "arm-endpose": "ws://192.168.1.33:8000/ws/socket-server/arm-endpose-value/",
+}
+# The refresh channels only send on change, so a connected channel's last
+# frame stays current however old it is; once the connection drops it
+# counts for this long (covering a reconnect) before the state is unknown.
+ARM_STATE_MAX_AGE = 5.0
+RETRY_SECONDS = 2
+
+# What a room entry/exit capture does while the state is unknown: "proceed"
+# (log a warning, the pre-cache behaviour) or "refuse" (503 unless forced)
+ARM_UNKNOWN_ENV = "ROS_WEBHOOK_ARM_UNKNOWN"
+PROCEED = "proceed"
+REFUSE = "refuse"
+
+READY = "ready"
+NOT_READY = "not_ready"
+UNKNOWN = "unknown"
+
+# Channels that must be fresh and healthy for the arm to count as ready
+READINESS_CHANNELS = ("arm-status", "joint-status")
+
+OK_WORDS = {"ok", "ready", "idle", "success", "completed", "done", "normal", "true"}
+FAULT_WORDS = {"error", "fault", "failed", "failure", "busy", "moving", "collision", "estop", "emergency", "false"}
+STATUS_KEYS = ("status", "arm_status", "state", "ready", "is_ready", "success")
+FAULT_KEYS = ("error", "errors", "fault", "faults", "error_code", "collision", "estop")
+
+
+def _is_set(value) -> bool:
+    if isinstance(value, (dict, list)):
+        return any(_is_set(v) for v in (value.values() if isinstance(value, dict) else value))
+    return bool(value) and str(value).strip().lower() not in ("0", "none", "false", "ok")
+
+
+def frame_ok(data):
+    """(ok, reason) for one status frame. Frames of unknown shape count as ok;
+    only an explicit fault or a not-ready status blocks."""
+    if isinstance(data, list):
+        for item in data:
+            ok, reason = frame_ok(item)
+            if not ok:
+                return ok, reason
+        return True, None
+    if not isinstance(data, dict):
+        return True, None
+
+    for key in FAULT_KEYS:
+        if key in data and _is_set(data[key]):
+            return False, f"{key}: {data[key]}"
+    for key in STATUS_KEYS:
+        if key not in data:
+            continue
+        value = data[key]
+        if isinstance(value, bool):
+            return value, None if value else f"{key} is false"
+        word = str(value).strip().lower()
+        if word in FAULT_WORDS:
+            return False, f"{key}: {value}"
+        if word in OK_WORDS:
+            return True, None
+    # {"data": {...}} and per-joint dicts
+    for value in data.values():
+        if isinstance(value, (dict, list)):
+            ok, reason = frame_ok(value)
+            if not ok:
+                return ok, reason
+    return True, None
+
+
+def unknown_policy() -> str:
+    return REFUSE if os.environ.get(ARM_UNKNOWN_ENV, "").strip().lower() == REFUSE else PROCEED
+
+
+class ArmStateCache:
+    def __init__(self, max_age: float = ARM_STATE_MAX_AGE):
+        self.max_age = max_age
+        self.latest = {}        # channel -> (data, monotonic received, ok, reason)
+        self.disconnected = {}  # channel -> monotonic time its connection dropped
+        self.listener = None    # multi-worker poller: called with export() after each update
+        self.source = None      # multi-worker worker: shared state with the poller's read_arm()
+
+    def update(self, channel: str, data):
+        ok, reason = frame_ok(data)
+        self.latest[channel] = (data, time.monotonic(), ok, reason)
+        if self.listener is not None:
+            self.listener(self.export())
+
+    def connected(self, channel: str):
+        self.disconnected.pop(channel, None)
+        if self.listener is not None:
+            self.listener(self.export())
+
+    def lost(self, channel: str):
+        self.disconnected.setdefault(channel, time.monotonic())
+        if self.listener is not None:
+            self.listener(self.export())
+
+    def export(self) -> dict:
+        """Channel entries without the frames, wall-clock stamped for another process."""
+        now, wall = time.monotonic(), time.time()
+        entries = {channel: [wall - (now - received), ok, reason, None] for channel, (_, received, ok, reason) in self.latest.items()}
+        for channel, since in self.disconnected.items():
+            entries.setdefault(channel, [None, True, None, None])[3] = wall - (now - since)
+        return entries
+
+    def _sync(self):
+        entries = self.source.read_arm() or {}
+        now, wall = time.monotonic(), time.time()
+        self.latest = {
+            channel: (None, now - (wall - ts), ok, reason)
+            for channel, (ts, ok, reason, _) in entries.items() if ts is not None
+        }
+        self.disconnected = {channel: now - (wall - lost) for channel, (_, _, _, lost) in entries.items() if lost is not None}
+
+    def check(self):
+        """(state, reason) with state READY, NOT_READY or UNKNOWN (nothing
+        received yet, or disconnected for longer than max_age); a dict lookup
+        and a clock read per channel, no I/O."""
+        if self.source is not None:
+            self._sync()
+        now = time.monotonic()
+        for channel in READINESS_CHANNELS:
+            entry = self.latest.get(channel)
+            if entry is None:
+                return UNKNOWN, f"no {channel} received"
+            _, received, ok, reason = entry
+            lost = self.disconnected.get(channel)
+            if lost is not None and now - lost > self.max_age:
+                return UNKNOWN, f"{channel} disconnected {now - lost:.1f}s ago"
+            if not ok:
+                return NOT_READY, f"{channel}: {reason}"
+        return READY, None
+
+    def snapshot(self) -> dict:
+        if self.source is not None:
+            self._sync()
+        now = time.monotonic()
+        return {
+            channel: {
+                "data": data, "age": round(now - received, 3), "ok": ok, "reason": reason,
+                "connected": channel not in self.disconnected,
+            }
+            for channel, (data, received, ok, reason) in self.latest.items()
+        }
+
+
+arm_state = ArmStateCache()
+
+
+async def follow_channel(channel: str, uri: str, cache: ArmStateCache = arm_state):
+    # Black-boxed like the standalone receivers, under this follower's channel name
+    recorder = open_recorder(channel)
+    while True:
+        try:
+            async with websockets.connect(uri, ping_interval=5, ping_timeout=5) as websocket:
+                print(f"Connected to {channel} channel for the arm state cache")
+                cache.connected(channel)
+                async for message in websocket:
+                    if recorder:
+                        recorder.record(message)
+                    try:
+                        cache.update(channel, json.loads(message))
+                    except json.JSONDecodeError:
+                        continue
+        except websockets.exceptions.ConnectionClosed as e:
+            print(f"{channel} connection closed: {e.code} - {e.reason}")
+        except (ConnectionRefusedError, OSError) as e:
+            print(f"{channel} connection error: {e}")
+        except Exception as e:
+            # Rejected handshakes (InvalidStatus, InvalidHandshake) and anything else: retry, never give up
+            print(f"{channel} unhandled error: {e!r}")
+        cache.lost(channel)
+        await asyncio.sleep(RETRY_SECONDS)
+
+
+async def run_arm_channels(channels: dict = None, cache: ArmStateCache = arm_state):
+    channels = ARM_CHANNELS if channels is None else channels
+    await asyncio.gather(*(follow_channel(name, uri, cache) for name, uri in channels.items()))
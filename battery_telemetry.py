@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import numpy as np
+
+from admission import PRIORITY_LOW, set_priority
+
+# Battery history per robot, filled by a background sampler so the health
+# endpoint only ever reads memory. One row per sample in a fixed NumPy ring.
+SAMPLE_INTERVAL = 5.0
+HISTORY_SAMPLES = 8640          # 12 h at SAMPLE_INTERVAL
+RATE_WINDOWS = (300, 900, 3600)  # seconds, rolling discharge rate windows
+TIME_LEFT_WINDOW = 900          # seconds of discharge used for the time-left regression
+MIN_REGRESSION_SAMPLES = 3
+
+COLUMNS = ("t", "charge", "voltage", "current", "temperature", "charging")
+
+# power/status field names seen across SLAMTEC firmware versions; anything
+# missing is stored as NaN
+FIELDS = {
+    "charge": ("batteryPercentage", "percentage", "charge"),
+    "voltage": ("batteryVoltage", "voltage"),
+    "current": ("batteryCurrent", "current"),
+    "temperature": ("batteryTemperature", "temperature"),
+}
+
+
+def _pick(status: dict, names) -> float:
+    for name in names:
+        value = status.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+    return np.nan
+
+
+def _is_charging(status: dict) -> bool:
+    return bool(status.get("isCharging")) or (status.get("dockingStatus") == "on_dock" and bool(status.get("isDCConnected")))
+
+
+class BatteryHistory:
+    def __init__(self, capacity: int = HISTORY_SAMPLES):
+        self.data = np.full((capacity, len(COLUMNS)), np.nan)
+        self.capacity = capacity
+        self.count = 0
+        self.latest = None      # last raw power/status payload
+
+    def append(self, status: dict, t: float = None):
+        row = self.count % self.capacity
+        self.data[row] = (
+            t if t is not None else time.time(),
+            *(_pick(status, FIELDS[name]) for name in ("charge", "voltage", "current", "temperature")),
+            1.0 if _is_charging(status) else 0.0,
+        )
+        self.count += 1
+        self.latest = status
+
+    def samples(self) -> np.ndarray:
+        """All buffered rows, oldest first."""
+        if self.count <= self.capacity:
+            return self.data[:self.count]
+        row = self.count % self.capacity
+        return np.concatenate([self.data[row:], self.data[:row]])
+
+    def last_t(self):
+        return float(self.data[(self.count - 1) % self.capacity, 0]) if self.count else None
+
+    def health(self) -> dict:
+        rows = self.samples()
+        if not len(rows):
+            return None
+        t, charge, voltage, current, temperature, charging = rows.T
+        last = rows[-1]
+        now = last[0]
+
+        # Discharge segment: samples since the robot last stopped charging
+        plugged = np.flatnonzero(charging > 0)
+        start = plugged[-1] + 1 if len(plugged) else 0
+        valid = ~np.isnan(charge)
+        valid[:start] = False
+
+        # Least-squares slope of charge over time for every window at once
+        windows = np.asarray(RATE_WINDOWS + (TIME_LEFT_WINDOW,), dtype=np.float64)
+        mask = (t[None, :] >= now - windows[:, None]) & valid[None, :]
+        n = mask.sum(axis=1)
+        x = np.where(mask, t - now, 0.0)
+        y = np.where(mask, charge, 0.0)
+        sx, sy = x.sum(axis=1), y.sum(axis=1)
+        denominator = n * (x * x).sum(axis=1) - sx * sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(
+                (n >= MIN_REGRESSION_SAMPLES) & (denominator > 0),
+                (n * (x * y).sum(axis=1) - sx * sy) / denominator,
+                np.nan,
+            )  # % per second
+
+        rates = {f"{int(w)}s": None if np.isnan(s) else round(float(-s * 3600), 3) for w, s in zip(windows[:-1], slope[:-1])}
+
+        time_left = None
+        fit = slope[-1]
+        if not np.isnan(fit) and fit < 0 and not last[5]:
+            # Where the regression line, not the last noisy reading, hits zero
+            mask_fit = mask[-1]
+            intercept = (y[-1][mask_fit].sum() - fit * x[-1][mask_fit].sum()) / n[-1]
+            time_left = max(0, int(intercept / -fit))
+
+        def value(v):
+            return None if np.isnan(v) else round(float(v), 3)
+
+        power = last[2] * last[3]
+        return {
+            "charge": value(last[1]),
+            "voltage": value(last[2]),
+            "current": value(last[3]),
+            "power": value(power),
+            "temperature": value(last[4]),
+            "is_charging": bool(last[5]),
+            "discharge_rate_pct_per_hour": rates,
+            "time_left": time_left,
+            "temperature_max": value(np.nanmax(temperature)) if not np.isnan(temperature).all() else None,
+            "voltage_min": value(np.nanmin(voltage)) if not np.isnan(voltage).all() else None,
+            "count": int(len(rows)),
+            "sampled_at": float(now),
+            "age": round(float(time.time() - now), 3),
+        }
+
+
+battery_histories = {}
+
+
+def history_for(robot_id: str) -> BatteryHistory:
+    history = battery_histories.get(robot_id)
+    if history is None:
+        history = battery_histories[robot_id] = BatteryHistory()
+    return history
+
+
+async def _sample(robot, shared_state):
+    history = history_for(robot.robot_id)
+
+    # In multi-worker mode the poller already fetches power/status; copy its readings, never call upstream
+    if shared_state is not None:
+        snapshot = shared_state.read(robot.robot_id)
+        if snapshot and snapshot["battery"] is not None and snapshot["battery_ts"] != history.last_t():
+            history.append(snapshot["battery"], snapshot["battery_ts"])
+        return
+
+    resp = await robot.client.get(robot.fetch_battery_status)
+    resp.raise_for_status()
+    history.append(resp.json())
+
+
+async def run_sampler(registry, shared_state=None, interval: float = SAMPLE_INTERVAL):
+    """Sample every robot's battery until cancelled, all robots concurrently."""
+    set_priority(PRIORITY_LOW)
+    while True:
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(_sample(robot, shared_state) for robot in list(registry.robots.values())),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Battery sample failed: {result}")
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+import request_tracing
+import webhook_server
+from robot_registry import Robot
+
+# One local SLAMTEC stand-in serves every robot under /<robot_id>/...; robot r0
+# is deliberately slow so cross-robot head-of-line blocking would show up in
+# the other robots' latencies.
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 9300
+SLOW_ROBOT = "r0"
+SLOW_LATENCY = 0.5
+FAST_LATENCY = 0.01
+
+stub = FastAPI()
+
+
+@stub.get("/{robot_id}/api/core/system/v1/power/status")
+async def power_status(robot_id: str):
+    await asyncio.sleep(SLOW_LATENCY if robot_id == SLOW_ROBOT else FAST_LATENCY)
+    return {"batteryPercentage": 80, "dockingStatus": "not_on_dock", "isCharging": False}
+
+
+def start_stub():
+    # Separate process so the stub does not compete with the gateway for the GIL
+    process = multiprocessing.Process(
+        target=uvicorn.run, args=(stub,), kwargs={"host": STUB_HOST, "port": STUB_PORT, "log_level": "warning"},
+        daemon=True,
+    )
+    process.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://{STUB_HOST}:{STUB_PORT}/r1/api/core/system/v1/power/status")
+            break
+        except httpx.RequestError:
+            time.sleep(0.05)
+    return process
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+
+
+async def run_fleet(robot_count: int, rate: float, duration: float) -> dict:
+    registry = webhook_server.robot_registry
+    await registry.close()
+    registry.robots.clear()
+    for i in range(robot_count):
+        registry.add(Robot(f"r{i}", f"http://{STUB_HOST}:{STUB_PORT}/r{i}"))
+
+    latencies = {robot_id: [] for robot_id in registry.robots}
+    errors = 0
+    transport = httpx.ASGITransport(app=webhook_server.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway", timeout=30) as client:
+        async def poll(robot_id):
+            nonlocal errors
+            start = time.perf_counter()
+            response = await client.get(f"/robots/{robot_id}/webhook/battery-status/")
+            if response.status_code != 200:
+                errors += 1
+            latencies[robot_id].append(time.perf_counter() - start)
+
+        async def tablet(robot_id, offset):
+            # Open loop: requests go out on schedule even if earlier ones are stuck
+            tasks = []
+            start = time.monotonic() + offset
+            for k in range(int(duration * rate)):
+                await asyncio.sleep(max(0.0, start + k / rate - time.monotonic()))
+                tasks.append(asyncio.create_task(poll(robot_id)))
+            await asyncio.gather(*tasks)
+
+        robot_ids = list(latencies)
+        await asyncio.gather(*(tablet(robot_id, i / (rate * len(robot_ids))) for i, robot_id in enumerate(robot_ids)))
+
+    fast = [v for robot_id, values in latencies.items() if robot_id != SLOW_ROBOT for v in values]
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "robots": robot_count,
+        "req_per_s": round(total / duration),
+        "fast_p50_ms": percentile(fast, 0.50),
+        "fast_p99_ms": percentile(fast, 0.99),
+        "slow_p50_ms": percentile(latencies[SLOW_ROBOT], 0.50),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scale the webhook gateway from 1 to N robots against local stubs")
+    parser.add_argument("--robots", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--rate", type=float, default=5.0, help="status polls per second per robot")
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    request_tracing.TRACE_SAMPLE_RATE = 0
+    process = start_stub()
+
+    async def run_all():
+        for count in args.robots:
+            print(await run_fleet(count, args.rate, args.duration))
+        await webhook_server.robot_registry.close()
+
+    try:
+        asyncio.run(run_all())
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
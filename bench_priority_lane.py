@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import websockets
+
+from priority_lane import LatencyTracker, run_channel, run_channels, stamp_event
+
+# Local stand-ins for the socket server: one port streams arm telemetry as
+# fast as it can, the other sends stamped emergency events at a fixed period.
+# The fast lane runs on its own thread and loop, standing in for the
+# separate jetson_websocket_emergency_rec.py / websocket_help_rec.py process.
+HOST = "127.0.0.1"
+TELEMETRY_PORT = 8765
+EMERGENCY_PORT = 8766
+JOINTS = 7
+
+
+async def telemetry_server(websocket, *args):
+    frame = 0
+    try:
+        while True:
+            frame += 1
+            payload = {
+                "frame": frame,
+                "position": [0.1 * i for i in range(JOINTS)],
+                "velocity": [0.01 * i for i in range(JOINTS)],
+                "effort": [1.5 * i for i in range(JOINTS)],
+            }
+            await websocket.send(json.dumps(payload))
+            if frame % 50 == 0:
+                await asyncio.sleep(0)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
+def emergency_server(period: float):
+    async def handler(websocket, *args):
+        try:
+            while True:
+                await websocket.send(json.dumps(stamp_event({"status": "emergency", "room": "room_1"})))
+                await asyncio.sleep(period)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+    return handler
+
+
+async def consume_telemetry(uri: str, stats: dict):
+    # Same decode work the *_rec.py scripts do per frame
+    async with websockets.connect(uri, max_queue=None) as websocket:
+        async for message in websocket:
+            json.loads(message)
+            stats["frames"] += 1
+
+
+def ignore_event(channel, event):
+    pass
+
+
+async def run_case(shared_loop: bool, duration: float, period: float) -> dict:
+    tracker = LatencyTracker(window=100000)
+    stats = {"frames": 0}
+    emergency_uri = f"ws://{HOST}:{EMERGENCY_PORT}"
+
+    async with websockets.serve(telemetry_server, HOST, TELEMETRY_PORT), \
+            websockets.serve(emergency_server(period), HOST, EMERGENCY_PORT):
+        tasks = [asyncio.create_task(consume_telemetry(f"ws://{HOST}:{TELEMETRY_PORT}", stats))]
+        if shared_loop:
+            tasks.append(asyncio.create_task(run_channel("emergency", emergency_uri, ignore_event, tracker)))
+        else:
+            def record(channel, event):
+                tracker.record(event["latency_ms"])
+            threading.Thread(target=lambda: asyncio.run(run_channels({"emergency": emergency_uri}, record)),
+                             name="priority-lane", daemon=True).start()
+
+        await asyncio.sleep(duration)
+        for task in tasks:
+            task.cancel()
+
+    result = tracker.percentiles()
+    result["telemetry_fps"] = round(stats["frames"] / duration)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emergency delivery latency under full-rate arm telemetry")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--period", type=float, default=0.05, help="seconds between emergency events")
+    parser.add_argument("--bound-ms", type=float, default=50.0, help="required p99 latency of the fast lane")
+    args = parser.parse_args()
+
+    shared = asyncio.run(run_case(True, args.duration, args.period))
+    print(f"shared loop : {shared}")
+
+    fast = asyncio.run(run_case(False, args.duration, args.period))
+    print(f"fast lane   : {fast}")
+
+    if fast["p99"] is None or fast["p99"] > args.bound_ms:
+        print(f"❌ fast lane p99 exceeds {args.bound_ms} ms")
+        sys.exit(1)
+    print(f"✅ fast lane p99 within {args.bound_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
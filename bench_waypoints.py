@@ -0,0 +1,78 @@
+import argparse
+import json
+
+import move_to_location as nav
+from robot_simulator import PLAN_SECONDS, SETTLE_SECONDS, SPEED, SimClock, SimulatedRobot, SimulatorServer, create_app
+
+# Times each run_batch mode through the same rooms on the kinematic
+# simulator (robot_simulator.py): every action pays a planning delay, a stop
+# at a precise goal pays a settle time, and a series action passes its
+# intermediate waypoints without stopping. Results are in simulated seconds.
+PORT = 18448
+
+
+def bed_groups(rooms: int, beds: int, spacing: float) -> list:
+    groups = []
+    for room in range(rooms):
+        x0 = room * 6.0
+        groups.append([(f"room_{room}_entry", x0, 2.0, 0.0)])
+        groups.append([(f"room_{room}_bed_{bed}", x0 + bed * spacing, 0.0, -1.57) for bed in range(beds)])
+        groups.append([(f"room_{room}_exit", x0 + 1.0, 2.0, 3.14)])
+    return groups
+
+
+def run(mode: str, groups, scale: float, series: bool = True, handoff_radius: float = 0.0):
+    clock = SimClock(scale)
+    robot = SimulatedRobot(clock, series=series)
+    with SimulatorServer(create_app(robot), port=PORT) as server:
+        nav.route_unsupported.clear()
+        started = clock.now()
+        results = nav.run_batch(groups, navigation_url=f"{server.base_url}/api/core/motion/v1/actions", mode=mode,
+                                pose_url=f"{server.base_url}/api/core/slam/v1/localization/pose",
+                                publish_status_callback=lambda msg: None, handoff_radius=handoff_radius)
+        total = clock.now() - started
+    return total, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time through a scheduler batch per submission mode, on a simulated controller")
+    parser.add_argument("--scheduler", metavar="FILE", help="use the latest batch of a scheduler_data.json instead of a synthetic one")
+    parser.add_argument("--rooms", type=int, default=2)
+    parser.add_argument("--beds", type=int, default=4)
+    parser.add_argument("--spacing", type=float, default=1.2, help="metres between beds")
+    parser.add_argument("--time-scale", type=float, default=10.0, help="simulated seconds per wall second")
+    parser.add_argument("--handoff-radius", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.scheduler:
+        with open(args.scheduler) as f:
+            batches = json.load(f)
+        groups = nav.scheduler_groups(batches[-1] if isinstance(batches, list) else batches)
+    else:
+        groups = bed_groups(args.rooms, args.beds, args.spacing)
+
+    # Polling runs on wall time; scale it so it costs the same in simulated seconds
+    nav.POLL_INTERVAL_SECONDS /= args.time_scale
+    nav.PIPELINE_POLL_SECONDS /= args.time_scale
+
+    cases = [
+        ("single", "single", True, 0.0),
+        ("pipelined", "pipelined", True, 0.0),
+        ("pipelined, wider handoff", "pipelined", True, args.handoff_radius),
+        ("route", "route", True, 0.0),
+        ("route, no series support", "route", False, 0.0),
+    ]
+    legs = sum(len(group) for group in groups)
+    baseline = None
+    print(f"{legs} waypoints in {len(groups)} groups, speed {SPEED} m/s, plan {PLAN_SECONDS} s, settle {SETTLE_SECONDS} s")
+    for label, mode, series, radius in cases:
+        total, results = run(mode, groups, args.time_scale, series, radius)
+        ok = sum(1 for r in results if r["ok"])
+        baseline = baseline or total
+        per_leg = ", ".join(f"{r['leg_s'] * args.time_scale:.1f}" for r in results)
+        print(f"{label:<26} {total:7.1f} s  saved {baseline - total:6.1f} s ({100 * (baseline - total) / baseline:4.1f}%)  "
+              f"{ok}/{legs} ok  legs [{per_leg}]")
+
+
+if __name__ == "__main__":
+    main()
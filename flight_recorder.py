@@ -0,0 +1,217 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+# Black-box recording of every websocket frame. Each receiver process owns one
+# fixed-size ring file per channel under flight_recorder/, memory-mapped so a
+# write is a memcpy into the page cache: it does not block the receive loop
+# and what was written survives a crash of the process.
+#
+# File layout: one HEADER page, then the ring. Records are 8-byte aligned:
+#   RECORD header | channel bytes | frame bytes | padding
+# crc32 covers everything after the crc field, so a record torn by a crash
+# or half overwritten by the wrapping writer is skipped on extraction.
+FLIGHT_RECORDER_DIR = "flight_recorder"
+RING_BYTES = 16 * 1024 * 1024
+MAX_FRAME_BYTES = 64 * 1024
+
+FILE_MAGIC = b"FLTR"
+RECORD_MAGIC = b"FREC"
+HEADER = struct.Struct("<4sIQQQ")       # magic, version, capacity, write offset, next seq
+HEADER_BYTES = mmap.PAGESIZE
+RECORD = struct.Struct("<4sIIQqqHH")    # magic, length, crc32, seq, monotonic ns, wall ns, channel length, flags
+TRUNCATED = 1
+
+
+def _aligned(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class FlightRecorder:
+    def __init__(self, channel: str, path: str, size: int = RING_BYTES):
+        self.channel = channel
+        self.path = path
+        self._channel = channel.encode()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != HEADER_BYTES + size:
+                os.ftruncate(fd, HEADER_BYTES + size)
+                fresh = True
+            else:
+                fresh = False
+            self._map = mmap.mmap(fd, HEADER_BYTES + size)
+        finally:
+            os.close(fd)
+
+        magic, _, capacity, offset, seq = HEADER.unpack_from(self._map, 0)
+        if fresh or magic != FILE_MAGIC or capacity != size:
+            capacity, offset, seq = size, 0, 0
+            HEADER.pack_into(self._map, 0, FILE_MAGIC, 1, capacity, offset, seq)
+        self.capacity = capacity
+        self.offset = offset
+        self.seq = seq
+
+    def record(self, frame):
+        """Append one received frame (str or bytes) with its timestamps."""
+        mono_ns, wall_ns = time.monotonic_ns(), time.time_ns()
+        payload = frame.encode() if isinstance(frame, str) else bytes(frame)
+        flags = 0
+        if len(payload) > MAX_FRAME_BYTES:
+            payload, flags = payload[:MAX_FRAME_BYTES], TRUNCATED
+
+        length = RECORD.size + len(self._channel) + len(payload)
+        span = _aligned(length)
+
+        with self._lock:
+            offset = self.offset
+            if offset + span > self.capacity:
+                # Not enough room before the end, wrap to the start of the ring
+                offset = 0
+            start = HEADER_BYTES + offset
+
+            body = struct.pack("<QqqHH", self.seq, mono_ns, wall_ns, len(self._channel), flags) + self._channel + payload
+            crc = zlib.crc32(body)
+            self._map[start:start + 12] = RECORD_MAGIC + struct.pack("<II", length, crc)
+            self._map[start + 12:start + length] = body
+
+            self.seq += 1
+            self.offset = offset + span
+            struct.pack_into("<QQ", self._map, 16, self.offset, self.seq)
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
+
+
+def ring_path(channel: str, directory: str = FLIGHT_RECORDER_DIR) -> str:
+    return os.path.join(directory, f"{channel}.ring")
+
+
+def open_recorder(channel: str, directory: str = FLIGHT_RECORDER_DIR, size: int = RING_BYTES):
+    """Recorder for a receiver process, or None if the ring file cannot be opened."""
+    try:
+        return FlightRecorder(channel, ring_path(channel, directory), size)
+    except OSError as e:
+        print(f"❌ Flight recorder disabled for {channel}: {e}")
+        return None
+
+
+def read_ring(path: str) -> list:
+    """Every intact record in a ring file, oldest first."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER_BYTES or data[:4] != FILE_MAGIC:
+        return []
+    ring = memoryview(data)[HEADER_BYTES:]
+    raw = bytes(ring)
+
+    records = []
+    pos = raw.find(RECORD_MAGIC)
+    while pos >= 0 and pos + RECORD.size <= len(raw):
+        _, length, crc, seq, mono_ns, wall_ns, channel_len, flags = RECORD.unpack_from(raw, pos)
+        end = pos + length
+        if length >= RECORD.size + channel_len and end <= len(raw) and zlib.crc32(ring[pos + 12:end]) == crc:
+            channel_end = pos + RECORD.size + channel_len
+            records.append({
+                "seq": seq,
+                "t": wall_ns / 1e9,
+                "monotonic": mono_ns / 1e9,
+                "channel": raw[pos + RECORD.size:channel_end].decode(errors="replace"),
+                "truncated": bool(flags & TRUNCATED),
+                "frame": raw[channel_end:end],
+            })
+            pos = raw.find(RECORD_MAGIC, pos + _aligned(length))
+        else:
+            pos = raw.find(RECORD_MAGIC, pos + 1)
+
+    records.sort(key=lambda record: record["seq"])
+    return records
+
+
+def extract(directory: str = FLIGHT_RECORDER_DIR, channels=None, since: float = None, until: float = None) -> list:
+    """Frames from all rings in directory, filtered by channel and wall-clock window, in time order."""
+    frames = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if not name.endswith(".ring"):
+            continue
+        for record in read_ring(os.path.join(directory, name)):
+            if channels and record["channel"] not in channels:
+                continue
+            if since is not None and record["t"] < since:
+                continue
+            if until is not None and record["t"] > until:
+                continue
+            frames.append(record)
+    frames.sort(key=lambda record: record["t"])
+    return frames
+
+
+def _by_channel(records) -> dict:
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record["channel"], []).append(record)
+    return grouped
+
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.astimezone()
+        return parsed.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract frames from the websocket flight recorder")
+    parser.add_argument("--dir", default=FLIGHT_RECORDER_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ext = sub.add_parser("extract", help="dump frames as JSON lines")
+    ext.add_argument("--channel", action="append", help="repeat for several channels (default: all)")
+    ext.add_argument("--since", help="epoch seconds or ISO time")
+    ext.add_argument("--until", help="epoch seconds or ISO time")
+    ext.add_argument("--last", type=float, help="only the last N seconds")
+
+    sub.add_parser("stats", help="records and time span per channel")
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        since = _parse_time(args.since) if args.since else None
+        until = _parse_time(args.until) if args.until else None
+        if args.last:
+            since = (until or time.time()) - args.last
+        for record in extract(args.dir, args.channel, since, until):
+            frame = record["frame"].decode(errors="replace")
+            try:
+                frame = json.loads(frame)
+            except ValueError:
+                pass
+            print(json.dumps({
+                "t": datetime.fromtimestamp(record["t"]).isoformat(timespec="milliseconds"),
+                "monotonic": round(record["monotonic"], 6),
+                "channel": record["channel"],
+                "seq": record["seq"],
+                "truncated": record["truncated"],
+                "frame": frame,
+            }))
+
+    elif args.command == "stats":
+        for record_channel, records in _by_channel(extract(args.dir)).items():
+            first, last = records[0]["t"], records[-1]["t"]
+            print(f"{record_channel:<24} {len(records):>8} frames  "
+                  f"{datetime.fromtimestamp(first):%Y-%m-%d %H:%M:%S} .. {datetime.fromtimestamp(last):%Y-%m-%d %H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from robot_registry import current_robot
+
+try:
+    import brotli
+except ImportError:     # optional, gzip only without it
+    brotli = None
+
+# Negotiated compression for every response, plus ETag / Last-Modified and
+# 304 handling for GET routes. A body is compressed once per encoding and
+# kept in a byte-bounded LRU keyed by its hash, so unchanged maps and POI
+# lists cost a dictionary lookup after the first request.
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+LAST_MODIFIED_ENTRIES = 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def _encoders():
+    encoders = {}
+    if brotli is not None:
+        encoders["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    encoders["gzip"] = lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return encoders
+
+
+ENCODERS = _encoders()
+
+
+def negotiate(accept_encoding: str):
+    """Best supported encoding from an Accept-Encoding header, br before gzip on equal q."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.lower()] = q
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = offered.get(name, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+class CompressedBodyCache:
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str, encoding: str, body: bytes) -> bytes:
+        key = (digest, encoding)
+        compressed = self.entries.get(key)
+        if compressed is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return compressed
+
+        self.misses += 1
+        compressed = ENCODERS[encoding](body)
+        self.entries[key] = compressed
+        self.size += len(compressed)
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+        return compressed
+
+
+compressed_bodies = CompressedBodyCache()
+
+
+class CachingMiddleware:
+    """Pure ASGI. Buffers the (JSON) response, adds ETag / Last-Modified on
+    GET, answers conditional GETs with 304 and compresses what is sent."""
+
+    def __init__(self, app):
+        self.app = app
+        self.last_modified = OrderedDict()      # (robot, path, query) -> (etag, first seen)
+
+    def _last_modified(self, key, etag: str) -> float:
+        seen = self.last_modified.get(key)
+        if seen is None or seen[0] != etag:
+            seen = (etag, time.time())
+            self.last_modified[key] = seen
+        self.last_modified.move_to_end(key)
+        while len(self.last_modified) > LAST_MODIFIED_ENTRIES:
+            self.last_modified.popitem(last=False)
+        return seen[1]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        conditional = scope["method"] in ("GET", "HEAD")
+        start = None
+        chunks = []
+
+        async def buffered_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                await self._respond(scope, request_headers, conditional, start, b"".join(chunks), send)
+
+        await self.app(scope, receive, buffered_send)
+
+    async def _respond(self, scope, request_headers, conditional, start, body, send):
+        status_code = start["status"]
+        headers = [(name.lower(), value) for name, value in start.get("headers", [])]
+        names = {name for name, _ in headers}
+        content_type = next((value.decode("latin-1") for name, value in headers if name == b"content-type"), "")
+
+        if conditional and status_code == 200:
+            etag = next((value.decode("latin-1") for name, value in headers if name == b"etag"), None)
+            if etag is None:
+                etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+                headers.append((b"etag", etag.encode("latin-1")))
+            robot = current_robot()
+            key = (robot.robot_id if robot else None, scope["path"], scope.get("query_string", b""))
+            modified = self._last_modified(key, etag)
+            if b"last-modified" not in names:
+                headers.append((b"last-modified", formatdate(modified, usegmt=True).encode("latin-1")))
+
+            not_modified = False
+            if "if-none-match" in request_headers:
+                not_modified = _etag_matches(request_headers["if-none-match"], etag)
+            elif "if-modified-since" in request_headers:
+                try:
+                    not_modified = int(modified) <= parsedate_to_datetime(request_headers["if-modified-since"]).timestamp()
+                except (TypeError, ValueError):
+                    not_modified = False
+            if not_modified:
+                keep = {b"etag", b"last-modified", b"cache-control", b"vary"}
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [(name, value) for name, value in headers if name in keep or name.startswith(b"access-control-")],
+                })
+                return await send({"type": "http.response.body", "body": b""})
+
+        encoding = None
+        if (len(body) >= MIN_COMPRESS_BYTES and b"content-encoding" not in names
+                and content_type.startswith(COMPRESSIBLE_TYPES)):
+            encoding = negotiate(request_headers.get("accept-encoding", ""))
+            headers.append((b"vary", b"Accept-Encoding"))
+        if encoding:
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            body = compressed_bodies.get(digest, encoding, body)
+            headers = [(name, value) for name, value in headers if name != b"content-length"]
+            headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import functools
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from robot_registry import current_robot
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_SECONDS = 300
+IDEMPOTENCY_MAX_ENTRIES = 1024
+
+_current_key = contextvars.ContextVar("idempotency_key", default=None)
+
+
+class _Entry:
+    __slots__ = ("future", "expires_at")
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.expires_at = None
+
+
+class IdempotencyStore:
+    """Bounded key -> response store. In-flight keys hold a future that
+    duplicates wait on; completed keys are kept until their TTL expires."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _evict(self, now: float):
+        for key in [k for k, e in self._entries.items() if e.expires_at is not None and e.expires_at <= now]:
+            del self._entries[key]
+
+        # Drop the oldest completed entries first, never an in-flight one
+        while len(self._entries) > self.max_entries:
+            key = next((k for k, e in self._entries.items() if e.expires_at is not None), None)
+            if key is None:
+                break
+            del self._entries[key]
+
+    async def run(self, key: str, produce):
+        """Return (status_code, body, headers, replayed) for key, calling produce() at most once."""
+        while True:
+            self._evict(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                break
+            try:
+                status_code, body, headers = await asyncio.shield(entry.future)
+                return status_code, body, headers, True
+            except asyncio.CancelledError:
+                # The original request was cancelled, take over the work
+                if not entry.future.cancelled():
+                    raise
+
+        entry = _Entry()
+        self._entries[key] = entry
+        try:
+            response = await produce()
+        except BaseException as e:
+            self._entries.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                # Mark the exception retrieved so an unawaited future doesn't warn
+                entry.future.exception()
+            raise
+
+        # Headers the handler set (Retry-After, content type, ...) are replayed
+        # too; content-length is recomputed for the rebuilt response
+        headers = [(name, value) for name, value in response.raw_headers if name.lower() != b"content-length"]
+        result = (response.status_code, bytes(response.body), headers)
+        entry.future.set_result(result)
+        if 200 <= response.status_code < 300:
+            entry.expires_at = time.monotonic() + self.ttl
+        else:
+            # Failures are shared with concurrent duplicates but not stored,
+            # so a later retry does the work again
+            self._entries.pop(key, None)
+        return (*result, False)
+
+
+idempotency_store = IdempotencyStore()
+
+
+def current_poi_id() -> str:
+    """SLAM POI id for the current request: stable per idempotency key, random otherwise."""
+    key = _current_key.get()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key)) if key else str(uuid.uuid4())
+
+
+def idempotent(field: str, store: IdempotencyStore = idempotency_store):
+    """Run the wrapped handler once per Idempotency-Key header, falling back
+    to a key derived from the payload field (e.g. slot_id)."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                try:
+                    # Starlette caches the parsed body, the handler reuses it
+                    payload_rec = await request.json()
+                except Exception:
+                    payload_rec = None
+                value = payload_rec.get(field) if isinstance(payload_rec, dict) else None
+                if not value:
+                    return await handler(request)
+                key = f"{field}:{value}"
+
+            # POIs are per robot, so the same slot on two robots is two keys
+            robot = current_robot()
+            key = f"{robot.robot_id if robot else ''}:{request.url.path}:{key}"
+            token = _current_key.set(key)
+            try:
+                status_code, body, headers, replayed = await store.run(key, lambda: handler(request))
+            finally:
+                _current_key.reset(token)
+
+            response = Response(content=body, status_code=status_code)
+            response.raw_headers.extend(headers)
+            response.headers["Idempotent-Replayed"] = "true" if replayed else "false"
+            return response
+        return wrapper
+    return decorator
@@ -1,22 +1,40 @@
 import asyncio
 import websockets
 import json
+from flight_recorder import open_recorder
+import time
+
+REPORT_SECONDS = 10.0
 
 async def receive_chars():
     uri = "ws://192.168.1.33:8000/ws/socket-server/robot-distance-accuracy/"
+    recorder = open_recorder("robot-distance-accuracy")
 
     try:
         async with websockets.connect(uri, ping_interval=20, ping_timeout=30) as websocket:
             print("Connected to WebSocket server. Waiting for messages...")
 
+            received = 0
+            window_start = time.monotonic()
+
             while True:
                 message = await websocket.recv()
+                if recorder:
+                    recorder.record(message)
                 data = json.loads(message)
                 print(f"Received: {data}")
+
+                # Report the rate the publisher actually achieves on the wire
+                received += 1
+                elapsed = time.monotonic() - window_start
+                if elapsed >= REPORT_SECONDS:
+                    print(f"Receive rate: {received / elapsed:.2f} msg/s")
+                    received = 0
+                    window_start = time.monotonic()
     except websockets.exceptions.ConnectionClosed as e:
         print(f"WebSocket connection closed: {e.code} - {e.reason}")
     except Exception as e:
         print(f"Unhandled error: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(receive_chars())
\ No newline at end of file
+    asyncio.run(receive_chars())
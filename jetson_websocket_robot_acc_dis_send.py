@@ -1,20 +1,107 @@
+import argparse
 import asyncio
+import importlib
 import websockets
 import json
+import time
 
 URI = "ws://192.168.1.33:8000/ws/socket-server/robot-distance-accuracy/"
 
-async def send_input(websocket):
-    # ✅ Send both room and bed in one payload
-    payload = {
-        "accuracy": "20 %",
-        "distance": "58 CM"
+SAMPLE_HZ = 50              # how often the source is read
+MAX_SEND_HZ = 5             # never send faster than this
+HEARTBEAT_SECONDS = 2.0     # resend the latest value even if nothing changed
+ACCURACY_DEADBAND = 1.0     # percent
+DISTANCE_DEADBAND = 1.0     # CM
+REPORT_SECONDS = 10.0
+
+def load_source(spec: str):
+    """The sample source named "module:function". It is called SAMPLE_HZ times
+    a second on the event loop, so it must return at once: (accuracy percent,
+    distance CM) for the current reading, or None when there is no new one."""
+    module_name, _, function_name = spec.partition(":")
+    if not module_name or not function_name:
+        raise ValueError(f"expected module:function, got {spec!r}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+def format_payload(accuracy: float, distance: float) -> dict:
+    return {
+        "accuracy": f"{accuracy:.0f} %",
+        "distance": f"{distance:.0f} CM"
     }
 
-    await websocket.send(json.dumps(payload))
-    print(f"Sent: {payload}")
+class LatestValuePublisher:
+    """Coalesce samples to the latest value and decide when it is worth sending."""
+
+    def __init__(self, max_send_hz=MAX_SEND_HZ, heartbeat=HEARTBEAT_SECONDS,
+                 accuracy_deadband=ACCURACY_DEADBAND, distance_deadband=DISTANCE_DEADBAND):
+        self.min_interval = 1.0 / max_send_hz
+        self.heartbeat = heartbeat
+        self.accuracy_deadband = accuracy_deadband
+        self.distance_deadband = distance_deadband
+        self.latest = None
+        self.last_sent = None
+        self.last_sent_at = None
+        self.samples = 0
+        self.sends = 0
+        self.started_at = time.monotonic()
+
+    def offer(self, accuracy: float, distance: float):
+        self.latest = (accuracy, distance)
+        self.samples += 1
+
+    def due(self, now: float) -> bool:
+        if self.latest is None:
+            return False
+        if self.last_sent is None:
+            return True
+
+        elapsed = now - self.last_sent_at
+        if elapsed >= self.heartbeat:
+            return True
+        if elapsed < self.min_interval:
+            return False
+
+        accuracy, distance = self.latest
+        last_accuracy, last_distance = self.last_sent
+        return (abs(accuracy - last_accuracy) >= self.accuracy_deadband
+                or abs(distance - last_distance) >= self.distance_deadband)
+
+    def mark_sent(self, now: float):
+        self.last_sent = self.latest
+        self.last_sent_at = now
+        self.sends += 1
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "samples": self.samples,
+            "sends": self.sends,
+            "sample_hz": round(self.samples / elapsed, 2),
+            "send_hz": round(self.sends / elapsed, 2),
+            "reduction": round(self.samples / self.sends, 1) if self.sends else None
+        }
+
+async def send_input(websocket, read_sample, publisher=None):
+    publisher = publisher or LatestValuePublisher()
+    period = 1.0 / SAMPLE_HZ
+    next_report = time.monotonic() + REPORT_SECONDS
+
+    while True:
+        now = time.monotonic()
+        sample = read_sample()
+        if sample is not None:
+            publisher.offer(*sample)
+
+        if publisher.due(now):
+            payload = format_payload(*publisher.latest)
+            await websocket.send(json.dumps(payload))
+            publisher.mark_sent(now)
+
+        if now >= next_report:
+            print(f"Publisher stats: {publisher.stats()}")
+            next_report = now + REPORT_SECONDS
 
-    return "STOP"
+        await asyncio.sleep(max(0.0, period - (time.monotonic() - now)))
 
 async def receive(websocket):
     try:
@@ -23,14 +110,15 @@ async def receive(websocket):
     except Exception as e:
         print(f"Receive error: {e}")
 
-async def main_loop():
+async def main_loop(read_sample):
+    publisher = LatestValuePublisher()
     while True:
         try:
             print(f"Trying to connect to {URI}")
             async with websockets.connect(URI, ping_interval=20, ping_timeout=10) as websocket:
                 print("Connected to WebSocket server.")
 
-                send_task = asyncio.create_task(send_input(websocket))
+                send_task = asyncio.create_task(send_input(websocket, read_sample, publisher=publisher))
                 recv_task = asyncio.create_task(receive(websocket))
 
                 done, pending = await asyncio.wait(
@@ -41,17 +129,21 @@ async def main_loop():
                 for task in pending:
                     task.cancel()
 
-                if send_task.result() == "STOP":
-                    print("Finished sending all messages. Exiting...")
-                    return
+                if send_task in done:
+                    send_task.result()
 
         except (ConnectionRefusedError, OSError, websockets.exceptions.InvalidStatusCode) as e:
             print(f"Connection error: {e}")
         except Exception as e:
             print(f"Unexpected error: {e}")
 
+        # Force a fresh send of the latest value after reconnecting
+        publisher.last_sent = None
         print("Retrying in 3 seconds...\n")
         await asyncio.sleep(3)
 
 if __name__ == "__main__":
-    asyncio.run(main_loop())
+    parser = argparse.ArgumentParser(description="Publish the robot's accuracy/distance, rate-limited to the latest value")
+    parser.add_argument("source", help="module:function returning (accuracy percent, distance CM) or None")
+    args = parser.parse_args()
+    asyncio.run(main_loop(load_source(args.source)))
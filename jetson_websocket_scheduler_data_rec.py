@@ -1,10 +1,14 @@
 import asyncio
 import websockets
 import json
+from flight_recorder import open_recorder
+from scheduler_model import SchedulerState, load_progress, write_json
 from datetime import datetime
 
 async def receive_chars():
     uri = "ws://192.168.1.57:8000/ws/socket-server/scheduler-data/"
+    recorder = open_recorder("scheduler-data")
+    state = SchedulerState()
 
     try:
         async with websockets.connect(uri, ping_interval=20, ping_timeout=30) as websocket:
@@ -12,14 +16,43 @@ async def receive_chars():
 
             while True:
                 message = await websocket.recv()
+                if recorder:
+                    recorder.record(message)
                 data = json.loads(message)
                 print(f"Received: {data}")
-                save_to_json(data)
+                if report_batch(state, data):
+                    # Only the legs the mission still has to visit are saved
+                    save_to_json({**data, "scheduler": state.scheduler()})
     except websockets.exceptions.ConnectionClosed as e:
         print(f"WebSocket connection closed: {e.code} - {e.reason}")
     except Exception as e:
         print(f"Unhandled error: {e}")
 
+def report_batch(state: SchedulerState, data: dict):
+    """Parse the batch once and apply what changed against the current one
+    to the running mission; False when the message is not a usable batch."""
+    if not isinstance(data, dict):
+        print(f"❌ Scheduler message is not a batch: {data!r}")
+        return False
+    batch_id, completed = load_progress()
+    if state.batch is not None and batch_id == state.batch.batch_id:
+        state.complete(completed)
+    try:
+        batch, changes = state.apply(data)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        print(f"❌ Malformed scheduler batch: {e}")
+        return False
+    if changes is None and batch_id == batch.batch_id:
+        # A restarted receiver picks up a mission already under way
+        state.complete(completed)
+    if changes is None:
+        print(f"📋 New batch {batch.batch_id}: {len(batch.rooms)} rooms, {len(batch.waypoints)} waypoints")
+    elif not changes:
+        print(f"📋 Batch {batch.batch_id} resent unchanged")
+    else:
+        print(f"📋 Batch {batch.batch_id} updated: {changes.as_dict()}, {len(state.remaining())} waypoints left")
+    return True
+
 def save_to_json(data: dict, filename: str = "scheduler_data.json"):
     """Append received data to a JSON file with a timestamp."""
     try:
@@ -46,9 +79,8 @@ def save_to_json(data: dict, filename: str = "scheduler_data.json"):
             print(f"scheduled data {scheduled_data}")
             print(f"batch id data {batch_id}")
 
-        # Write back to file
-        with open(filename, "w") as f:
-            json.dump(existing_data, f, indent=4)
+        # Write back to file; the mission runner may be reading it
+        write_json(existing_data, filename)
 
         print(f"✅ Data saved to {filename}")
 
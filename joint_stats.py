@@ -0,0 +1,138 @@
+import time
+
+import numpy as np
+
+# Online statistics over per-joint telemetry (effort, velocity, ...). Every
+# update is a handful of NumPy ops on a joint vector: no Python per joint and
+# no history beyond the fixed window ring.
+WINDOW = 50             # samples in the rolling window (~1 s of arm telemetry)
+EWMA_ALPHA = 0.1
+Z_THRESHOLD = 4.0
+MIN_SAMPLES = 10        # no z-score flags before this many samples
+MIN_STD = 1e-6
+
+
+def joint_values(data, field: str):
+    """Joint vector from a telemetry frame: a bare list, {field: [...]},
+    {"data"/"value"/"values": [...]} or {joint_name: value, ...}."""
+    if isinstance(data, list):
+        return np.asarray(data, dtype=np.float64)
+    if not isinstance(data, dict):
+        return None
+    for key in (field, "data", "value", "values"):
+        if isinstance(data.get(key), list):
+            return np.asarray(data[key], dtype=np.float64)
+    numbers = [v for v in data.values() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    return np.asarray(numbers, dtype=np.float64) if numbers else None
+
+
+class JointStats:
+    """Rolling mean/variance from running sums, rolling min/max with the
+    van Herk/Gil-Werman block trick (amortised O(1) per sample) and EWMA,
+    all as (joints,) vectors."""
+
+    def __init__(self, field: str, limits=None, window: int = WINDOW, alpha: float = EWMA_ALPHA,
+                 z_threshold: float = Z_THRESHOLD):
+        self.field = field
+        self.limits = limits
+        self.window = window
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.joints = None
+
+    def _reset(self, joints: int):
+        self.joints = joints
+        self.ring = np.zeros((self.window, joints))
+        self.index = 0
+        self.count = 0
+        self.sum = np.zeros(joints)
+        self.sum_sq = np.zeros(joints)
+        self.prefix_min = np.full(joints, np.inf)
+        self.prefix_max = np.full(joints, -np.inf)
+        self.suffix_min = np.full((self.window + 1, joints), np.inf)
+        self.suffix_max = np.full((self.window + 1, joints), -np.inf)
+        self.ewma = np.zeros(joints)
+        self.ewm_var = np.zeros(joints)
+        self.limit_vector = None if self.limits is None else np.broadcast_to(np.asarray(self.limits, dtype=np.float64), (joints,))
+
+    def update(self, values: np.ndarray, t: float = None) -> list:
+        """Fold one sample in; returns anomaly events (usually empty)."""
+        t = time.time() if t is None else t
+        if self.joints != len(values):
+            self._reset(len(values))
+
+        n = min(self.count, self.window)
+        events = []
+
+        # Flags are judged against the window before this sample
+        if self.count >= MIN_SAMPLES:
+            mean = self.sum / n
+            std = np.sqrt(np.maximum(self.sum_sq / n - mean * mean, 0.0))
+            z = np.abs(values - mean) / np.maximum(std, MIN_STD)
+            flagged = z > self.z_threshold
+            if flagged.any():
+                for joint in np.flatnonzero(flagged):
+                    events.append({"type": "zscore", "field": self.field, "joint": int(joint), "t": t,
+                                   "value": float(values[joint]), "mean": float(mean[joint]), "z": round(float(z[joint]), 2)})
+        if self.limit_vector is not None:
+            over = np.abs(values) > self.limit_vector
+            if over.any():
+                for joint in np.flatnonzero(over):
+                    events.append({"type": "threshold", "field": self.field, "joint": int(joint), "t": t,
+                                   "value": float(values[joint]), "limit": float(self.limit_vector[joint])})
+
+        if self.index == 0 and self.count:
+            # A full pass is done: its suffix min/max cover the part still in the window
+            self.suffix_min[:-1] = np.minimum.accumulate(self.ring[::-1])[::-1]
+            self.suffix_max[:-1] = np.maximum.accumulate(self.ring[::-1])[::-1]
+            self.prefix_min.fill(np.inf)
+            self.prefix_max.fill(-np.inf)
+            # Re-sum exactly once per pass so the running sums cannot drift
+            self.sum = self.ring.sum(axis=0)
+            self.sum_sq = (self.ring * self.ring).sum(axis=0)
+
+        old = self.ring[self.index]
+        if self.count >= self.window:
+            self.sum -= old
+            self.sum_sq -= old * old
+        self.ring[self.index] = values
+        self.sum += values
+        self.sum_sq += values * values
+        np.minimum(self.prefix_min, values, out=self.prefix_min)
+        np.maximum(self.prefix_max, values, out=self.prefix_max)
+
+        if self.count == 0:
+            self.ewma[:] = values
+        else:
+            delta = values - self.ewma
+            self.ewma += self.alpha * delta
+            self.ewm_var = (1 - self.alpha) * (self.ewm_var + self.alpha * delta * delta)
+
+        self.count += 1
+        self.index = (self.index + 1) % self.window
+        return events
+
+    def update_from(self, data, t: float = None) -> list:
+        values = joint_values(data, self.field)
+        if values is None or not len(values):
+            return []
+        return self.update(values, t)
+
+    def snapshot(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        n = min(self.count, self.window)
+        mean = self.sum / n
+        # Rows after the write index still hold the previous pass
+        last = (self.index - 1) % self.window
+        window_min = np.minimum(self.prefix_min, self.suffix_min[last + 1])
+        window_max = np.maximum(self.prefix_max, self.suffix_max[last + 1])
+        return {
+            "count": self.count,
+            "mean": np.round(mean, 4).tolist(),
+            "std": np.round(np.sqrt(np.maximum(self.sum_sq / n - mean * mean, 0.0)), 4).tolist(),
+            "min": np.round(window_min, 4).tolist(),
+            "max": np.round(window_max, 4).tolist(),
+            "ewma": np.round(self.ewma, 4).tolist(),
+            "ewm_std": np.round(np.sqrt(self.ewm_var), 4).tolist(),
+        }
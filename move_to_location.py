@@ -1,26 +1,61 @@
-import requests
-import json
 import time
-import rclpy
-from rclpy.node import Node
-from geometry_msgs.msg import Point
+
+_started = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+# rclpy and the ROS message types are imported only when a ROS node is needed
+# (interactive mode or --ros), which keeps headless startup well under a second.
 
 # --- Configuration ---
 BOT_IP = "192.168.11.1"
 PORT = 1448
 POI_API_URL = f"http://{BOT_IP}:{PORT}/api/core/artifact/v1/pois"
 NAVIGATION_API_URL = f"http://{BOT_IP}:{PORT}/api/core/motion/v1/actions"
+POSE_API_URL = f"http://{BOT_IP}:{PORT}/api/core/slam/v1/localization/pose"
 TOPIC_NAME = "/navigation_goal"
 API_TIMEOUT_SECONDS = 10
 POI_JSON_FILE_PATH = "pois.json"
+SCHEDULER_JSON_FILE_PATH = "scheduler_data.json"
+POLL_INTERVAL_SECONDS = 0.5
+LEG_TIMEOUT_SECONDS = 300
+ACTION_DONE_STATUS = 4      # MoveToAction state.status once the action has ended
+PIPELINE_POLL_SECONDS = 0.1
+MAX_POLL_ERRORS = 5         # failed status polls in a row before a leg counts as failed
+WAYPOINT_RADIUS = 0.3       # metres; a route waypoint counts as reached inside this
 
-class NavigationPublisher(Node):
-    def __init__(self):
-        super().__init__('navigation_goal_publisher')
-        self.publisher_ = self.create_publisher(Point, TOPIC_NAME, 10)
+MOVE_TO_ACTION = "slamtec.agent.actions.MoveToAction"
+SERIES_MOVE_TO_ACTION = "slamtec.agent.actions.SeriesMoveToAction"
+MOVE_OPTIONS = {"mode": 0, "flags": ["with_yaw", "precise"], "acceptable_precision": 0, "fail_retry_count": 2}
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Controllers that rejected SERIES_MOVE_TO_ACTION, so later routes go straight to single goals
+UNSUPPORTED_ROUTE_STATUS = (400, 404, 405, 422, 501)
+route_unsupported = set()
 
-    def publish_status(self, message: str):
-        self.get_logger().info(message)
+def create_navigation_node():
+    import rclpy
+    from rclpy.node import Node
+    from geometry_msgs.msg import Point
+
+    class NavigationPublisher(Node):
+        def __init__(self):
+            super().__init__('navigation_goal_publisher')
+            self.publisher_ = self.create_publisher(Point, TOPIC_NAME, 10)
+
+        def publish_status(self, message: str):
+            self.get_logger().info(message)
+
+    rclpy.init()
+    return NavigationPublisher()
+
+def shutdown_ros():
+    import rclpy
+    rclpy.shutdown()
 
 def get_pois(poi_api, api_timeout, poi_json_path, publish_status_callback):
     try:
@@ -83,37 +118,70 @@ def get_pois(poi_api, api_timeout, poi_json_path, publish_status_callback):
         publish_status_callback(f"An unexpected error occurred while fetching POIs: {e}")
         return {}, False
 
-def go_to_location(x: float, y: float, yaw: float, navigation_url: str, publish_status_callback, ros_publisher):
-    payload = {
-        "action_name": "slamtec.agent.actions.MoveToAction",
-        "options": {
-            "target": {
-                "x": x,
-                "y": y,
-                "z": 0
-            },
-            "move_options": {
-                "mode": 0,
-                "flags": ["with_yaw", "precise"],
-                "yaw": yaw,
-                "acceptable_precision": 0,
-                "fail_retry_count": 2
-            }
-        }
-    }
+def load_cached_pois(poi_json_path):
+    """POIs saved by the last get_pois() call, {} when there is no usable cache."""
+    try:
+        with open(poi_json_path) as f:
+            poi_dict = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return poi_dict if isinstance(poi_dict, dict) else {}
+
+def scheduler_groups(entry: dict) -> list:
+    """Leg groups of one scheduler batch, in order: per room the entry point,
+    then its beds as one group (a route candidate), then the exit point.
+    A leg is (name, x, y, yaw)."""
+    from scheduler_model import parse_batch
+    return parse_batch(entry).groups()
 
+def scheduler_waypoints(entry: dict) -> list:
+    return [leg for group in scheduler_groups(entry) for leg in group]
+
+def _body_template(action_name: str, target_key: str):
+    """Serialized action payload split around its target and yaw, so a body
+    is three string joins instead of a dict build and json.dumps per goal."""
+    text = json.dumps({
+        "action_name": action_name,
+        "options": {target_key: "@target@", "move_options": {**MOVE_OPTIONS, "yaw": "@yaw@"}},
+    })
+    head, rest = text.split('"@target@"')
+    middle, tail = rest.split('"@yaw@"')
+    return head, middle, tail
+
+MOVE_TO_TEMPLATE = _body_template(MOVE_TO_ACTION, "target")
+SERIES_MOVE_TO_TEMPLATE = _body_template(SERIES_MOVE_TO_ACTION, "targets")
+
+def _point(x, y) -> str:
+    return f'{{"x": {float(x)!r}, "y": {float(y)!r}, "z": 0}}'
+
+def move_to_body(x: float, y: float, yaw: float) -> str:
+    head, middle, tail = MOVE_TO_TEMPLATE
+    return f"{head}{_point(x, y)}{middle}{float(yaw)!r}{tail}"
+
+def route_body(legs) -> str:
+    """One SeriesMoveToAction through every leg; the last leg's yaw is kept."""
+    head, middle, tail = SERIES_MOVE_TO_TEMPLATE
+    targets = ", ".join(_point(x, y) for _, x, y, _ in legs)
+    return f"{head}[{targets}]{middle}{float(legs[-1][3])!r}{tail}"
+
+def go_to_location(x: float, y: float, yaw: float, navigation_url: str, publish_status_callback, ros_publisher, session=None, body=None):
     try:
-        response = requests.post(navigation_url, json=payload, timeout=10)
+        response = (session or requests).post(navigation_url, data=body or move_to_body(x, y, yaw), headers=JSON_HEADERS, timeout=10)
         if response.status_code == 200:
             publish_status_callback(f"Navigation command sent to: (x={x}, y={y}, yaw={yaw})")
             
             # Publish to ROS 2 topic
-            msg = Point()
-            msg.x = x
-            msg.y = y
-            msg.z = yaw  # Using z field to represent yaw
-            ros_publisher.publish(msg)
-            return True
+            if ros_publisher is not None:
+                from geometry_msgs.msg import Point
+                msg = Point()
+                msg.x = x
+                msg.y = y
+                msg.z = yaw  # Using z field to represent yaw
+                ros_publisher.publish(msg)
+            try:
+                return response.json() or True
+            except ValueError:
+                return True
         else:
             publish_status_callback(f"Failed to send navigation command. Status: {response.status_code}, Response: {response.text}")
             return False
@@ -125,9 +193,306 @@ def go_to_location(x: float, y: float, yaw: float, navigation_url: str, publish_
         publish_status_callback(f"Unexpected error occurred: {e}")
     return False
 
+class _ActionPoll:
+    """Status polls for one submitted action. A 404 only means "finished" once
+    the action was seen running, and transient poll failures are retried."""
+
+    def __init__(self, action_id, navigation_url: str, session):
+        self.url = f"{navigation_url}/{action_id}"
+        self.session = session
+        self.seen = False
+        self.errors = 0
+
+    def state(self):
+        """(done, ok, reason) for the action."""
+        try:
+            response = self.session.get(self.url, timeout=API_TIMEOUT_SECONDS)
+            if response.status_code == 404 and self.seen:
+                # Finished actions are dropped from the action list
+                return True, True, "finished"
+            data = response.json() if response.status_code == 200 else None
+        except requests.exceptions.RequestException as e:
+            return self._failed(f"status poll failed: {e}")
+        except ValueError:
+            return self._failed("status poll returned no JSON")
+        if not isinstance(data, dict):
+            return self._failed(f"status poll returned {response.status_code}")
+        self.seen, self.errors = True, 0
+        state = data.get("state") or {}
+        if state.get("status") != ACTION_DONE_STATUS:
+            return False, None, None
+        if state.get("result", 0) < 0:
+            return True, False, state.get("reason") or f"result {state.get('result')}"
+        return True, True, "finished"
+
+    def _failed(self, reason: str):
+        self.errors += 1
+        if self.errors < MAX_POLL_ERRORS:
+            return False, None, None
+        return True, False, f"{reason} ({self.errors} polls in a row)"
+
+def _pose(session, pose_url: str):
+    try:
+        response = session.get(pose_url, timeout=API_TIMEOUT_SECONDS)
+        pose = response.json() if response.status_code == 200 else None
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    return (pose["x"], pose["y"]) if isinstance(pose, dict) and "x" in pose else None
+
+def _near(pose, leg, radius: float) -> bool:
+    return pose is not None and (pose[0] - leg[1]) ** 2 + (pose[1] - leg[2]) ** 2 <= radius * radius
+
+def wait_for_action(action, navigation_url: str, session, timeout: float = LEG_TIMEOUT_SECONDS,
+                    poll: float = POLL_INTERVAL_SECONDS, until=None):
+    """Poll a submitted MoveToAction until it ends or until() is true; returns (ok, reason)."""
+    action_id = action.get("action_id") if isinstance(action, dict) else None
+    if action_id is None:
+        return True, "no action id to follow"
+    status = _ActionPoll(action_id, navigation_url, session)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        if until is not None and until():
+            return True, "handed off"
+        done, ok, reason = status.state()
+        if done:
+            return ok, reason
+    return False, f"timed out after {timeout}s"
+
+class _LegClock:
+    """Per-leg result rows with times measured from the previous waypoint."""
+
+    def __init__(self, publish_status_callback, on_leg=None):
+        self.publish_status_callback = publish_status_callback
+        self.on_leg = on_leg
+        self.results = []
+        self.last = time.perf_counter()
+
+    def reached(self, leg, ok: bool, reason: str, submit_ms: float = 0.0):
+        now = time.perf_counter()
+        name, x, y, yaw = leg
+        self.results.append({
+            "name": name, "x": x, "y": y, "yaw": yaw, "ok": ok, "reason": reason,
+            "submit_ms": round(submit_ms, 1), "leg_s": round(now - self.last, 2),
+        })
+        self.last = now
+        self.publish_status_callback(f"{name}: {reason} (submit {self.results[-1]['submit_ms']} ms, leg {self.results[-1]['leg_s']} s)")
+        if self.on_leg is not None:
+            self.on_leg(self.results[-1])
+
+def _run_singles(legs, clock, navigation_url, session, wait, ros_publisher, publish_status_callback,
+                 stop_on_failure, pipelined, pose_url, handoff_radius):
+    # Pipelined: bodies built up front, tighter polling, and the next goal in
+    # the group replaces the current one once the robot is within the handoff
+    # radius, before it stops and turns; the group's last goal is waited out
+    bodies = [move_to_body(x, y, yaw) for _, x, y, yaw in legs] if pipelined else [None] * len(legs)
+    for index, (leg, body) in enumerate(zip(legs, bodies)):
+        started = time.perf_counter()
+        action = go_to_location(leg[1], leg[2], leg[3], navigation_url, publish_status_callback, ros_publisher,
+                                session=session, body=body)
+        submit_ms = (time.perf_counter() - started) * 1000
+        ok, reason = (bool(action), "submitted" if action else "submit failed")
+        if action and wait:
+            until = None
+            if pipelined and handoff_radius > 0 and index + 1 < len(legs):
+                until = lambda leg=leg: _near(_pose(session, pose_url), leg, handoff_radius)
+            ok, reason = wait_for_action(action, navigation_url, session,
+                                         poll=PIPELINE_POLL_SECONDS if pipelined else POLL_INTERVAL_SECONDS, until=until)
+        clock.reached(leg, ok, reason, submit_ms)
+        if not ok and stop_on_failure:
+            return False
+    return True
+
+def _run_route(legs, clock, navigation_url, session, ros_publisher, publish_status_callback, pose_url):
+    """Submit legs as one SeriesMoveToAction and report each waypoint as the
+    pose passes it. Returns None when the controller has no series action."""
+    started = time.perf_counter()
+    try:
+        response = session.post(navigation_url, data=route_body(legs), headers=JSON_HEADERS, timeout=API_TIMEOUT_SECONDS)
+    except requests.exceptions.RequestException as e:
+        publish_status_callback(f"Route submission failed: {e}")
+        return None
+    if response.status_code in UNSUPPORTED_ROUTE_STATUS:
+        route_unsupported.add(navigation_url)
+        publish_status_callback(f"Controller has no {SERIES_MOVE_TO_ACTION} ({response.status_code}), using single goals")
+        return None
+    if response.status_code != 200:
+        publish_status_callback(f"Route submission failed. Status: {response.status_code}, Response: {response.text}")
+        return None
+    submit_ms = (time.perf_counter() - started) * 1000
+    publish_status_callback(f"Route of {len(legs)} waypoints sent: {', '.join(leg[0] for leg in legs)}")
+    if ros_publisher is not None:
+        from geometry_msgs.msg import Point
+        for _, x, y, yaw in legs:
+            msg = Point()
+            msg.x, msg.y, msg.z = float(x), float(y), float(yaw)
+            ros_publisher.publish(msg)
+
+    try:
+        action = response.json()
+    except ValueError:
+        action = None
+    action_id = action.get("action_id") if isinstance(action, dict) else None
+    status = _ActionPoll(action_id, navigation_url, session)
+    next_leg = 0
+    deadline = time.monotonic() + LEG_TIMEOUT_SECONDS * len(legs)
+    while time.monotonic() < deadline:
+        time.sleep(PIPELINE_POLL_SECONDS)
+        pose = _pose(session, pose_url)
+        # The final waypoint is confirmed by the action ending, not by distance
+        while next_leg < len(legs) - 1 and _near(pose, legs[next_leg], WAYPOINT_RADIUS):
+            clock.reached(legs[next_leg], True, "passed", submit_ms if next_leg == 0 else 0.0)
+            next_leg += 1
+        if action_id is None:
+            done, ok, reason = True, True, "no action id to follow"
+        else:
+            done, ok, reason = status.state()
+        if done:
+            for leg in legs[next_leg:-1]:
+                clock.reached(leg, ok, "passed" if ok else f"not reached: {reason}")
+            clock.reached(legs[-1], ok, reason, submit_ms if len(legs) == 1 else 0.0)
+            return ok
+    for leg in legs[next_leg:]:
+        clock.reached(leg, False, "timed out")
+    return False
+
+def run_batch(groups, navigation_url: str = NAVIGATION_API_URL, wait: bool = True, ros_publisher=None,
+              publish_status_callback=print, stop_on_failure: bool = True, mode: str = "single",
+              pose_url: str = POSE_API_URL, handoff_radius: float = 0.0, on_leg=None, refresh=None):
+    """Drive through groups of (name, x, y, yaw) legs in order; returns per-leg timings.
+    mode "single" waits out each goal, "pipelined" sends the next goal of a group
+    once within handoff_radius (WAYPOINT_RADIUS if not set) of the current one,
+    "route" sends each multi-leg group as one series action (pipelined fallback).
+    A flat list of legs is taken as one group. on_leg(result) sees every leg
+    result; refresh(), asked between groups, may return the groups still to run."""
+    if groups and isinstance(groups[0][0], str):
+        groups = [groups]
+    if mode != "single" and handoff_radius <= 0:
+        handoff_radius = WAYPOINT_RADIUS
+    session = requests.Session()
+    clock = _LegClock(publish_status_callback, on_leg)
+    publish_status_callback(f"Startup to first goal: {(time.perf_counter() - _started) * 1000:.0f} ms")
+    pending = list(groups)
+    while pending:
+        legs = pending.pop(0)
+        ok = None
+        if mode == "route" and wait and len(legs) > 1 and navigation_url not in route_unsupported:
+            ok = _run_route(legs, clock, navigation_url, session, ros_publisher, publish_status_callback, pose_url)
+        if ok is None:
+            ok = _run_singles(legs, clock, navigation_url, session, wait, ros_publisher, publish_status_callback,
+                              stop_on_failure, mode != "single", pose_url, handoff_radius)
+        if not ok and stop_on_failure:
+            break
+        if refresh is not None:
+            updated = refresh()
+            if updated is not None:
+                pending = updated
+    session.close()
+    return clock.results
+
+class _SchedulerMission:
+    """A scheduler batch run from the receiver's file. Finished legs go to
+    the progress file so the receiver drops them from what it saves, and a
+    same-batch update it saves replaces the groups not yet run."""
+
+    def __init__(self, path: str, batch_index: int, publish_status_callback):
+        from scheduler_model import load_progress
+        self.path = path
+        self.batch_index = batch_index
+        self.publish_status_callback = publish_status_callback
+        self.entry, self.stamp = self._read()
+        self.batch_id = self.entry.get("batch_id")
+        progress_id, completed = load_progress()
+        # Legs already done by an earlier run of this batch are not driven again
+        self.completed = completed if progress_id == self.batch_id else set()
+        self.visited = set(self.completed)
+
+    def _read(self):
+        stamp = os.stat(self.path).st_mtime_ns
+        with open(self.path) as f:
+            batches = json.load(f)
+        return (batches[self.batch_index] if isinstance(batches, list) else batches), stamp
+
+    def groups(self) -> list:
+        groups = [[leg for leg in group if leg[0] not in self.visited] for group in scheduler_groups(self.entry)]
+        return [group for group in groups if group]
+
+    def reached(self, result: dict):
+        from scheduler_model import save_progress
+        self.visited.add(result["name"])
+        if not result["ok"]:
+            return
+        self.completed.add(result["name"])
+        try:
+            save_progress(self.batch_id, self.completed)
+        except OSError as e:
+            self.publish_status_callback(f"Progress not saved: {e}")
+
+    def refresh(self):
+        try:
+            if os.stat(self.path).st_mtime_ns == self.stamp:
+                return None
+            entry, self.stamp = self._read()
+        except (OSError, ValueError, IndexError) as e:
+            self.publish_status_callback(f"Scheduler file not reread: {e}")
+            return None
+        if entry.get("batch_id") != self.batch_id:
+            self.publish_status_callback(f"Batch {entry.get('batch_id')} waiting; finishing batch {self.batch_id} first")
+            return None
+        self.entry = entry
+        groups = self.groups()
+        self.publish_status_callback(f"Batch {self.batch_id} updated, {sum(len(group) for group in groups)} legs left")
+        return groups
+
+def resolve_legs(names, poi_json_path: str = POI_JSON_FILE_PATH, refresh: bool = False, publish_status_callback=print):
+    """Legs for POI names, from the cached POI list; the robot is only asked
+    when the cache is missing, stale for one of the names, or refresh is set."""
+    poi_dict = {} if refresh else load_cached_pois(poi_json_path)
+    wanted = [name.strip().lower() for name in names]
+    if not poi_dict or any(name not in poi_dict for name in wanted):
+        poi_dict, success = get_pois(POI_API_URL, API_TIMEOUT_SECONDS, poi_json_path, lambda msg: None)
+        if not success:
+            publish_status_callback("Failed to fetch POIs.")
+            return None
+    missing = [name for name in wanted if name not in poi_dict]
+    if missing:
+        publish_status_callback(f"Unknown locations: {', '.join(missing)}")
+        return None
+    return [(name, poi_dict[name]['x'], poi_dict[name]['y'], poi_dict[name]['yaw']) for name in wanted]
+
+def headless(args):
+    node = create_navigation_node() if args.ros else None
+    status = node.publish_status if node else print
+    mission = None
+    if args.scheduler:
+        mission = _SchedulerMission(args.scheduler, args.batch_index, status)
+        groups = mission.groups()
+    else:
+        legs = resolve_legs(args.locations, refresh=args.refresh_pois, publish_status_callback=status)
+        groups = [legs] if legs else []
+    legs = [leg for group in groups for leg in group]
+    if not legs:
+        return 1
+
+    results = run_batch(groups, wait=not args.no_wait, ros_publisher=node.publisher_ if node else None,
+                        publish_status_callback=status, stop_on_failure=not args.keep_going, mode=args.mode,
+                        handoff_radius=args.handoff_radius, on_leg=mission.reached if mission else None,
+                        refresh=mission.refresh if mission else None)
+    # A scheduler mission's leg count follows the batch updates it picked up
+    planned = len(results) + sum(len(group) for group in mission.groups()) if mission else len(legs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'leg':<24} {'result':<10} {'submit ms':>10} {'leg s':>8}")
+        for result in results:
+            print(f"{result['name']:<24} {'ok' if result['ok'] else 'FAILED':<10} {result['submit_ms']:>10} {result['leg_s']:>8}")
+        print(f"{len(results)} of {planned} legs run, total {sum(r['leg_s'] for r in results):.1f} s")
+    if node:
+        shutdown_ros()
+    return 0 if len(results) == planned and all(r['ok'] for r in results) else 1
+
 def main():
-    rclpy.init()
-    node = NavigationPublisher()
+    node = create_navigation_node()
     
     def ros_publish_status(msg): 
         node.publish_status(msg)
@@ -145,7 +510,7 @@ def main():
     
     if not success:
         ros_publish_status("Failed to fetch POIs. Exiting.")
-        rclpy.shutdown()
+        shutdown_ros()
         return
     
     # Display available POIs
@@ -205,7 +570,29 @@ def main():
         except Exception as e:
             ros_publish_status(f"An error occurred: {e}")
     
-    rclpy.shutdown()
+    shutdown_ros()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send the robot to POIs; interactive without arguments")
+    parser.add_argument("locations", nargs="*", help="POI names to visit in order (headless)")
+    parser.add_argument("--scheduler", nargs="?", const=SCHEDULER_JSON_FILE_PATH, metavar="FILE",
+                        help=f"run a scheduler batch instead (default file {SCHEDULER_JSON_FILE_PATH})")
+    parser.add_argument("--batch-index", type=int, default=-1, help="which batch in the scheduler file, default the latest")
+    parser.add_argument("--ros", action="store_true", help="also publish goals on the ROS topic (imports rclpy)")
+    parser.add_argument("--refresh-pois", action="store_true", help="fetch POIs from the robot instead of the cache")
+    parser.add_argument("--no-wait", action="store_true", help="only submit each goal, don't wait for arrival")
+    parser.add_argument("--keep-going", action="store_true", help="continue after a failed leg")
+    parser.add_argument("--mode", choices=("single", "pipelined", "route"), default="single",
+                        help="single: stop precisely at every goal with its yaw. pipelined: hand off to the next bed "
+                             "once within --handoff-radius of the current one. route: send each room's beds as one "
+                             "series action, falling back to pipelined. pipelined and route skip the precise stop "
+                             "and per-bed yaw at every bed but a room's last")
+    parser.add_argument("--handoff-radius", type=float, default=0.0,
+                        help=f"pipelined: send the next goal once within this many metres of the current one "
+                             f"(default {WAYPOINT_RADIUS})")
+    parser.add_argument("--json", action="store_true", help="print per-leg timings as JSON")
+    args = parser.parse_args()
+
+    if args.locations or args.scheduler:
+        sys.exit(headless(args))
     main()
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+# Decoded maps are cached as <hash>.npy (opened memory-mapped, read-only) with
+# a <hash>.json sidecar for resolution/origin, so any process can reuse them.
+MAP_CACHE_DIR = "map_cache"
+
+# Cell values in the decoded grid, same convention as a ROS OccupancyGrid
+UNKNOWN = -1
+FREE = 0
+OCCUPIED = 100
+
+# STCM container as served by /api/core/slam/v1/maps/stcm (little endian):
+#   b"STCM", u32 version, metadata, u32 layer count,
+#   per layer: metadata, u32 payload size, payload
+# metadata is u32 count followed by (u32 len, key, u32 len, value) strings.
+# Grid layers carry origin/dimension/resolution in their metadata and one
+# signed byte per cell (row-major, row 0 at origin.y): > 0 occupied,
+# < 0 free, 0 unknown.
+# This layout is inferred from the SDK documentation and has not been checked
+# against a map saved by a real controller; decode_stcm raises StcmError on
+# anything that does not parse, but a file that parses with a different cell
+# convention would decode silently wrong. Verify with `python
+# occupancy_map.py <file>.stcm` against a known map before relying on it.
+STCM_MAGIC = b"STCM"
+GRID_LAYER_TYPE = "grid-map"
+OCCUPIED_THRESHOLD = 0
+
+
+class StcmError(ValueError):
+    pass
+
+
+class OccupancyMap:
+    def __init__(self, grid: np.ndarray, resolution: float, origin_x: float, origin_y: float, map_hash: str):
+        self.grid = grid
+        self.resolution = resolution
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.map_hash = map_hash
+
+    @property
+    def height(self) -> int:
+        return self.grid.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.grid.shape[1]
+
+    def world_to_cell(self, x, y):
+        """Vectorized world (m) -> (row, col); out-of-map cells come back as -1."""
+        cols = np.floor((np.asarray(x, dtype=np.float64) - self.origin_x) / self.resolution).astype(np.int64)
+        rows = np.floor((np.asarray(y, dtype=np.float64) - self.origin_y) / self.resolution).astype(np.int64)
+        outside = (rows < 0) | (rows >= self.height) | (cols < 0) | (cols >= self.width)
+        return np.where(outside, -1, rows), np.where(outside, -1, cols)
+
+    def cell_to_world(self, rows, cols):
+        """Vectorized (row, col) -> world (m) at the cell centre."""
+        x = self.origin_x + (np.asarray(cols, dtype=np.float64) + 0.5) * self.resolution
+        y = self.origin_y + (np.asarray(rows, dtype=np.float64) + 0.5) * self.resolution
+        return x, y
+
+    def values_at(self, x, y):
+        """Grid value under each world point, UNKNOWN outside the map."""
+        rows, cols = self.world_to_cell(x, y)
+        inside = rows >= 0
+        values = np.full(rows.shape, UNKNOWN, dtype=np.int8)
+        values[inside] = self.grid[rows[inside], cols[inside]]
+        return values
+
+    def meta(self) -> dict:
+        return {
+            "map_hash": self.map_hash,
+            "resolution": self.resolution,
+            "origin": {"x": self.origin_x, "y": self.origin_y},
+            "width": self.width,
+            "height": self.height,
+        }
+
+
+def _read_metadata(data: memoryview, offset: int):
+    (count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    meta = {}
+    for _ in range(count):
+        (key_len,) = struct.unpack_from("<I", data, offset)
+        key = bytes(data[offset + 4:offset + 4 + key_len]).decode()
+        offset += 4 + key_len
+        (value_len,) = struct.unpack_from("<I", data, offset)
+        value = bytes(data[offset + 4:offset + 4 + value_len]).decode()
+        offset += 4 + value_len
+        meta[key] = value
+    return meta, offset
+
+
+def decode_stcm(content: bytes):
+    """Decode the explore grid layer of an STCM map into (grid, resolution, origin_x, origin_y)."""
+    data = memoryview(content)
+    if bytes(data[:4]) != STCM_MAGIC:
+        raise StcmError("Not an STCM map")
+
+    try:
+        # Skip the version and the map-level metadata
+        _, offset = _read_metadata(data, 8)
+        (layer_count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+
+        for _ in range(layer_count):
+            layer_meta, offset = _read_metadata(data, offset)
+            (size,) = struct.unpack_from("<I", data, offset)
+            payload = data[offset + 4:offset + 4 + size]
+            offset += 4 + size
+
+            if GRID_LAYER_TYPE not in layer_meta.get("type", ""):
+                continue
+
+            width = int(layer_meta["dimension.width"])
+            height = int(layer_meta["dimension.height"])
+            if len(payload) != width * height:
+                raise StcmError(f"Grid layer has {len(payload)} cells, expected {width}x{height}")
+
+            raw = np.frombuffer(payload, dtype=np.int8).reshape(height, width)
+            grid = np.full(raw.shape, UNKNOWN, dtype=np.int8)
+            grid[raw > OCCUPIED_THRESHOLD] = OCCUPIED
+            grid[raw < 0] = FREE
+            return grid, float(layer_meta["resolution.x"]), float(layer_meta["origin.x"]), float(layer_meta["origin.y"])
+    except StcmError:
+        raise
+    except (struct.error, KeyError, ValueError) as e:
+        raise StcmError(f"Malformed STCM map: {e}") from e
+
+    raise StcmError("STCM map has no grid layer")
+
+
+def encode_stcm(grid: np.ndarray, resolution: float, origin_x: float, origin_y: float) -> bytes:
+    """Inverse of decode_stcm for a single grid layer, used for local stubs and fixtures."""
+    def metadata(items):
+        out = struct.pack("<I", len(items))
+        for key, value in items.items():
+            key, value = key.encode(), str(value).encode()
+            out += struct.pack("<I", len(key)) + key + struct.pack("<I", len(value)) + value
+        return out
+
+    height, width = grid.shape
+    raw = np.zeros(grid.shape, dtype=np.int8)
+    raw[grid == OCCUPIED] = 100
+    raw[grid == FREE] = -100
+    layer = metadata({
+        "type": f"vnd.slamtec.map-layer/vnd.{GRID_LAYER_TYPE}+binary",
+        "usage": "explore",
+        "dimension.width": width,
+        "dimension.height": height,
+        "resolution.x": resolution,
+        "resolution.y": resolution,
+        "origin.x": origin_x,
+        "origin.y": origin_y,
+    })
+    payload = raw.tobytes()
+    return STCM_MAGIC + struct.pack("<I", 1) + metadata({}) + struct.pack("<I", 1) + layer + struct.pack("<I", len(payload)) + payload
+
+
+def map_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def _paths(digest: str, cache_dir: str):
+    return os.path.join(cache_dir, f"{digest}.npy"), os.path.join(cache_dir, f"{digest}.json")
+
+
+def open_cached(digest: str, cache_dir: str = MAP_CACHE_DIR):
+    """Open a previously decoded map without decoding, or None if it isn't cached."""
+    grid_path, meta_path = _paths(digest, cache_dir)
+    if not (os.path.exists(grid_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    grid = np.load(grid_path, mmap_mode="r")
+    return OccupancyMap(grid, meta["resolution"], meta["origin"]["x"], meta["origin"]["y"], digest)
+
+
+def load_map(content: bytes, cache_dir: str = MAP_CACHE_DIR) -> OccupancyMap:
+    """Decode an STCM map once and keep it as a memory-mapped .npy keyed by its hash."""
+    digest = map_hash(content)
+    cached = open_cached(digest, cache_dir)
+    if cached is not None:
+        return cached
+
+    grid, resolution, origin_x, origin_y = decode_stcm(content)
+    os.makedirs(cache_dir, exist_ok=True)
+    grid_path, meta_path = _paths(digest, cache_dir)
+
+    # Write then rename so a concurrent reader never sees a partial file
+    tmp = f"{grid_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, grid)
+    os.replace(tmp, grid_path)
+
+    occupancy = OccupancyMap(grid, resolution, origin_x, origin_y, digest)
+    tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(occupancy.meta(), f)
+    os.replace(tmp, meta_path)
+
+    return open_cached(digest, cache_dir)
+
+
+def remember_latest(robot_id: str, digest: str, cache_dir: str = MAP_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, f"{robot_id}.latest.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(digest)
+    os.replace(tmp, os.path.join(cache_dir, f"{robot_id}.latest"))
+
+
+def open_latest(robot_id: str, cache_dir: str = MAP_CACHE_DIR):
+    """Last map fetched for a robot, straight from the cache."""
+    try:
+        with open(os.path.join(cache_dir, f"{robot_id}.latest")) as f:
+            return open_cached(f.read().strip(), cache_dir)
+    except FileNotFoundError:
+        return None
+
+
+async def fetch_map(robot, cache_dir: str = MAP_CACHE_DIR) -> OccupancyMap:
+    """Download the robot's STCM map and return the cached occupancy grid."""
+    resp = await robot.client.get(robot.fetch_map_file)
+    resp.raise_for_status()
+    # Decoding, hashing and the cache writes are blocking; keep them off the event loop
+    occupancy = await asyncio.to_thread(load_map, resp.content, cache_dir)
+    await asyncio.to_thread(remember_latest, robot.robot_id, occupancy.map_hash, cache_dir)
+    return occupancy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode an STCM map into the occupancy grid cache")
+    parser.add_argument("stcm", help="path to a .stcm file")
+    parser.add_argument("--cache-dir", default=MAP_CACHE_DIR)
+    args = parser.parse_args()
+
+    with open(args.stcm, "rb") as f:
+        occupancy = load_map(f.read(), args.cache_dir)
+
+    grid = occupancy.grid
+    print(json.dumps(occupancy.meta(), indent=4))
+    print(f"free={int((grid == FREE).sum())} occupied={int((grid == OCCUPIED).sum())} unknown={int((grid == UNKNOWN).sum())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import httpx
+
+# Store-and-forward for medicalbot backend writes. A capture handler commits
+# the write to a local SQLite queue and carries on; a background flusher
+# sends due entries in batches and retries failures with backoff, so a
+# backend outage delays the position records instead of losing them.
+OUTBOX_FILE = "medicalbot_outbox.sqlite3"
+OUTBOX_ENV = "ROS_WEBHOOK_OUTBOX"       # overrides OUTBOX_FILE, e.g. for replay against stubs
+BATCH_SIZE = 32
+LEASE_SECONDS = 30          # a claimed entry is retried after this if its sender died
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+IDLE_SECONDS = 5            # poll interval when nothing is due (other workers may enqueue)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    UNIQUE (url, key)
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt);
+"""
+
+
+def _retryable(status_code: int) -> bool:
+    return status_code >= 500 or status_code in (408, 425, 429)
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+class Outbox:
+    """One row per (url, key): a newer write for the same slot or room
+    position replaces a pending one, so retries never reorder updates."""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get(OUTBOX_ENV) or OUTBOX_FILE
+        self._db = None
+        # Writes run on worker threads (put, flush) and reads on the loop; one statement or transaction at a time
+        self.lock = threading.Lock()
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def db(self):
+        # Opened on first use, not at import
+        if self._db is None:
+            # isolation_level=None: explicit transactions only. Several workers can share the file.
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def enqueue(self, url: str, key: str, payload: dict, headers: dict = None) -> int:
+        """Durably queue a write; returns once it is on disk. Blocking, see put()."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "INSERT INTO outbox (url, key, payload, headers, created, next_attempt) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (url, key) DO UPDATE SET payload = excluded.payload, headers = excluded.headers, "
+                "version = version + 1, state = 'pending', attempts = 0, "
+                # Keep an in-flight lease so the older payload can't land after this one
+                "next_attempt = MAX(next_attempt, excluded.next_attempt), "
+                "last_error = NULL RETURNING id",
+                (url, str(key), json.dumps(payload), json.dumps(headers or {}), now, now),
+            ).fetchone()
+        return row[0]
+
+    async def put(self, url: str, key: str, payload: dict, headers: dict = None) -> int:
+        """enqueue() on a worker thread, so the fsync never blocks the loop, then wake the flusher."""
+        entry_id = await asyncio.to_thread(self.enqueue, url, key, payload, headers)
+        self.wakeup.set()
+        return entry_id
+
+    def claim(self, limit: int = BATCH_SIZE) -> list:
+        """Due entries, leased to this process so other workers skip them."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute(
+                    "SELECT id, url, payload, headers, version, attempts FROM outbox "
+                    "WHERE state = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self.db.executemany(
+                    "UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                    [(now + LEASE_SECONDS, row[0]) for row in rows],
+                )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            return rows
+
+    def settle(self, results: list):
+        """Apply a batch's outcomes in one transaction. Each result is
+        (id, version, attempts, error, retry); error None means sent."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for entry_id, version, attempts, error, retry in results:
+                    if error is None:
+                        self.db.execute("DELETE FROM outbox WHERE id = ? AND version = ?", (entry_id, version))
+                    elif retry:
+                        self.db.execute(
+                            "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ? AND version = ?",
+                            (attempts + 1, now + backoff(attempts + 1), error, entry_id, version),
+                        )
+                    else:
+                        self.db.execute(
+                            "UPDATE outbox SET state = 'dead', attempts = ?, last_error = ? WHERE id = ? AND version = ?",
+                            (attempts + 1, error, entry_id, version),
+                        )
+                    # Rewritten while in flight: the newer payload was held back by the lease, send it now
+                    self.db.execute("UPDATE outbox SET next_attempt = ? WHERE id = ? AND version != ?", (now, entry_id, version))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def next_due(self):
+        with self.lock:
+            return self.db.execute("SELECT MIN(next_attempt) FROM outbox WHERE state = 'pending'").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self.lock:
+            counts = dict(self.db.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+            oldest = self.db.execute("SELECT MIN(created) FROM outbox WHERE state = 'pending'").fetchone()[0]
+            last_error = self.db.execute(
+                "SELECT last_error FROM outbox WHERE last_error IS NOT NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_age": round(time.time() - oldest, 1) if oldest else None,
+            "sent": self.sent,
+            "failed_attempts": self.failed,
+            "last_error": last_error[0] if last_error else None,
+        }
+
+    def dead(self, limit: int = 100) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, url, key, payload, attempts, last_error FROM outbox WHERE state = 'dead' ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {"id": i, "url": url, "key": key, "payload": json.loads(payload), "attempts": attempts, "error": error}
+            for i, url, key, payload, attempts, error in rows
+        ]
+
+    def close(self):
+        with self.lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+async def _send(client, row) -> tuple:
+    entry_id, url, payload, headers, version, attempts = row
+    try:
+        response = await client.post(url, json=json.loads(payload), headers=json.loads(headers))
+    except httpx.RequestError as e:
+        return entry_id, version, attempts, f"Failed to reach API: {e}", True
+    if response.is_success:
+        return entry_id, version, attempts, None, False
+    return entry_id, version, attempts, f"API returned {response.status_code}: {response.text[:200]}", _retryable(response.status_code)
+
+
+async def flush(outbox: Outbox, session) -> int:
+    """Send one batch of due entries; returns how many were sent."""
+    # claim/settle commit with fsync, keep them off the loop like put()
+    rows = await asyncio.to_thread(outbox.claim)
+    if not rows:
+        return 0
+    async with session() as client:
+        results = await asyncio.gather(*(_send(client, row) for row in rows))
+    await asyncio.to_thread(outbox.settle, results)
+    sent = sum(1 for result in results if result[3] is None)
+    outbox.sent += sent
+    outbox.failed += len(results) - sent
+    errors = [result[3] for result in results if result[3] is not None]
+    if errors:
+        print(f"Outbox: {len(errors)} of {len(results)} deliveries failed ({errors[0]})")
+    return sent
+
+
+async def run_flusher(outbox: Outbox, session):
+    """Drain the outbox until cancelled, waking early when a handler enqueues."""
+    while True:
+        try:
+            while await flush(outbox, session):
+                pass
+        except sqlite3.Error as e:
+            print(f"Outbox flush failed: {e}")
+
+        next_due = outbox.next_due()
+        delay = IDLE_SECONDS if next_due is None else min(IDLE_SECONDS, max(0.0, next_due - time.time()))
+        outbox.wakeup.clear()
+        try:
+            await asyncio.wait_for(outbox.wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
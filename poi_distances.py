@@ -0,0 +1,203 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from occupancy_map import FREE, MAP_CACHE_DIR, OccupancyMap
+
+# Travel distances are found with a multi-source Dial/Dijkstra wavefront on
+# the free cells, 8-connected with integer chamfer costs (5 straight, 7
+# diagonal, ~1:1.4) so every bucket is expanded as one NumPy batch.
+STRAIGHT_COST = 5
+DIAGONAL_COST = 7
+MAX_STATE_CELLS = 20_000_000    # sources x cells expanded together, bounds memory
+UNREACHABLE = np.inf
+
+_NEIGHBOURS = [
+    (-1, 0, STRAIGHT_COST), (1, 0, STRAIGHT_COST), (0, -1, STRAIGHT_COST), (0, 1, STRAIGHT_COST),
+    (-1, -1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST), (1, 1, DIAGONAL_COST),
+]
+
+
+def parse_pois(pois) -> tuple:
+    """(names, xy) from a SLAMTEC POI list, names normalised like move_to_location."""
+    names, xy = [], []
+    for poi in pois:
+        name = poi.get("metadata", {}).get("display_name")
+        pose = poi.get("pose")
+        if not name or not pose:
+            continue
+        names.append(name.strip().lower())
+        xy.append((float(pose.get("x", 0.0)), float(pose.get("y", 0.0))))
+    return names, np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+
+
+def poi_set_version(names, xy) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update("\0".join(names).encode())
+    digest.update(np.round(np.asarray(xy, dtype=np.float64), 3).tobytes())
+    return digest.hexdigest()
+
+
+def _wavefront(free: np.ndarray, width: int, sources: np.ndarray) -> np.ndarray:
+    """Chamfer distances (cost units) from each source cell to every cell, shape (len(sources), cells)."""
+    cells = free.size
+    count = len(sources)
+    dist = np.full(count * cells, np.iinfo(np.int32).max, dtype=np.int32)
+    done = np.zeros(count * cells, dtype=bool)
+
+    start = np.arange(count, dtype=np.int64) * cells + sources
+    dist[start] = 0
+    buckets = {0: [start]}
+    cost = 0
+
+    while buckets:
+        pending = buckets.pop(cost, None)
+        if pending is None:
+            cost += 1
+            continue
+
+        state = np.unique(np.concatenate(pending))
+        state = state[(dist[state] == cost) & ~done[state]]
+        done[state] = True
+
+        source, cell = np.divmod(state, cells)
+        row, col = np.divmod(cell, width)
+        height = cells // width
+
+        for dr, dc, step in _NEIGHBOURS:
+            nr, nc = row + dr, col + dc
+            ok = (nr >= 0) & (nr < height) & (nc >= 0) & (nc < width)
+            ok[ok] &= free[nr[ok] * width + nc[ok]]
+            if dr and dc:
+                # No corner cutting between two blocked cells
+                ok[ok] &= free[row[ok] * width + nc[ok]] & free[nr[ok] * width + col[ok]]
+
+            target = source[ok] * cells + nr[ok] * width + nc[ok]
+            target = target[cost + step < dist[target]]
+            if target.size:
+                dist[target] = cost + step
+                buckets.setdefault(cost + step, []).append(target)
+
+        cost += 1
+
+    return dist.reshape(count, cells)
+
+
+class PoiDistanceService:
+    """All-pairs travel distances between POIs, cached by map hash and POI-set
+    version. Adding or moving a POI recomputes only its row and column."""
+
+    def __init__(self, occupancy: OccupancyMap, cache_dir: str = MAP_CACHE_DIR):
+        self.occupancy = occupancy
+        self.cache_dir = cache_dir
+        self.names = []
+        self.xy = np.empty((0, 2))
+        self.matrix = np.empty((0, 0))
+        self.version = None
+        self._free = (np.asarray(occupancy.grid) == FREE).ravel()
+        self._lock = threading.Lock()
+
+    def _cache_path(self, version: str) -> str:
+        return os.path.join(self.cache_dir, f"{self.occupancy.map_hash}.{version}.dist.npz")
+
+    def _cells(self, xy: np.ndarray) -> np.ndarray:
+        rows, cols = self.occupancy.world_to_cell(xy[:, 0], xy[:, 1])
+        return np.where(rows >= 0, rows * self.occupancy.width + cols, -1)
+
+    def _rows(self, xy: np.ndarray) -> np.ndarray:
+        """Distances (m) from each of xy to every known POI, shape (len(xy), len(self.names))."""
+        sources = self._cells(xy)
+        targets = self._cells(self.xy)
+        out = np.full((len(xy), len(self.names)), UNREACHABLE)
+
+        # A POI stands where the robot parks, so its own cell is traversable
+        free = self._free.copy()
+        free[sources[sources >= 0]] = True
+        free[targets[targets >= 0]] = True
+
+        valid = np.flatnonzero(sources >= 0)
+        batch = max(1, MAX_STATE_CELLS // free.size)
+        for start in range(0, len(valid), batch):
+            chunk = valid[start:start + batch]
+            dist = _wavefront(free, self.occupancy.width, sources[chunk])
+            known = targets >= 0
+            reached = dist[:, targets[known]].astype(np.float64)
+            reached[reached == np.iinfo(np.int32).max] = UNREACHABLE
+            out[np.ix_(chunk, np.flatnonzero(known))] = reached * self.occupancy.resolution / STRAIGHT_COST
+        return out
+
+    def update(self, names, xy):
+        """Bring the matrix in line with the given POI set, reusing what has not changed."""
+        with self._lock:
+            return self._update(names, np.asarray(xy, dtype=np.float64).reshape(-1, 2))
+
+    def _update(self, names, xy):
+        version = poi_set_version(names, xy)
+        if version == self.version:
+            return self
+
+        path = self._cache_path(version)
+        if os.path.exists(path):
+            cached = np.load(path)
+            self.names, self.xy, self.matrix = list(cached["names"]), cached["xy"], cached["matrix"]
+            self.version = version
+            return self
+
+        # Keep rows of POIs that are still there at the same place
+        old = {name: i for i, name in enumerate(self.names)}
+        keep_old, keep_new = [], []
+        for i, name in enumerate(names):
+            j = old.get(name)
+            if j is not None and np.allclose(self.xy[j], xy[i], atol=1e-3):
+                keep_old.append(j)
+                keep_new.append(i)
+
+        matrix = np.full((len(names), len(names)), UNREACHABLE)
+        matrix[np.ix_(keep_new, keep_new)] = self.matrix[np.ix_(keep_old, keep_old)]
+
+        self.names, self.xy = list(names), xy
+        changed = np.setdiff1d(np.arange(len(names)), keep_new)
+        if changed.size:
+            rows = self._rows(xy[changed])
+            matrix[changed, :] = rows
+            matrix[:, changed] = rows.T
+
+        self.matrix = matrix
+        self.version = version
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, names=np.asarray(self.names), xy=self.xy, matrix=self.matrix)
+        os.replace(tmp, path)
+        return self
+
+    def index(self, name: str) -> int:
+        return self.names.index(name.strip().lower())
+
+    def distance(self, a: str, b: str) -> float:
+        return float(self.matrix[self.index(a), self.index(b)])
+
+    def eta(self, a: str, b: str, speed: float) -> float:
+        """Seconds from a to b at a constant speed (m/s)."""
+        return self.distance(a, b) / speed
+
+    def order(self, start: str, names) -> list:
+        """Greedy nearest-next visiting order by travel distance."""
+        current = self.index(start)
+        remaining = [self.index(name) for name in names]
+        route = []
+        while remaining:
+            nearest = min(remaining, key=lambda j: self.matrix[current, j])
+            route.append(self.names[nearest])
+            remaining.remove(nearest)
+            current = nearest
+        return route
+
+    def as_dict(self) -> dict:
+        return {
+            "map_hash": self.occupancy.map_hash,
+            "poi_version": self.version,
+            "names": self.names,
+            "matrix": [[None if np.isinf(v) else round(float(v), 3) for v in row] for row in self.matrix],
+        }
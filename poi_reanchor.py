@@ -0,0 +1,127 @@
+import asyncio
+import sqlite3
+
+import httpx
+import numpy as np
+
+from admission import shed_handled
+from request_tracing import trace_headers
+
+# After re-mapping the map frame can shift; every POI is moved by the same
+# 2D rigid transform (rotation yaw about the origin, then translation x, y).
+PUSH_CONCURRENCY = 4
+
+# POI metadata key that links a SLAM POI to its medicalbot record, per type
+BACKEND_ID_KEYS = {
+    "Slot": "slot_id",
+    "Room_entry": "room_pos_id",
+    "Room_exit": "room_pos_id",
+}
+
+
+def wrap_angle(angle):
+    return (np.asarray(angle) + np.pi) % (2 * np.pi) - np.pi
+
+
+def estimate_rigid_transform(src_xy, dst_xy) -> tuple:
+    """Least-squares (x, y, yaw) mapping src points onto dst points (2D Kabsch, no scale)."""
+    src = np.asarray(src_xy, dtype=np.float64).reshape(-1, 2)
+    dst = np.asarray(dst_xy, dtype=np.float64).reshape(-1, 2)
+    if len(src) < 2 or len(src) != len(dst):
+        raise ValueError("Need at least two matching anchor points")
+
+    src_mean, dst_mean = src.mean(axis=0), dst.mean(axis=0)
+    cov = (src - src_mean).T @ (dst - dst_mean)
+    u, _, vt = np.linalg.svd(cov)
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag([1.0, d]) @ u.T
+    translation = dst_mean - rotation @ src_mean
+    return float(translation[0]), float(translation[1]), float(np.arctan2(rotation[1, 0], rotation[0, 0]))
+
+
+def apply_transform(xy, yaw, tx: float, ty: float, theta: float):
+    """Move every pose at once: xy (N, 2), yaw (N,) -> new xy, yaw."""
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.array([[c, -s], [s, c]])
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    return xy @ rotation.T + np.array([tx, ty]), wrap_angle(np.asarray(yaw, dtype=np.float64) + theta)
+
+
+def plan(pois, tx: float, ty: float, theta: float) -> list:
+    """Per-POI before/after diff for a SLAMTEC POI list, without touching anything."""
+    pois = [poi for poi in pois if poi.get("pose") and poi.get("id")]
+    xy = np.array([[poi["pose"].get("x", 0.0), poi["pose"].get("y", 0.0)] for poi in pois], dtype=np.float64).reshape(-1, 2)
+    yaw = np.array([poi["pose"].get("yaw", 0.0) for poi in pois], dtype=np.float64)
+    new_xy, new_yaw = apply_transform(xy, yaw, tx, ty, theta)
+
+    changes = []
+    for i, poi in enumerate(pois):
+        changes.append({
+            "id": poi["id"],
+            "metadata": poi.get("metadata", {}),
+            "before": {"x": float(xy[i, 0]), "y": float(xy[i, 1]), "yaw": float(yaw[i])},
+            "after": {"x": round(float(new_xy[i, 0]), 4), "y": round(float(new_xy[i, 1]), 4), "yaw": round(float(new_yaw[i]), 4)},
+            "shift": round(float(np.hypot(*(new_xy[i] - xy[i]))), 4),
+        })
+    return changes
+
+
+async def push(robot, changes, backend_urls: dict, outbox, concurrency: int = PUSH_CONCURRENCY) -> list:
+    """Write the moved poses to SLAM and, where the POI is linked, queue the
+    medicalbot write in the outbox under the same (url, key) a capture uses,
+    so it coalesces with any pending capture of that slot or room. backend is
+    "queued", "skipped" (no medicalbot record), "unlinked" (a medicalbot POI
+    without its id in the metadata) or an error."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def push_one(change):
+        metadata = change["metadata"]
+        result = {"id": change["id"], "name": metadata.get("display_name"), "slam": None, "backend": None}
+
+        async with semaphore:
+            try:
+                payload_slam = {"id": change["id"], "metadata": metadata, "pose": change["after"]}
+                slam_resp = await robot.client.post(robot.save_location_data, json=payload_slam, headers=trace_headers())
+                slam_resp.raise_for_status()
+                result["slam"] = "ok"
+            except httpx.HTTPError as e:
+                # Reported per POI, the rest of the push goes on
+                shed_handled(e)
+                result["slam"] = f"error: {e}"
+                return result
+
+            id_key = BACKEND_ID_KEYS.get(metadata.get("type"))
+            url = backend_urls.get(metadata.get("type"))
+            if not id_key or not url:
+                # Not a medicalbot POI
+                result["backend"] = "skipped"
+                return result
+            if metadata.get(id_key) is None:
+                # A medicalbot POI captured before its id was kept in the metadata:
+                # its backend record keeps the old pose until it is captured again
+                result["backend"] = "unlinked"
+                return result
+            try:
+                payload = {id_key: metadata[id_key], **change["after"]}
+                result["outbox_id"] = await outbox.put(url, metadata[id_key], payload, trace_headers())
+                result["backend"] = "queued"
+            except sqlite3.Error as e:
+                result["backend"] = f"error: {e}"
+        return result
+
+    return await asyncio.gather(*(push_one(change) for change in changes))
+
+
+def summarize(results) -> dict:
+    """Counts per outcome of a push."""
+    summary = {"moved": 0, "queued": 0, "skipped": 0, "unlinked": 0, "failed": 0}
+    for result in results:
+        if result["slam"] != "ok":
+            summary["failed"] += 1
+            continue
+        summary["moved"] += 1
+        if result["backend"] in ("queued", "skipped", "unlinked"):
+            summary[result["backend"]] += 1
+        else:
+            summary["failed"] += 1
+    return summary
@@ -0,0 +1,173 @@
+import asyncio
+import base64
+import bisect
+import hashlib
+import json
+import time
+
+from admission import PRIORITY_LOW, set_priority
+
+# Local copy of each robot's POI list so tablets can list and filter POIs
+# without a SLAMTEC round trip. Loaded at startup, updated in place by our
+# own captures and refreshed in the background.
+REFRESH_SECONDS = 30
+RETRY_SECONDS = 5
+VERSION_CHECK_SECONDS = 2       # multi-worker: how often the poller's POI version is compared
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def _sort_key(poi: dict) -> tuple:
+    return ((poi.get("metadata") or {}).get("display_name") or "").strip().lower(), str(poi["id"])
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    name, poi_id = json.loads(base64.urlsafe_b64decode(padded))
+    return str(name), str(poi_id)
+
+
+class PoiRegistry:
+    """POIs by id plus name-sorted keys per metadata.type, so a type filter,
+    a name prefix and a keyset cursor are all bisects."""
+
+    def __init__(self):
+        self.pois = {}
+        self.keys = {}          # type -> sorted [(name, id)]
+        self.loaded = False
+        self.version = 0
+        self.etag = None
+        self.last_modified = None
+        self.refreshed_at = None
+        self.attempted_at = 0.0
+        self.source_version = None
+
+    def _changed(self):
+        self.version += 1
+        digest = hashlib.blake2b(digest_size=8)
+        for key in sorted(self.pois):
+            digest.update(json.dumps(self.pois[key], sort_keys=True).encode())
+        self.etag = digest.hexdigest()
+        self.last_modified = time.time()
+
+    def replace(self, pois):
+        """Swap in a full POI list from SLAMTEC."""
+        new = {str(poi["id"]): poi for poi in pois if isinstance(poi, dict) and poi.get("id") is not None}
+        keys = {}
+        for poi in new.values():
+            keys.setdefault((poi.get("metadata") or {}).get("type"), []).append(_sort_key(poi))
+        for type_keys in keys.values():
+            type_keys.sort()
+
+        unchanged = self.loaded and new == self.pois
+        self.pois, self.keys = new, keys
+        self.loaded = True
+        self.refreshed_at = time.time()
+        if not unchanged:
+            self._changed()
+
+    def upsert(self, poi: dict):
+        """Apply one POI we have just written upstream."""
+        poi_id = str(poi["id"])
+        old = self.pois.get(poi_id)
+        if old == poi:
+            return
+        if old is not None:
+            type_keys = self.keys.get((old.get("metadata") or {}).get("type"), [])
+            index = bisect.bisect_left(type_keys, _sort_key(old))
+            if index < len(type_keys) and type_keys[index] == _sort_key(old):
+                del type_keys[index]
+        self.pois[poi_id] = poi
+        bisect.insort(self.keys.setdefault((poi.get("metadata") or {}).get("type"), []), _sort_key(poi))
+        self._changed()
+
+    def query(self, types=None, prefix: str = None, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+        """(items, next_cursor, total) in name order."""
+        prefix = (prefix or "").strip().lower()
+        after = decode_cursor(cursor) if cursor else None
+
+        ranges = []
+        for poi_type in (types if types else list(self.keys)):
+            type_keys = self.keys.get(poi_type, [])
+            lo = bisect.bisect_left(type_keys, (prefix, ""))
+            hi = bisect.bisect_left(type_keys, (prefix + "\uffff", "")) if prefix else len(type_keys)
+            ranges.append((type_keys, lo, hi))
+        total = sum(hi - lo for _, lo, hi in ranges)
+
+        # Merge the per-type ranges past the cursor; one extra key tells if there is a next page
+        candidates = []
+        for type_keys, lo, hi in ranges:
+            start = max(lo, bisect.bisect_right(type_keys, after)) if after else lo
+            candidates.extend(type_keys[start:min(hi, start + limit + 1)])
+        candidates.sort()
+        page = candidates[:limit]
+
+        next_cursor = encode_cursor(page[-1]) if len(candidates) > limit else None
+        return [self.pois[poi_id] for _, poi_id in page], next_cursor, total
+
+    def meta(self) -> dict:
+        return {
+            "count": len(self.pois),
+            "version": self.version,
+            "etag": self.etag,
+            "refreshed_at": self.refreshed_at,
+            "types": {str(poi_type): len(keys) for poi_type, keys in self.keys.items()},
+        }
+
+
+poi_registries = {}
+
+
+def registry_for(robot_id: str) -> PoiRegistry:
+    registry = poi_registries.get(robot_id)
+    if registry is None:
+        registry = poi_registries[robot_id] = PoiRegistry()
+    return registry
+
+
+async def refresh(robot):
+    resp = await robot.client.get(robot.fetch_pois)
+    resp.raise_for_status()
+    pois = resp.json()
+    if isinstance(pois, list):
+        registry_for(robot.robot_id).replace(pois)
+
+
+async def run_refresher(robot_registry, shared_state=None):
+    """Load every robot's POIs, then keep them fresh until cancelled. With the
+    shared-memory poller the list is reloaded from the poller's copy when its
+    POI version moves."""
+    set_priority(PRIORITY_LOW)
+    while True:
+        for robot in list(robot_registry.robots.values()):
+            registry = registry_for(robot.robot_id)
+            now = time.time()
+            snapshot = shared_state.read(robot.robot_id) if shared_state is not None else None
+            if not registry.loaded:
+                due = now - registry.attempted_at >= RETRY_SECONDS
+            elif snapshot is not None:
+                due = snapshot["poi_version"] != registry.source_version
+            else:
+                due = now - registry.attempted_at >= REFRESH_SECONDS
+            if not due:
+                continue
+
+            registry.attempted_at = now
+            try:
+                if shared_state is not None:
+                    # The poller already fetched this version's list, no upstream call per worker
+                    pois = await asyncio.to_thread(shared_state.read_pois, robot.robot_id)
+                    if pois is None:
+                        continue
+                    if isinstance(pois, list):
+                        registry.replace(pois)
+                else:
+                    await refresh(robot)
+                registry.source_version = snapshot["poi_version"] if snapshot else None
+            except Exception as e:
+                print(f"POI refresh failed for {robot.robot_id}: {e}")
+        await asyncio.sleep(VERSION_CHECK_SECONDS if shared_state is not None else 1)
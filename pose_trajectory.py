@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+from robot_registry import DEFAULT_ROBOT_ID, ROBOTS_FILE, RobotRegistry
+
+# One pair of files per robot and UTC day under trajectories/<robot_id>/:
+#   <day>.traj  concatenated compressed chunks
+#   <day>.idx   one INDEX record per chunk (t_start, t_end, offset, length, count)
+# A chunk stores t, x, y, yaw as delta-encoded int32 columns (ms, mm, mm,
+# 1e-4 rad), byte-transposed and zlib-compressed. Readers only touch the
+# chunks whose [t_start, t_end] overlaps the requested range.
+TRAJECTORY_DIR = "trajectories"
+SAMPLE_HZ = 5
+CHUNK_SECONDS = 60
+CHUNK_SAMPLES = 4096
+
+INDEX = struct.Struct("<ddQII")
+INDEX_DTYPE = np.dtype([("t_start", "<f8"), ("t_end", "<f8"), ("offset", "<u8"), ("length", "<u4"), ("count", "<u4")])
+SCALES = np.array([1e3, 1e3, 1e3, 1e4])     # t (relative to t_start), x, y, yaw
+
+
+def day_of(t: float) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _paths(directory: str, robot_id: str, day: str):
+    base = os.path.join(directory, robot_id, day)
+    return f"{base}.traj", f"{base}.idx"
+
+
+def encode_chunk(t, x, y, yaw) -> bytes:
+    columns = np.stack([np.asarray(t) - t[0], x, y, yaw])
+    quantized = np.rint(columns * SCALES[:, None]).astype(np.int32)
+    deltas = np.diff(quantized, axis=1, prepend=0).astype(np.int32)
+    # Byte-transposed: the high bytes of small deltas are zero runs
+    shuffled = deltas.view(np.uint8).reshape(4, -1, 4).transpose(0, 2, 1)
+    return zlib.compress(np.ascontiguousarray(shuffled).tobytes(), 6)
+
+
+def decode_chunk(blob: bytes, t_start: float, count: int) -> np.ndarray:
+    """(4, count) float64 array of t, x, y, yaw."""
+    shuffled = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(4, 4, count)
+    deltas = np.ascontiguousarray(shuffled.transpose(0, 2, 1)).view(np.int32).reshape(4, count)
+    columns = np.cumsum(deltas, axis=1, dtype=np.int64) / SCALES[:, None]
+    columns[0] += t_start
+    return columns
+
+
+class TrajectoryWriter:
+    """Appends samples into a preallocated buffer and writes one compressed
+    chunk every CHUNK_SECONDS / CHUNK_SAMPLES, so each append costs the same."""
+
+    def __init__(self, robot_id: str, directory: str = TRAJECTORY_DIR):
+        self.robot_id = robot_id
+        self.directory = directory
+        self.buffer = np.empty((4, CHUNK_SAMPLES), dtype=np.float64)
+        self.count = 0
+        self.day = None
+        os.makedirs(os.path.join(directory, robot_id), exist_ok=True)
+
+    def _recover(self, day: str):
+        """Drop a torn index record or chunk left behind by a crash."""
+        data_path, index_path = _paths(self.directory, self.robot_id, day)
+        if not os.path.exists(index_path):
+            if os.path.exists(data_path):
+                os.truncate(data_path, 0)
+            return
+        size = os.path.getsize(index_path)
+        if size % INDEX.size:
+            os.truncate(index_path, size - size % INDEX.size)
+        end = 0
+        if size >= INDEX.size:
+            with open(index_path, "rb") as f:
+                f.seek((size // INDEX.size - 1) * INDEX.size)
+                _, _, offset, length, _ = INDEX.unpack(f.read(INDEX.size))
+                end = offset + length
+        if os.path.exists(data_path) and os.path.getsize(data_path) > end:
+            os.truncate(data_path, end)
+
+    def append(self, t: float, x: float, y: float, yaw: float):
+        day = day_of(t)
+        if day != self.day:
+            self.flush()
+            self._recover(day)
+            self.day = day
+        elif self.count and t - self.buffer[0, 0] >= CHUNK_SECONDS:
+            self.flush()
+
+        self.buffer[:, self.count] = (t, x, y, yaw)
+        self.count += 1
+        if self.count == CHUNK_SAMPLES:
+            self.flush()
+
+    def flush(self):
+        if not self.count:
+            return
+        t, x, y, yaw = self.buffer[:, :self.count]
+        blob = encode_chunk(t, x, y, yaw)
+        data_path, index_path = _paths(self.directory, self.robot_id, self.day)
+
+        # Data first, index last: a chunk is only visible once fully written
+        with open(data_path, "ab") as f:
+            offset = f.tell()
+            f.write(blob)
+        with open(index_path, "ab") as f:
+            f.write(INDEX.pack(t[0], t[-1], offset, len(blob), self.count))
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+
+def read_index(robot_id: str, day: str, directory: str = TRAJECTORY_DIR) -> np.ndarray:
+    _, index_path = _paths(directory, robot_id, day)
+    if not os.path.exists(index_path):
+        return np.empty(0, dtype=INDEX_DTYPE)
+    raw = np.fromfile(index_path, dtype=np.uint8)
+    return raw[:len(raw) - len(raw) % INDEX.size].view(INDEX_DTYPE)
+
+
+def read_range(robot_id: str, start: float, end: float, directory: str = TRAJECTORY_DIR) -> dict:
+    """Samples with start <= t <= end, as float arrays keyed t, x, y, yaw."""
+    parts = []
+    day = datetime.fromtimestamp(start, timezone.utc).date()
+    last = datetime.fromtimestamp(end, timezone.utc).date()
+    while day <= last:
+        name = day.strftime("%Y-%m-%d")
+        index = read_index(robot_id, name, directory)
+        hits = index[(index["t_end"] >= start) & (index["t_start"] <= end)]
+        if len(hits):
+            data_path, _ = _paths(directory, robot_id, name)
+            with open(data_path, "rb") as f:
+                for chunk in hits:
+                    f.seek(int(chunk["offset"]))
+                    columns = decode_chunk(f.read(int(chunk["length"])), float(chunk["t_start"]), int(chunk["count"]))
+                    parts.append(columns[:, (columns[0] >= start) & (columns[0] <= end)])
+        day = day.fromordinal(day.toordinal() + 1)
+
+    columns = np.concatenate(parts, axis=1) if parts else np.empty((4, 0))
+    return dict(zip(("t", "x", "y", "yaw"), columns))
+
+
+async def record(robot, rate: float = SAMPLE_HZ, directory: str = TRAJECTORY_DIR):
+    """Sample fetch_position at a fixed rate until cancelled."""
+    writer = TrajectoryWriter(robot.robot_id, directory)
+    period = 1.0 / rate
+    next_at = time.monotonic()
+    try:
+        while True:
+            try:
+                resp = await robot.client.get(robot.fetch_position)
+                resp.raise_for_status()
+                data = resp.json()
+                if None not in (data.get("x"), data.get("y"), data.get("yaw")):
+                    writer.append(time.time(), float(data["x"]), float(data["y"]), float(data["yaw"]))
+            except (httpx.HTTPError, ValueError, AttributeError) as e:
+                print(f"Pose sample failed: {e}")
+
+            # Fixed schedule, skipping missed ticks instead of bursting to catch up
+            next_at += period
+            now = time.monotonic()
+            if next_at < now:
+                next_at = now
+            await asyncio.sleep(next_at - now)
+    finally:
+        writer.close()
+
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.astimezone()
+        return parsed.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and read robot pose trajectories")
+    parser.add_argument("--dir", default=TRAJECTORY_DIR)
+    parser.add_argument("--robot", default=DEFAULT_ROBOT_ID)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="sample the robot pose until interrupted")
+    rec.add_argument("--rate", type=float, default=SAMPLE_HZ, help="samples per second")
+    rec.add_argument("--robots-file", default=ROBOTS_FILE)
+    rec.add_argument("--base-url", default="http://192.168.11.1:1448", help="SLAMTEC controller when robots.json is absent")
+
+    read = sub.add_parser("read", help="dump samples in a time range as JSON lines")
+    read.add_argument("--start", required=True, help="epoch seconds or ISO time")
+    read.add_argument("--end", help="epoch seconds or ISO time (default: now)")
+
+    info = sub.add_parser("info", help="chunks and size per day")
+    info.add_argument("--day", default=day_of(time.time()))
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        robot = RobotRegistry.from_file(args.robots_file, default_base_url=args.base_url).get(args.robot)
+        if robot is None:
+            parser.error(f"Unknown robot {args.robot}")
+        print(f"✅ Recording {args.robot} at {args.rate} Hz into {args.dir}")
+        try:
+            asyncio.run(record(robot, args.rate, args.dir))
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == "read":
+        end = _parse_time(args.end) if args.end else time.time()
+        samples = read_range(args.robot, _parse_time(args.start), end, args.dir)
+        for t, x, y, yaw in zip(samples["t"], samples["x"], samples["y"], samples["yaw"]):
+            print(json.dumps({"t": round(t, 3), "x": x, "y": y, "yaw": yaw}))
+
+    elif args.command == "info":
+        index = read_index(args.robot, args.day, args.dir)
+        samples = int(index["count"].sum())
+        size = int(index["length"].sum())
+        print(f"{args.day}: {len(index)} chunks, {samples} samples, {size} bytes"
+              f" ({size / samples if samples else 0:.2f} B/sample)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import numpy as np
+
+from occupancy_map import OCCUPIED, UNKNOWN, OccupancyMap
+from poi_distances import poi_set_version
+
+OBSTACLE_CLEARANCE = 0.25   # m, warn when an obstacle is closer than the robot radius
+DUPLICATE_RADIUS = 0.3      # m, reject when another POI is already this close
+MAX_DUPLICATE_RADIUS = 5.0  # m, largest radius a caller may ask for
+MIN_CELL = 0.01             # m, smallest PoiIndex cell
+
+ACCEPT = "accept"
+WARN = "warn"
+REJECT = "reject"
+UNVALIDATED = "unvalidated"  # no map for the robot yet, nothing was checked
+
+
+def dilate(mask: np.ndarray, radius_cells: int) -> np.ndarray:
+    """Grow a boolean grid by a disk of radius_cells, one slice-OR per offset."""
+    out = mask.copy()
+    height, width = mask.shape
+    for dr in range(-radius_cells, radius_cells + 1):
+        for dc in range(-radius_cells, radius_cells + 1):
+            if (dr or dc) and dr * dr + dc * dc <= radius_cells * radius_cells:
+                out[max(0, dr):height + min(0, dr), max(0, dc):width + min(0, dc)] |= \
+                    mask[max(0, -dr):height + min(0, -dr), max(0, -dc):width + min(0, -dc)]
+    return out
+
+
+class PoiIndex:
+    """Spatial hash over POIs with radius-sized cells, kept as sorted cell
+    keys so memory follows the POI count and not the map extent. A batch
+    query looks up the 3x3 cells around every pose with np.searchsorted,
+    so the cost per pose does not grow with the POI count."""
+
+    def __init__(self, names, xy, radius: float):
+        if not radius > 0:
+            raise ValueError(f"radius must be positive, got {radius}")
+        self.names = np.asarray(names, dtype=object)
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        # A cell wider than the radius still finds every POI within it; the
+        # floor keeps the flat cell key from overflowing on a tiny radius
+        self.cell = max(radius, MIN_CELL)
+
+        cells = np.floor(self.xy / self.cell).astype(np.int64)
+        self.low = cells.min(axis=0) - 1 if len(cells) else np.zeros(2, dtype=np.int64)
+        self.high = cells.max(axis=0) + 1 if len(cells) else np.zeros(2, dtype=np.int64)
+        self.span = int(self.high[1] - self.low[1]) + 1
+
+        keys = self._keys(cells)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        # Candidates per cell are padded to the fullest cell; POIs sit a bed-width apart so it stays small
+        slot = np.arange(len(self.keys)) - np.searchsorted(self.keys, self.keys, side="left")
+        self.capacity = int(slot.max()) + 1 if len(slot) else 1
+
+    def _keys(self, cells):
+        return (cells[:, 0] - self.low[0]) * self.span + (cells[:, 1] - self.low[1])
+
+    def nearest(self, x, y, exclude_names=None):
+        """(distance, index) of the closest POI within one cell ring, inf/-1 if none."""
+        qx = np.asarray(x, dtype=np.float64).ravel()
+        qy = np.asarray(y, dtype=np.float64).ravel()
+        cells = np.floor(np.stack([qx, qy], axis=1) / self.cell).astype(np.int64)
+        if not len(self.keys):
+            return np.full(len(qx), np.inf), np.full(len(qx), -1, dtype=np.int64)
+
+        candidates = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                ring = cells + (dx, dy)
+                inside = ((ring >= self.low) & (ring <= self.high)).all(axis=1)
+                keys = np.where(inside, self._keys(np.clip(ring, self.low, self.high)), -1)
+                at = np.searchsorted(self.keys, keys, side="left")[:, None] + np.arange(self.capacity)
+                at = np.minimum(at, len(self.keys) - 1)
+                candidates.append(np.where(self.keys[at] == keys[:, None], self.order[at], -1))
+        candidates = np.concatenate(candidates, axis=1)
+
+        valid = candidates >= 0
+        safe = np.where(valid, candidates, 0)
+        dist = np.hypot(self.xy[safe, 0] - qx[:, None], self.xy[safe, 1] - qy[:, None])
+        if exclude_names is not None:
+            valid &= self.names[safe] != np.asarray(exclude_names, dtype=object).reshape(-1, 1)
+        dist = np.where(valid, dist, np.inf)
+
+        best = dist.argmin(axis=1)
+        rows = np.arange(len(qx))
+        nearest = dist[rows, best]
+        return nearest, np.where(np.isfinite(nearest), candidates[rows, best], -1)
+
+
+class PoseValidator:
+    """Accept / warn / reject decisions for captured poses, checked against
+    the occupancy grid and the existing POIs before anything is written."""
+
+    def __init__(self, occupancy: OccupancyMap, clearance: float = OBSTACLE_CLEARANCE):
+        self.occupancy = occupancy
+        grid = np.asarray(occupancy.grid)
+        radius_cells = int(np.ceil(clearance / occupancy.resolution))
+        self.near_obstacle = dilate(grid == OCCUPIED, radius_cells)
+        self._index = None
+        self._index_key = None
+
+    def _poi_index(self, names, xy, radius):
+        key = (poi_set_version(names, xy), radius)
+        if key != self._index_key:
+            self._index = PoiIndex(names, xy, radius)
+            self._index_key = key
+        return self._index
+
+    def check(self, x, y, poi_names=(), poi_xy=(), radius: float = DUPLICATE_RADIUS, exclude_names=None) -> list:
+        """Validate one pose or a batch; exclude_names lets a POI be re-captured under its own name."""
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+
+        values = self.occupancy.values_at(x, y)
+        rows, cols = self.occupancy.world_to_cell(x, y)
+        inside = rows >= 0
+        near = np.zeros(len(x), dtype=bool)
+        near[inside] = self.near_obstacle[rows[inside], cols[inside]]
+
+        if len(poi_names):
+            nearest, index = self._poi_index(list(poi_names), poi_xy, radius).nearest(x, y, exclude_names)
+        else:
+            nearest, index = np.full(len(x), np.inf), np.full(len(x), -1)
+        duplicate = nearest <= radius
+
+        decisions = []
+        for i in range(len(x)):
+            reasons = []
+            if not inside[i]:
+                reasons.append("outside_map")
+            elif values[i] == OCCUPIED:
+                reasons.append("inside_obstacle")
+            elif values[i] == UNKNOWN:
+                reasons.append("unknown_cell")
+            elif near[i]:
+                reasons.append("near_obstacle")
+            if duplicate[i]:
+                reasons.append("duplicate_poi")
+
+            if not inside[i] or values[i] == OCCUPIED or duplicate[i]:
+                decision = REJECT
+            elif reasons:
+                decision = WARN
+            else:
+                decision = ACCEPT
+
+            decisions.append({
+                "decision": decision,
+                "reasons": reasons,
+                "nearest_poi": str(self._index.names[index[i]]) if index[i] >= 0 else None,
+                "nearest_distance": round(float(nearest[i]), 3) if np.isfinite(nearest[i]) else None,
+            })
+        return decisions
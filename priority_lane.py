@@ -0,0 +1,117 @@
+import asyncio
+import websockets
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from flight_recorder import open_recorder
+
+# Emergency and help traffic gets its own connection per channel, run
+# together by run_channels in one asyncio loop apart from the joint/arm
+# telemetry receivers, and every frame is handled as soon as it arrives.
+PRIORITY_CHANNELS = {
+    "emergency": "ws://192.168.1.33:8000/ws/socket-server/emergency-status/",
+    "help": "ws://192.168.1.57:8000/ws/socket-server/help/",
+}
+
+RETRY_SECONDS = 1
+LATENCY_WINDOW = 1000
+
+
+def stamp_event(payload: dict) -> dict:
+    """Add an event id and a send timestamp (epoch seconds) to an outgoing payload."""
+    return {**payload, "event_id": payload.get("event_id") or str(uuid.uuid4()), "sent_at": time.time()}
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, latency_ms: float):
+        with self._lock:
+            self._samples.append(latency_ms)
+            self.count += 1
+
+    def percentiles(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "p50": None, "p95": None, "p99": None, "max": None}
+
+        def pick(q):
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))], 3)
+
+        return {
+            "count": self.count,
+            "p50": pick(0.50),
+            "p95": pick(0.95),
+            "p99": pick(0.99),
+            "max": round(samples[-1], 3),
+        }
+
+
+latency_trackers = {name: LatencyTracker() for name in PRIORITY_CHANNELS}
+
+
+def print_event(channel: str, event: dict):
+    print(f"🚨 [{channel}] {event}")
+
+
+async def run_channel(channel: str, uri: str, handler=print_event, tracker: LatencyTracker = None):
+    tracker = tracker or latency_trackers.setdefault(channel, LatencyTracker())
+    recorder = open_recorder(channel)
+
+    while True:
+        try:
+            async with websockets.connect(uri, ping_interval=5, ping_timeout=5) as websocket:
+                print(f"Connected to {channel} channel. Waiting for messages...")
+
+                async for message in websocket:
+                    received_at = time.time()
+                    if recorder:
+                        recorder.record(message)
+                    try:
+                        data = json.loads(message)
+                    except ValueError as e:
+                        # One bad frame must not cost the connection
+                        print(f"{channel} skipped malformed frame: {e}")
+                        continue
+
+                    sent_at = data.get("sent_at") if isinstance(data, dict) else None
+                    if sent_at is not None:
+                        try:
+                            latency_ms = (received_at - float(sent_at)) * 1000
+                        except (TypeError, ValueError):
+                            # A bad stamp loses the latency sample, not the event
+                            print(f"{channel} frame with unusable sent_at: {sent_at!r}")
+                        else:
+                            tracker.record(latency_ms)
+                            data["received_at"] = received_at
+                            data["latency_ms"] = round(latency_ms, 3)
+
+                    # Dispatch straight away, there is no queue on this lane
+                    try:
+                        handler(channel, data)
+                    except Exception as e:
+                        print(f"{channel} handler failed: {e}")
+        except websockets.exceptions.ConnectionClosed as e:
+            print(f"{channel} connection closed: {e.code} - {e.reason}")
+        except (ConnectionRefusedError, OSError) as e:
+            print(f"{channel} connection error: {e}")
+        except Exception as e:
+            print(f"{channel} unhandled error: {e}")
+
+        # Emergencies must not wait long for a reconnect
+        await asyncio.sleep(RETRY_SECONDS)
+
+
+async def run_channels(channels: dict = None, handler=print_event):
+    channels = channels or PRIORITY_CHANNELS
+    await asyncio.gather(*(run_channel(name, uri, handler) for name, uri in channels.items()))
+
+
+if __name__ == "__main__":
+    asyncio.run(run_channels())
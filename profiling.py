@@ -0,0 +1,333 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from request_tracing import current_request_id
+
+# Opt-in sampling profiler for individual requests plus an always-on
+# event-loop stall watchdog. Both run in a helper thread that looks at the
+# loop thread's stack, so nothing is added to the request path unless a
+# request is picked for profiling. Output is collapsed stacks ("a;b;c N"),
+# the input format of flamegraph.pl, speedscope and inferno.
+PROFILE_DIR = "profiles"
+PROFILE_ENV = "ROS_WEBHOOK_PROFILE"     # "<rate>" or "<rate>:<route>,<route>"
+SAMPLE_INTERVAL = 0.005                 # seconds between stack samples of a profiled request
+STALL_THRESHOLD = 0.1                   # loop blocked longer than this is a stall
+HEARTBEAT_INTERVAL = 0.02
+MAX_STALLS = 100
+MAX_PROFILES = 200                      # files kept in PROFILE_DIR
+MAX_NAME_PART = 64                      # chars of route / request id in a profile file name
+
+
+def _name_part(value: str) -> str:
+    """A client-controlled value (X-Request-ID, path) made safe for a file name."""
+    return re.sub(r"[^A-Za-z0-9_-]", "", value)[:MAX_NAME_PART]
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+
+
+def collapse(codes) -> str:
+    """Root-first code objects as one collapsed-stack key."""
+    return ";".join(frame_label(code) for code in codes).replace(" ", "_")
+
+
+def _running_stack(frame, root_code):
+    """Loop-thread stack from the task's own coroutine down to the leaf."""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        if frame.f_code is root_code:
+            break
+        frame = frame.f_back
+    codes.reverse()
+    return codes
+
+
+def _awaiting_stack(task):
+    """Where a suspended task is parked, following the cr_await chain."""
+    codes = []
+    coro = task.get_coro()
+    while coro is not None:
+        code = getattr(coro, "cr_code", None) or getattr(coro, "gi_code", None)
+        if code is None:
+            codes.append(type(coro))
+            break
+        codes.append(code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return codes
+
+
+def _label(code) -> str:
+    return frame_label(code) if hasattr(code, "co_name") else f"{code.__qualname__}@native"
+
+
+def _collapse_any(codes) -> str:
+    return ";".join(_label(code) for code in codes).replace(" ", "_")
+
+
+class ProfilerConfig:
+    def __init__(self, sample_rate: float = 0.0, routes=None, interval: float = SAMPLE_INTERVAL):
+        self.sample_rate = sample_rate
+        self.routes = tuple(routes or ())
+        self.interval = interval
+
+    @classmethod
+    def from_env(cls):
+        value = os.environ.get(PROFILE_ENV, "")
+        if not value:
+            return cls()
+        rate, _, routes = value.partition(":")
+        return cls(float(rate), [route for route in routes.split(",") if route])
+
+    def should_profile(self, path: str) -> bool:
+        if self.sample_rate <= 0:
+            return False
+        if self.routes and not path.startswith(self.routes):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def as_dict(self) -> dict:
+        return {"sample_rate": self.sample_rate, "routes": list(self.routes), "interval_ms": self.interval * 1000}
+
+
+class RequestProfiler:
+    """Samples the loop thread while profiled requests are in flight. A
+    sample counts as on-CPU when the request's task is the one running and
+    as "[await]" (with the chain it is suspended in) otherwise, so upstream
+    waits and loop-blocking work land in different parts of the flame graph."""
+
+    def __init__(self, config: ProfilerConfig = None, directory: str = PROFILE_DIR):
+        self.config = config or ProfilerConfig.from_env()
+        self.directory = directory
+        self.active = {}        # task -> Counter of collapsed stacks
+        self.loop = None
+        self.loop_thread_id = None
+        self.thread = None
+        self.wake = threading.Event()
+        self.profiles = deque(maxlen=MAX_PROFILES)
+
+    def attach(self, loop):
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self.thread.start()
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            if not self.active:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+            self.sample()
+            time.sleep(self.config.interval)
+
+    def sample(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        running = asyncio.current_task(self.loop)
+        for task, counts in list(self.active.items()):
+            if task is running and frame is not None:
+                counts[collapse(_running_stack(frame, task.get_coro().cr_code))] += 1
+            else:
+                counts["[await];" + _collapse_any(_awaiting_stack(task))] += 1
+
+    def start(self, task):
+        if self.loop is None:
+            self.attach(asyncio.get_running_loop())
+        self.active[task] = Counter()
+        self._ensure_thread()
+
+    async def finish(self, task, path: str, duration: float):
+        counts = self.active.pop(task, None)
+        if not counts:
+            return None
+        slug = _name_part(path.strip("/").replace("/", "_")) or "root"
+        request_id = _name_part(current_request_id() or "") or format(id(task), "x")
+        name = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{request_id}.folded")
+        on_cpu = sum(count for stack, count in counts.items() if not stack.startswith("[await]"))
+        entry = {"file": name, "route": path, "duration_ms": round(duration * 1000, 1),
+                 "samples": sum(counts.values()), "on_cpu_samples": on_cpu}
+        evicted = self.profiles[0]["file"] if len(self.profiles) == self.profiles.maxlen else None
+        try:
+            await asyncio.to_thread(self._write, name, counts, evicted)
+        except OSError as e:
+            # Profiling must never fail the request it looked at
+            print(f"Profile for {path} not written: {e}")
+            return None
+        self.profiles.append(entry)
+        return entry
+
+    def _write(self, name: str, counts: Counter, evicted: str = None):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(name, "w") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        if evicted is not None:
+            try:
+                os.remove(evicted)
+            except OSError:
+                pass
+
+
+class LoopWatchdog:
+    """A heartbeat task on the loop and a thread that checks it. When the
+    loop has not come back for STALL_THRESHOLD the thread grabs the loop
+    thread's stack, which is the code that is blocking it."""
+
+    def __init__(self, threshold: float = STALL_THRESHOLD, directory: str = PROFILE_DIR):
+        self.threshold = threshold
+        self.directory = directory
+        self.last_beat = time.monotonic()
+        self.loop_thread_id = None
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.stall_stacks = Counter()
+        self.current = None
+        self.unwritten = deque()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    async def heartbeat(self):
+        while True:
+            self.last_beat = time.monotonic()
+            if self.current is not None:
+                self._stall_ended()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    def _stall_ended(self):
+        stall, self.current = self.current, None
+        stall["blocked_ms"] = round((time.monotonic() - stall["_since"]) * 1000, 1)
+        del stall["_since"]
+        # Written by the watchdog thread, not here on the loop
+        self.unwritten.append(json.dumps(stall))
+        print(f"Event loop blocked for {stall['blocked_ms']} ms in {stall['where']}")
+
+    def _write_stalls(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, "stalls.jsonl"), "a") as f:
+                while self.unwritten:
+                    f.write(self.unwritten.popleft() + "\n")
+        except OSError as e:
+            print(f"Stall records not written: {e}")
+
+    def _watch(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            if self.unwritten:
+                self._write_stalls()
+            since = self.last_beat
+            if self.current is not None or time.monotonic() - since < self.threshold + HEARTBEAT_INTERVAL:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            summary = traceback.extract_stack(frame)
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            self.stall_stacks[collapse(codes)] += 1
+            stall = {"t": time.time(), "_since": since, "blocked_ms": None, "where": frame_label(codes[-1]),
+                     "stack": [f"{entry.filename}:{entry.lineno} {entry.name}" for entry in summary[-12:]]}
+            self.stalls.append(stall)
+            self.current = stall
+
+    async def run(self):
+        self.loop_thread_id = threading.get_ident()
+        self.thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+        try:
+            await self.heartbeat()
+        finally:
+            self.stopped.set()
+
+    def summary(self) -> dict:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": [{k: v for k, v in stall.items() if k != "_since"} for stall in self.stalls],
+            "folded": [f"{stack} {count}" for stack, count in self.stall_stacks.most_common(20)],
+        }
+
+
+profiler = RequestProfiler()
+watchdog = LoopWatchdog()
+
+
+class ProfilingMiddleware:
+    """Pure ASGI; added innermost so it runs in the task the handler runs in."""
+
+    def __init__(self, app, profiler: RequestProfiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.config.should_profile(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        task = asyncio.current_task()
+        self.profiler.start(task)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.profiler.finish(task, scope["path"], time.perf_counter() - start)
+
+
+def merge(files) -> Counter:
+    counts = Counter()
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    counts[stack] += int(count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request profiles and loop stalls written by webhook_server")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    merge_parser = sub.add_parser("merge", help="merge .folded files into one, for flamegraph.pl / speedscope")
+    merge_parser.add_argument("files", nargs="*")
+    merge_parser.add_argument("--route", help="only profiles of this route (path with / replaced by _)")
+
+    top_parser = sub.add_parser("top", help="functions with the most self samples")
+    top_parser.add_argument("files", nargs="*")
+    top_parser.add_argument("--limit", type=int, default=20)
+    top_parser.add_argument("--cpu", action="store_true", help="ignore [await] samples")
+
+    args = parser.parse_args()
+    files = args.files or glob.glob(os.path.join(PROFILE_DIR, f"*{getattr(args, 'route', None) or ''}*.folded"))
+    counts = merge(files)
+
+    if args.command == "merge":
+        for stack, count in counts.most_common():
+            print(f"{stack} {count}")
+    else:
+        leaves = Counter()
+        for stack, count in counts.items():
+            if args.cpu and stack.startswith("[await]"):
+                continue
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        for leaf, count in leaves.most_common(args.limit):
+            print(f"{count:8d} {100 * count / total:5.1f}%  {leaf}")
+
+
+if __name__ == "__main__":
+    main()
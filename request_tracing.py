@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+# Spans are written one JSON object per line using the OpenTelemetry span
+# field names (traceId, spanId, parentSpanId, startTimeUnixNano, ...).
+TRACE_FILE = "traces.jsonl"
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUP_COUNT = 5
+
+# Sampling is decided when the request finishes: errors and slow requests are
+# always kept, everything else is kept at TRACE_SAMPLE_RATE.
+TRACE_SAMPLE_RATE = 0.1
+TRACE_SLOW_MS = 1000
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_logger = None
+
+
+def _trace_logger():
+    global _logger
+    if _logger is None:
+        _logger = logging.getLogger("request_tracing")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+    return _logger
+
+
+def _new_span_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    def __init__(self, request_id: str, route: str):
+        self.request_id = request_id
+        # Fresh per request: client retries reuse X-Request-ID, which stays a span attribute
+        self.trace_id = uuid.uuid4().hex
+        self.route = route
+        self.spans = []
+
+    def should_keep(self, status_code: int, duration_ms: float) -> bool:
+        if status_code >= 400 or duration_ms >= TRACE_SLOW_MS:
+            return True
+        return random.random() < TRACE_SAMPLE_RATE
+
+    def flush(self):
+        logger = _trace_logger()
+        for record in self.spans:
+            logger.info(json.dumps(record))
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def trace_headers() -> dict:
+    """Headers that carry the current request id and span to upstream services."""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    span_id = _current_span.get() or _new_span_id()
+    return {
+        REQUEST_ID_HEADER: trace.request_id,
+        "traceparent": f"00-{trace.trace_id}-{span_id}-01",
+    }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    span_id = _new_span_id()
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start_ns = time.time_ns()
+    status_code = "OK"
+    try:
+        yield span_id
+    except BaseException:
+        status_code = "ERROR"
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.spans.append({
+            "traceId": trace.trace_id,
+            "spanId": span_id,
+            "parentSpanId": parent_id,
+            "name": name,
+            "startTimeUnixNano": start_ns,
+            "endTimeUnixNano": time.time_ns(),
+            "status": {"code": status_code},
+            "attributes": {"request.id": trace.request_id, "http.route": trace.route, **attributes},
+        })
+
+
+async def tracing_middleware(request, call_next):
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    trace = Trace(request_id, request.url.path)
+    trace_token = _current_trace.set(trace)
+
+    status_code = 500
+    start = time.perf_counter()
+    try:
+        with span(f"{request.method} {request.url.path}", **{"http.method": request.method}):
+            response = await call_next(request)
+            status_code = response.status_code
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        _current_trace.reset(trace_token)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if trace.spans:
+            trace.spans[-1]["attributes"]["http.status_code"] = status_code
+        if trace.should_keep(status_code, duration_ms):
+            await asyncio.to_thread(trace.flush)
+
+
+# --- CLI ---------------------------------------------------------------
+
+def load_traces(path: str = TRACE_FILE) -> dict:
+    traces = defaultdict(list)
+    files = [path] + [f"{path}.{i}" for i in range(1, TRACE_BACKUP_COUNT + 1)]
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                traces[record["traceId"]].append(record)
+    return traces
+
+
+def _duration_ms(record):
+    return (record["endTimeUnixNano"] - record["startTimeUnixNano"]) / 1e6
+
+
+def _root(spans):
+    return next((s for s in spans if s["parentSpanId"] is None), None)
+
+
+def critical_path(spans) -> list:
+    """Spans that bound the request's latency, in start order.
+
+    Starting from the child that finished last, walk backwards through the
+    children that finished before the current one started, then recurse.
+    """
+    children = defaultdict(list)
+    for record in spans:
+        children[record["parentSpanId"]].append(record)
+
+    def walk(node):
+        path = [node]
+        chain = []
+        kids = sorted(children.get(node["spanId"], []), key=lambda s: s["endTimeUnixNano"])
+        while kids:
+            last = kids.pop()
+            chain.append(last)
+            kids = [k for k in kids if k["endTimeUnixNano"] <= last["startTimeUnixNano"]]
+        for child in reversed(chain):
+            path.extend(walk(child))
+        return path
+
+    root = _root(spans)
+    return walk(root) if root is not None else []
+
+
+def print_slowest(traces: dict, limit: int, route: str = None):
+    roots = [(_root(spans), spans) for spans in traces.values()]
+    roots = [(root, spans) for root, spans in roots if root is not None]
+    if route:
+        roots = [(root, spans) for root, spans in roots if root["attributes"].get("http.route") == route]
+    roots.sort(key=lambda item: _duration_ms(item[0]), reverse=True)
+
+    for root, spans in roots[:limit]:
+        attrs = root["attributes"]
+        print(f"{_duration_ms(root):9.1f} ms  {attrs.get('http.status_code', '-')}  {root['name']}  id={attrs['request.id']}")
+        for record in critical_path(spans)[1:]:
+            print(f"{'':14}-> {record['name']:<32} {_duration_ms(record):8.1f} ms  {record['status']['code']}")
+
+
+def print_route_summary(traces: dict):
+    # Mean time per hop for each route, ordered by the slowest hop
+    hops = defaultdict(lambda: defaultdict(list))
+    for spans in traces.values():
+        root = _root(spans)
+        if root is None:
+            continue
+        for record in spans:
+            if record is not root:
+                hops[root["attributes"]["http.route"]][record["name"]].append(_duration_ms(record))
+
+    for route, by_name in sorted(hops.items()):
+        print(route)
+        ranked = sorted(by_name.items(), key=lambda item: sum(item[1]) / len(item[1]), reverse=True)
+        for name, values in ranked:
+            values.sort()
+            mean = sum(values) / len(values)
+            p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+            print(f"    {name:<32} n={len(values):<5} mean={mean:8.1f} ms  p95={p95:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect webhook_server request traces")
+    parser.add_argument("--file", default=TRACE_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    slowest = sub.add_parser("slowest", help="slowest traces with their critical path")
+    slowest.add_argument("--limit", type=int, default=10)
+    slowest.add_argument("--route")
+
+    sub.add_parser("routes", help="per-route hop timings")
+
+    args = parser.parse_args()
+    traces = load_traces(args.file)
+
+    if args.command == "slowest":
+        print_slowest(traces, args.limit, args.route)
+    else:
+        print_route_summary(traces)
+
+
+if __name__ == "__main__":
+    main()
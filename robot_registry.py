@@ -0,0 +1,201 @@
+import contextvars
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi.responses import JSONResponse
+from starlette import status
+
+from admission import AdmissionController, admit
+
+# robots.json maps robot ids to their SLAMTEC controller, e.g.
+# {"ward3-a": {"slam_tech_base_url": "http://192.168.11.1:1448", "max_concurrency": 4}}
+ROBOTS_FILE = "robots.json"
+DEFAULT_ROBOT_ID = "default"
+ROBOT_ID_HEADER = "X-Robot-ID"
+# Set in multi-worker mode to the number of processes calling each robot, so
+# each one admits its part of max_concurrency and the robot's load stays the same
+ADMISSION_SHARE_ENV = "ROS_WEBHOOK_ADMISSION_SHARE"
+
+FAILURE_THRESHOLD = 3       # consecutive connection failures before a robot is marked down
+RETRY_AFTER_SECONDS = 5     # how long a down robot fails fast before it is probed again
+
+_current_robot = contextvars.ContextVar("current_robot", default=None)
+
+
+class _RobotTransport(httpx.AsyncBaseTransport):
+    """Connection pool for one robot that admits calls through its priority
+    queue and keeps its health state, failing fast while the robot is down."""
+
+    def __init__(self, robot, transport: httpx.AsyncBaseTransport):
+        self.robot = robot
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        robot = self.robot
+        if not robot.healthy and time.monotonic() < robot.down_until:
+            raise httpx.ConnectError(f"Robot {robot.robot_id} is unreachable, retrying in {RETRY_AFTER_SECONDS}s", request=request)
+
+        # Waits in the robot's priority queue, sheds with Overloaded when it is full
+        await admit(robot.admission, request)
+        robot.in_flight += 1
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError as e:
+            robot.consecutive_failures += 1
+            robot.last_error = str(e)
+            if not robot.healthy:
+                robot.down_until = time.monotonic() + RETRY_AFTER_SECONDS
+            raise
+        finally:
+            robot.in_flight -= 1
+            robot.admission.release()
+
+        robot.consecutive_failures = 0
+        robot.last_ok = time.time()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class Robot:
+    def __init__(self, robot_id: str, slam_tech_base_url: str, max_concurrency: int = 4,
+                 max_connections: int = 8, timeout: float = 10):
+        self.robot_id = robot_id
+        self.slam_tech_base_url = slam_tech_base_url.rstrip("/")
+        self.fetch_position = f"{self.slam_tech_base_url}/api/core/artifact/v1/pois"
+        self.fetch_pois = f"{self.slam_tech_base_url}/api/core/artifact/v1/pois"
+        self.fetch_battery_status = f"{self.slam_tech_base_url}/api/core/system/v1/power/status"
+        self.save_location_data = f"{self.slam_tech_base_url}/api/core/slam/v1/pois"
+        self.fetch_map_file = f"{self.slam_tech_base_url}/api/core/slam/v1/maps/stcm"
+
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.admission = AdmissionController(f"slamtec:{robot_id}", max_concurrency)
+        self._client = None
+
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.last_ok = None
+        self.last_error = None
+
+    def split_admission(self, share: int):
+        """Admit this process's part of max_concurrency when share processes call the robot."""
+        self.max_concurrency = max(1, self.max_concurrency // share)
+        self.admission = AdmissionController(f"slamtec:{self.robot_id}", self.max_concurrency)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            transport = _RobotTransport(self, httpx.AsyncHTTPTransport(verify=False, limits=limits))
+            self._client = httpx.AsyncClient(timeout=self.timeout, transport=transport)
+        return self._client
+
+    @property
+    def healthy(self) -> bool:
+        return self.consecutive_failures < FAILURE_THRESHOLD
+
+    @asynccontextmanager
+    async def session(self):
+        # The pooled client outlives the request, unlike a per-call AsyncClient
+        yield self.client
+
+    def health(self) -> dict:
+        return {
+            "robot_id": self.robot_id,
+            "slam_tech_base_url": self.slam_tech_base_url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "admission": self.admission.metrics(),
+            "consecutive_failures": self.consecutive_failures,
+            "last_ok": self.last_ok,
+            "last_error": self.last_error,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class RobotRegistry:
+    def __init__(self, robots=None, default_robot_id: str = DEFAULT_ROBOT_ID):
+        self.robots = {robot.robot_id: robot for robot in robots or []}
+        self.default_robot_id = default_robot_id
+
+    @classmethod
+    def from_file(cls, path: str, default_base_url: str, share: int = 1):
+        robots = []
+        if os.path.exists(path):
+            with open(path) as f:
+                for robot_id, config in json.load(f).items():
+                    robots.append(Robot(robot_id, **config))
+        if not robots:
+            robots.append(Robot(DEFAULT_ROBOT_ID, default_base_url))
+        if share > 1:
+            for robot in robots:
+                robot.split_admission(share)
+        return cls(robots, default_robot_id=robots[0].robot_id)
+
+    def add(self, robot: Robot):
+        self.robots[robot.robot_id] = robot
+
+    def get(self, robot_id: str = None):
+        return self.robots.get(robot_id or self.default_robot_id)
+
+    async def close(self):
+        for robot in self.robots.values():
+            await robot.close()
+
+
+def admission_share_from_env() -> int:
+    return int(os.environ.get(ADMISSION_SHARE_ENV) or 1)
+
+
+def current_robot() -> Robot:
+    return _current_robot.get()
+
+
+class RobotRoutingMiddleware:
+    """Pick the robot for a request from a /robots/<id>/... path prefix or the
+    X-Robot-ID header, strip the prefix and expose it through current_robot()."""
+
+    def __init__(self, app, registry: RobotRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        robot_id = None
+        path = scope["path"]
+        if path.startswith("/robots/"):
+            robot_id, _, rest = path[len("/robots/"):].partition("/")
+            scope = dict(scope, path="/" + rest, raw_path=("/" + rest).encode())
+        else:
+            for name, value in scope.get("headers", []):
+                if name.decode("latin-1").lower() == ROBOT_ID_HEADER.lower():
+                    robot_id = value.decode("latin-1")
+                    break
+
+        robot = self.registry.get(robot_id)
+        if robot is None:
+            response = JSONResponse(
+                {'status': 'error', 'message': f'Unknown robot: {robot_id}', 'data': None},
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+            return await response(scope, receive, send)
+
+        token = _current_robot.set(robot)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_robot.reset(token)
@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+import move_to_location as nav
+from occupancy_map import FREE, encode_stcm
+
+# A virtual robot behind the SLAMTEC endpoints that move_to_location.py and
+# webhook_server.py call. State is computed from a scaled clock when asked
+# for, never ticked, so accelerated time costs nothing: at --time-scale 20 a
+# 20 minute ward round takes a minute of wall time.
+SIM_HOST = "127.0.0.1"
+SIM_PORT = 9320
+SPEED = 0.7                     # m/s
+PLAN_SECONDS = 0.4              # per action, before the robot starts moving
+SETTLE_SECONDS = 1.5            # braking and yaw alignment at a precise goal
+IDLE_DRAIN_PER_HOUR = 2.0       # battery percent
+MOVE_DRAIN_PER_METRE = 0.05
+CHARGE_PER_HOUR = 30.0
+DOCK = (0.0, 0.0)
+DOCK_RADIUS = 0.2
+MAP_SIZE = 40.0                 # metres, square and free, centred on the dock
+MAP_RESOLUTION = 0.05
+
+
+class SimClock:
+    """Simulated seconds, running `scale` times faster than wall time."""
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.origin = time.perf_counter()
+
+    def now(self) -> float:
+        return (time.perf_counter() - self.origin) * self.scale
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds / self.scale)
+
+
+class _Action:
+    __slots__ = ("id", "started", "start", "targets", "yaw", "length", "fail_after")
+
+    def __init__(self, action_id, started, start, targets, yaw, fail_after):
+        self.id = action_id
+        self.started = started
+        self.start = start
+        self.targets = targets
+        self.yaw = yaw
+        self.length = sum(math.dist(a, b) for a, b in zip([start] + targets, targets))
+        self.fail_after = fail_after        # metres along the path, None for no failure
+
+
+class SimulatedRobot:
+    """Kinematics, battery and injected failures of one robot."""
+
+    def __init__(self, clock: SimClock, speed: float = SPEED, battery: float = 100.0, fail_rate: float = 0.0,
+                 series: bool = True, pois=None, seed: int = None):
+        self.clock = clock
+        self.speed = speed
+        self.fail_rate = fail_rate
+        self.series = series
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.pose_xy = DOCK
+        self.pose_yaw = 0.0
+        self.action = None
+        self.finished = {}          # action id -> final state, for actions replaced or done
+        self.battery = battery
+        self.updated_at = clock.now()
+        self.travelled = 0.0        # along the current action, at updated_at
+        self.odometer = 0.0
+        self.pois = {str(poi["id"]): poi for poi in (pois or [])}
+
+    # --- kinematics -------------------------------------------------------
+
+    def _progress(self, action: _Action, t: float):
+        """(x, y, travelled, done, failed) of an action at simulated time t."""
+        distance = max(0.0, min(action.length, (t - action.started - PLAN_SECONDS) * self.speed))
+        if action.fail_after is not None and distance >= action.fail_after:
+            distance = action.fail_after
+            failed = True
+        else:
+            failed = False
+        position, left = action.start, distance
+        for target in action.targets:
+            leg = math.dist(position, target)
+            if left < leg:
+                f = left / leg
+                position = (position[0] + f * (target[0] - position[0]), position[1] + f * (target[1] - position[1]))
+                break
+            left -= leg
+            position = target
+        arrived = distance >= action.length
+        settled = arrived and t - action.started - PLAN_SECONDS - action.length / self.speed >= SETTLE_SECONDS
+        return position[0], position[1], distance, failed or settled, failed
+
+    def _advance(self):
+        """Bring pose and battery up to now; called with the lock held."""
+        t = self.clock.now()
+        moved = 0.0
+        if self.action is not None:
+            x, y, travelled, done, failed = self._progress(self.action, t)
+            moved = travelled - self.travelled
+            self.travelled = travelled
+            self.pose_xy = (x, y)
+            if done:
+                if not failed:
+                    self.pose_yaw = self.action.yaw
+                self.finished[self.action.id] = (-1, "simulated failure: path blocked") if failed else (0, "")
+                self.action = None
+        hours = (t - self.updated_at) / 3600
+        if self.action is None and math.dist(self.pose_xy, DOCK) <= DOCK_RADIUS:
+            self.battery = min(100.0, self.battery + CHARGE_PER_HOUR * hours)
+        else:
+            self.battery = max(0.0, self.battery - IDLE_DRAIN_PER_HOUR * hours - MOVE_DRAIN_PER_METRE * moved)
+        self.odometer += moved
+        self.updated_at = t
+        if self.battery <= 0 and self.action is not None:
+            self.finished[self.action.id] = (-1, "battery empty")
+            self.action = None
+
+    def submit(self, payload: dict):
+        """Action dict for a MoveToAction or SeriesMoveToAction, None if unsupported."""
+        options = payload.get("options") or {}
+        if payload.get("action_name") == nav.SERIES_MOVE_TO_ACTION and self.series:
+            targets = [(float(t["x"]), float(t["y"])) for t in options["targets"]]
+        elif payload.get("action_name") == nav.MOVE_TO_ACTION:
+            targets = [(float(options["target"]["x"]), float(options["target"]["y"]))]
+        else:
+            return None
+        yaw = float((options.get("move_options") or {}).get("yaw", self.pose_yaw))
+        with self.lock:
+            self._advance()
+            if self.action is not None:
+                # A new action replaces the current one from where the robot is
+                self.finished[self.action.id] = (0, "replaced")
+            if self.battery <= 0:
+                return None
+            length = sum(math.dist(a, b) for a, b in zip([self.pose_xy] + targets, targets))
+            fail_after = self.random.uniform(0, length) if length and self.random.random() < self.fail_rate else None
+            self.action = _Action(next(self.ids), self.clock.now(), self.pose_xy, targets, yaw, fail_after)
+            self.travelled = 0.0
+            return {"action_id": self.action.id, "action_name": payload["action_name"], "state": {"status": 1, "result": 0, "reason": ""}}
+
+    def action_state(self, action_id: int):
+        with self.lock:
+            self._advance()
+            if self.action is not None and self.action.id == action_id:
+                return {"action_id": action_id, "state": {"status": 1, "result": 0, "reason": ""}}
+            if action_id in self.finished:
+                result, reason = self.finished[action_id]
+                return {"action_id": action_id, "state": {"status": nav.ACTION_DONE_STATUS, "result": result, "reason": reason}}
+            return None
+
+    def pose(self) -> dict:
+        with self.lock:
+            self._advance()
+            return {"x": self.pose_xy[0], "y": self.pose_xy[1], "z": 0, "yaw": self.pose_yaw}
+
+    def power_status(self) -> dict:
+        with self.lock:
+            self._advance()
+            docked = self.action is None and math.dist(self.pose_xy, DOCK) <= DOCK_RADIUS
+            return {
+                "batteryPercentage": round(self.battery, 2),
+                "batteryVoltage": round(22.0 + 3.2 * self.battery / 100, 3),
+                "batteryCurrent": 0.8 if docked else (-2.5 if self.action is not None else -0.4),
+                "batteryTemperature": 30.0,
+                "dockingStatus": "on_dock" if docked else "not_on_dock",
+                "isCharging": docked and self.battery < 100,
+                "isDCConnected": docked,
+            }
+
+
+def create_app(robot: SimulatedRobot, latency: float = 0.0, http_error_rate: float = 0.0,
+               position_from_pois: bool = False) -> FastAPI:
+    """The SLAMTEC HTTP surface of one simulated robot.
+
+    Robot.fetch_position in robot_registry.py reads the pose from GET
+    artifact/v1/pois, which also lists the POIs; position_from_pois answers
+    that URL with the pose for webhook capture runs."""
+    app = FastAPI()
+    app.state.robot = robot
+    errors = random.Random()
+
+    @app.middleware("http")
+    async def inject(request: Request, call_next):
+        if latency:
+            await asyncio.sleep(latency)
+        if http_error_rate and errors.random() < http_error_rate:
+            return JSONResponse({"error": "simulated controller error"}, status_code=500)
+        return await call_next(request)
+
+    @app.get("/api/core/artifact/v1/pois")
+    async def pois():
+        return robot.pose() if position_from_pois else list(robot.pois.values())
+
+    @app.post("/api/core/slam/v1/pois")
+    async def save_poi(request: Request):
+        poi = await request.json()
+        robot.pois[str(poi["id"])] = poi
+        return poi
+
+    @app.get("/api/core/slam/v1/localization/pose")
+    async def pose():
+        return robot.pose()
+
+    @app.get("/api/core/system/v1/power/status")
+    async def power_status():
+        return robot.power_status()
+
+    @app.post("/api/core/motion/v1/actions")
+    async def submit(request: Request):
+        action = robot.submit(await request.json())
+        if action is None:
+            return JSONResponse({"error": "unsupported action or battery empty"}, status_code=404)
+        return action
+
+    @app.get("/api/core/motion/v1/actions/{action_id}")
+    async def action_state(action_id: int):
+        state = robot.action_state(action_id)
+        return state if state is not None else JSONResponse({"error": "no such action"}, status_code=404)
+
+    cells = int(MAP_SIZE / MAP_RESOLUTION)
+    stcm = encode_stcm(np.full((cells, cells), FREE, dtype=np.int16), MAP_RESOLUTION, DOCK[0] - MAP_SIZE / 2, DOCK[1] - MAP_SIZE / 2)
+
+    @app.get("/api/core/slam/v1/maps/stcm")
+    async def map_stcm():
+        return Response(stcm, media_type="application/octet-stream")
+
+    return app
+
+
+class SimulatorServer:
+    """uvicorn in a daemon thread, for benchmarks in the same process."""
+
+    def __init__(self, app: FastAPI, host: str = SIM_HOST, port: int = SIM_PORT):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.base_url = f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+# --- ward rounds -------------------------------------------------------
+
+def order_rooms(groups, strategy: str, start=DOCK):
+    """Regroup scheduler legs per room and order the rooms: 'given' keeps the
+    scheduler order, 'nearest' always goes to the closest room entry next."""
+    rooms = []
+    for group in groups:
+        if group[0][0].endswith("_entry") or not rooms:
+            rooms.append([])
+        rooms[-1].append(group)
+    if strategy == "given":
+        return [group for room in rooms for group in room]
+
+    ordered, position = [], start
+    while rooms:
+        room = min(rooms, key=lambda room: math.dist(position, room[0][0][1:3]))
+        rooms.remove(room)
+        ordered.extend(room)
+        position = room[-1][-1][1:3]
+    return ordered
+
+
+def ward_round(groups, clock: SimClock, mode: str, robot_kwargs: dict, http_error_rate: float = 0.0,
+               handoff_radius: float = 0.0, port: int = SIM_PORT) -> dict:
+    robot = SimulatedRobot(clock, **robot_kwargs)
+    with SimulatorServer(create_app(robot, http_error_rate=http_error_rate), port=port) as server:
+        nav.route_unsupported.clear()
+        started = clock.now()
+        results = nav.run_batch(groups, navigation_url=f"{server.base_url}/api/core/motion/v1/actions", mode=mode,
+                                pose_url=f"{server.base_url}/api/core/slam/v1/localization/pose",
+                                publish_status_callback=lambda msg: None, stop_on_failure=False,
+                                handoff_radius=handoff_radius)
+        total = clock.now() - started
+        power = robot.power_status()
+    for result in results:
+        result["leg_s"] = round(result["leg_s"] * clock.scale, 1)
+    return {"total_s": round(total, 1), "legs": results, "failed": sum(1 for r in results if not r["ok"]),
+            "battery_used": round(robot_kwargs.get("battery", 100.0) - power["batteryPercentage"], 2),
+            "distance_m": round(robot.odometer, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kinematic SLAMTEC stand-in")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--time-scale", type=float, default=1.0, help="simulated seconds per wall second")
+    common.add_argument("--speed", type=float, default=SPEED, help="m/s")
+    common.add_argument("--battery", type=float, default=100.0, help="starting charge, percent")
+    common.add_argument("--fail-rate", type=float, default=0.0, help="fraction of actions that fail part way")
+    common.add_argument("--http-error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    common.add_argument("--no-series", action="store_true", help="reject SeriesMoveToAction like older firmware")
+    common.add_argument("--seed", type=int)
+
+    serve = sub.add_parser("serve", parents=[common], help="run the simulator for webhook_server / move_to_location")
+    serve.add_argument("--host", default=SIM_HOST)
+    serve.add_argument("--port", type=int, default=SIM_PORT)
+    serve.add_argument("--pois", default=nav.POI_JSON_FILE_PATH, help="POI cache to preload ({name: {x, y, yaw}})")
+    serve.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    serve.add_argument("--position-from-pois", action="store_true",
+                       help="answer GET artifact/v1/pois with the pose, as Robot.fetch_position expects")
+
+    rounds = sub.add_parser("rounds", parents=[common], help="run ward rounds from a scheduler file and compare strategies")
+    rounds.add_argument("--scheduler", default=nav.SCHEDULER_JSON_FILE_PATH)
+    rounds.add_argument("--batch-index", type=int, default=-1)
+    rounds.add_argument("--modes", default="single,pipelined,route", help="comma-separated run_batch modes")
+    rounds.add_argument("--orders", default="given,nearest", help="comma-separated room orders")
+    rounds.add_argument("--handoff-radius", type=float, default=0.0)
+    rounds.add_argument("--port", type=int, default=SIM_PORT)
+    rounds.add_argument("--json", action="store_true", help="print every leg as JSON")
+
+    args = parser.parse_args()
+    robot_kwargs = {"speed": args.speed, "battery": args.battery, "fail_rate": args.fail_rate,
+                    "series": not args.no_series, "seed": args.seed}
+    clock = SimClock(args.time_scale)
+
+    if args.command == "serve":
+        pois = [
+            {"id": f"sim-{i}", "metadata": {"display_name": name, "type": "Slot"}, "pose": pose}
+            for i, (name, pose) in enumerate(nav.load_cached_pois(args.pois).items())
+        ]
+        robot = SimulatedRobot(clock, pois=pois, **robot_kwargs)
+        app = create_app(robot, args.latency, args.http_error_rate, args.position_from_pois)
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+        return
+
+    with open(args.scheduler) as f:
+        batches = json.load(f)
+    groups = nav.scheduler_groups(batches[args.batch_index] if isinstance(batches, list) else batches)
+    # Client polling runs on wall time; scale it so it costs the same in simulated seconds
+    nav.POLL_INTERVAL_SECONDS /= args.time_scale
+    nav.PIPELINE_POLL_SECONDS /= args.time_scale
+
+    legs = sum(len(group) for group in groups)
+    print(f"{legs} legs, speed {args.speed} m/s, time scale {args.time_scale}x, fail rate {args.fail_rate}")
+    for order in args.orders.split(","):
+        ordered = order_rooms(groups, order)
+        for mode in args.modes.split(","):
+            result = ward_round(ordered, clock, mode, robot_kwargs, args.http_error_rate, args.handoff_radius, args.port)
+            print(f"{order:<8} {mode:<10} {result['total_s']:8.1f} s  {result['distance_m']:6.1f} m  "
+                  f"battery -{result['battery_used']}%  {result['failed']} failed")
+            if args.json:
+                print(json.dumps(result["legs"], indent=2))
+            else:
+                print("    " + ", ".join(f"{r['name']} {r['leg_s']}" for r in result["legs"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import json
+import os
+
+import numpy as np
+
+# Scheduler batches parsed once into flat records. A batch arrives as
+#   {"batch_id": 38, "scheduler": [{"room_1": {entry/exit points}, "slot_pos": [beds]}, ...]}
+# and becomes an ordered list of waypoints (room entry, beds, room exit)
+# with their poses in one (n, 3) array, so consumers and the diff against an
+# updated batch never walk the nested dicts again.
+MOVE_TOLERANCE = 0.05       # metres / radians; smaller changes don't count as a move
+
+ENTRY = "entry"
+BED = "bed"
+EXIT = "exit"
+
+
+class Waypoint:
+    __slots__ = ("name", "room", "kind", "bed")
+
+    def __init__(self, name: str, room: str, kind: str, bed: str = None):
+        self.name = name
+        self.room = room
+        self.kind = kind
+        self.bed = bed
+
+    def __repr__(self):
+        return f"Waypoint({self.name!r})"
+
+
+class Batch:
+    """Waypoints in visiting order, their (x, y, yaw) rows in poses and a
+    name -> row index."""
+
+    __slots__ = ("batch_id", "rooms", "waypoints", "poses", "index")
+
+    def __init__(self, batch_id, rooms, waypoints, poses):
+        self.batch_id = batch_id
+        self.rooms = rooms              # room names in order
+        self.waypoints = waypoints
+        self.poses = poses
+        self.index = {waypoint.name: i for i, waypoint in enumerate(waypoints)}
+
+    def pose(self, name: str):
+        return tuple(self.poses[self.index[name]].tolist())
+
+    def groups(self) -> list:
+        """(name, x, y, yaw) legs grouped as move_to_location.run_batch takes
+        them: per room the entry point, its beds together, then the exit."""
+        groups, previous = [], None
+        for waypoint, (x, y, yaw) in zip(self.waypoints, self.poses.tolist()):
+            leg = (waypoint.name, x, y, yaw)
+            if waypoint.kind == BED and previous is not None and previous.kind == BED and previous.room == waypoint.room:
+                groups[-1].append(leg)
+            else:
+                groups.append([leg])
+            previous = waypoint
+        return groups
+
+
+def parse_batch(data: dict) -> Batch:
+    rooms, waypoints, poses = [], [], []
+    for room in data.get("scheduler", []):
+        room_name = next((key for key in room if key != "slot_pos"), None)
+        if room_name is None:
+            continue
+        rooms.append(room_name)
+        points = room.get(room_name) or {}
+        if "entry_point_x" in points:
+            waypoints.append(Waypoint(f"{room_name}_entry", room_name, ENTRY))
+            poses.append((points["entry_point_x"], points["entry_point_y"], points["entry_point_yaw"]))
+        for slot in room.get("slot_pos", []):
+            bed = slot.get("bed_name")
+            waypoints.append(Waypoint(f"{room_name}_{bed}", room_name, BED, bed))
+            poses.append((slot["x"], slot["y"], slot["yaw"]))
+        if "exit_point_x" in points:
+            waypoints.append(Waypoint(f"{room_name}_exit", room_name, EXIT))
+            poses.append((points["exit_point_x"], points["exit_point_y"], points["exit_point_yaw"]))
+    return Batch(data.get("batch_id"), rooms, waypoints, np.asarray(poses, dtype=np.float64).reshape(-1, 3))
+
+
+class BatchDiff:
+    __slots__ = ("added_rooms", "removed_rooms", "added", "removed", "moved", "reordered")
+
+    def __init__(self, added_rooms, removed_rooms, added, removed, moved, reordered):
+        self.added_rooms = added_rooms
+        self.removed_rooms = removed_rooms
+        self.added = added              # waypoint names
+        self.removed = removed
+        self.moved = moved
+        self.reordered = reordered
+
+    def __bool__(self):
+        return bool(self.added_rooms or self.removed_rooms or self.added or self.removed or self.moved or self.reordered)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def diff(old: Batch, new: Batch, tolerance: float = MOVE_TOLERANCE) -> BatchDiff:
+    common = [name for name in new.index if name in old.index]
+    moved = []
+    if common:
+        old_rows = old.poses[[old.index[name] for name in common]]
+        new_rows = new.poses[[new.index[name] for name in common]]
+        delta = np.abs(new_rows - old_rows)
+        # Yaw wraps at +-pi
+        delta[:, 2] = np.abs((delta[:, 2] + np.pi) % (2 * np.pi) - np.pi)
+        moved = [common[i] for i in np.flatnonzero((delta > tolerance).any(axis=1))]
+    return BatchDiff(
+        added_rooms=[room for room in new.rooms if room not in old.rooms],
+        removed_rooms=[room for room in old.rooms if room not in new.rooms],
+        added=[name for name in new.index if name not in old.index],
+        removed=[name for name in old.index if name not in new.index],
+        moved=moved,
+        reordered=common != [name for name in old.index if name in new.index],
+    )
+
+
+class SchedulerState:
+    """The current batch and the running mission's legs. An update with the
+    same batch_id only patches the legs with what the diff reports (added,
+    removed and moved waypoints, or a new order), so completed legs stay
+    done; a new batch_id starts a new mission."""
+
+    def __init__(self):
+        self.batch = None
+        self.completed = set()
+        self.legs = []                  # [name, x, y, yaw] still to visit, in batch order
+
+    def apply(self, data: dict):
+        """(batch, diff); diff is None when this starts a new mission."""
+        batch = parse_batch(data)
+        if self.batch is None or batch.batch_id != self.batch.batch_id:
+            self.batch = batch
+            self.completed = set()
+            self.legs = [[waypoint.name, *row] for waypoint, row in zip(batch.waypoints, batch.poses.tolist())]
+            return batch, None
+        changes = diff(self.batch, batch)
+        if not changes:
+            # Same waypoints and poses: keep the batch the mission is running on
+            return self.batch, changes
+        self._patch(batch, changes)
+        self.batch = batch
+        # Visited waypoints stay done even if they moved; removed ones are dropped
+        self.completed &= set(batch.index)
+        return batch, changes
+
+    def _patch(self, batch: Batch, changes: BatchDiff):
+        removed = set(changes.removed)
+        self.legs = [leg for leg in self.legs if leg[0] not in removed]
+        position = {leg[0]: leg for leg in self.legs}
+        for name in changes.moved:
+            if name in position:
+                position[name][1:] = batch.pose(name)
+        for name in changes.added:
+            # After the nearest earlier waypoint of the new batch still pending
+            at = 0
+            for earlier in reversed(batch.waypoints[:batch.index[name]]):
+                if earlier.name in position:
+                    at = self.legs.index(position[earlier.name]) + 1
+                    break
+            leg = [name, *batch.pose(name)]
+            self.legs.insert(at, leg)
+            position[name] = leg
+        if changes.reordered:
+            self.legs.sort(key=lambda leg: batch.index[leg[0]])
+
+    def complete(self, names):
+        """Mark legs done; they leave the mission and what gets saved."""
+        self.completed.update(names)
+        self.legs = [leg for leg in self.legs if leg[0] not in self.completed]
+
+    def remaining(self) -> list:
+        """Legs still to visit, in batch order."""
+        return [tuple(leg) for leg in self.legs]
+
+    def scheduler(self) -> list:
+        """The remaining legs in the batch's nested "scheduler" layout."""
+        pending = {leg[0]: leg for leg in self.legs}
+        rooms = {}
+        for waypoint in self.batch.waypoints if self.batch is not None else ():
+            leg = pending.get(waypoint.name)
+            if leg is None:
+                continue
+            room = rooms.setdefault(waypoint.room, {waypoint.room: {}, "slot_pos": []})
+            _, x, y, yaw = leg
+            if waypoint.kind == BED:
+                room["slot_pos"].append({"bed_name": waypoint.bed, "x": x, "y": y, "yaw": yaw})
+            else:
+                room[waypoint.room].update({f"{waypoint.kind}_point_x": x, f"{waypoint.kind}_point_y": y,
+                                            f"{waypoint.kind}_point_yaw": yaw})
+        return list(rooms.values())
+
+
+# The mission runner (move_to_location --scheduler) reports finished legs
+# here so the receiver can keep them out of the batch it saves.
+PROGRESS_FILE = "scheduler_progress.json"
+
+
+def load_progress(path: str = PROGRESS_FILE):
+    """(batch_id, completed leg names) from the runner, or (None, empty set)."""
+    try:
+        with open(path) as f:
+            progress = json.load(f)
+        return progress.get("batch_id"), set(progress.get("completed", []))
+    except (OSError, ValueError, AttributeError, TypeError):
+        return None, set()
+
+
+def save_progress(batch_id, completed, path: str = PROGRESS_FILE):
+    write_json({"batch_id": batch_id, "completed": sorted(completed)}, path)
+
+
+def write_json(data, path: str):
+    """Write through a temp file, so a reader in the other process never
+    sees half a file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp, path)
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import shared_memory
+
+from robot_registry import RobotRegistry, admission_share_from_env
+
+# Robot state shared by all uvicorn workers. One poller process writes a
+# fixed-size record per robot (registry order) guarded by a seqlock; workers
+# read it straight out of shared memory without locks or IPC. The poller is
+# also the only process following the arm channels (one more seqlocked
+# record after the robots) and fetching POI lists (a file per robot, named
+# after the segment, replaced before the POI version moves).
+SHM_ENV = "ROS_WEBHOOK_SHM"
+SHM_NAME = "ros_webhook_state"
+
+POSE_INTERVAL = 0.2
+BATTERY_INTERVAL = 2.0
+POI_INTERVAL = 5.0
+
+# seq | x, y, yaw, pose_ts | battery_ts | poi_version, poi_ts | battery json length
+HEADER = struct.Struct("<Q4dd Qd I4x")
+BATTERY_BYTES = 512
+RECORD_SIZE = HEADER.size + BATTERY_BYTES
+READ_RETRIES = 1000
+
+# seq | arm state json length
+ARM_HEADER = struct.Struct("<QI4x")
+ARM_BYTES = 2048
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Workers and the poller are children of the launcher and share its
+    # resource tracker, so attaching must not register the segment again
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedRobotState:
+    def __init__(self, shm: shared_memory.SharedMemory, robot_ids):
+        self.shm = shm
+        self.offsets = {robot_id: i * RECORD_SIZE for i, robot_id in enumerate(robot_ids)}
+        self.arm_offset = RECORD_SIZE * max(1, len(robot_ids))
+        self._local = {robot_id: [0.0, 0.0, 0.0, 0.0, 0.0, 0, 0.0, b""] for robot_id in robot_ids}
+
+    @classmethod
+    def create(cls, robot_ids, name: str = SHM_NAME):
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        size = RECORD_SIZE * max(1, len(robot_ids)) + ARM_HEADER.size + ARM_BYTES
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:] = bytes(shm.size)
+        return cls(shm, robot_ids)
+
+    @classmethod
+    def attach(cls, robot_ids, name: str = SHM_NAME):
+        return cls(_attach(name), robot_ids)
+
+    # --- writer (poller only) ------------------------------------------
+
+    def _publish(self, robot_id: str):
+        buf = self.shm.buf
+        offset = self.offsets[robot_id]
+        x, y, yaw, pose_ts, battery_ts, poi_version, poi_ts, battery = self._local[robot_id]
+
+        seq = struct.unpack_from("<Q", buf, offset)[0]
+        struct.pack_into("<Q", buf, offset, seq + 1)    # odd: write in progress
+        HEADER.pack_into(buf, offset, seq + 1, x, y, yaw, pose_ts, battery_ts, poi_version, poi_ts, len(battery))
+        buf[offset + HEADER.size:offset + HEADER.size + len(battery)] = battery
+        struct.pack_into("<Q", buf, offset, seq + 2)    # even: record consistent
+
+    def write_pose(self, robot_id: str, x: float, y: float, yaw: float):
+        self._local[robot_id][0:4] = [x, y, yaw, time.time()]
+        self._publish(robot_id)
+
+    def write_battery(self, robot_id: str, battery: dict):
+        blob = json.dumps(battery, separators=(",", ":")).encode()
+        if len(blob) > BATTERY_BYTES:
+            return
+        self._local[robot_id][4] = time.time()
+        self._local[robot_id][7] = blob
+        self._publish(robot_id)
+
+    def write_poi_version(self, robot_id: str, version: int):
+        self._local[robot_id][5:7] = [version, time.time()]
+        self._publish(robot_id)
+
+    def write_arm(self, entries: dict):
+        blob = json.dumps(entries, separators=(",", ":")).encode()
+        if len(blob) > ARM_BYTES:
+            return
+        buf = self.shm.buf
+        offset = self.arm_offset
+        seq = struct.unpack_from("<Q", buf, offset)[0]
+        struct.pack_into("<Q", buf, offset, seq + 1)
+        ARM_HEADER.pack_into(buf, offset, seq + 1, len(blob))
+        buf[offset + ARM_HEADER.size:offset + ARM_HEADER.size + len(blob)] = blob
+        struct.pack_into("<Q", buf, offset, seq + 2)
+
+    def pois_path(self, robot_id: str) -> str:
+        return os.path.join(tempfile.gettempdir(), f"{self.shm.name.lstrip('/')}-{robot_id}-pois.json")
+
+    def write_pois(self, robot_id: str, content: bytes, version: int):
+        path = self.pois_path(robot_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+        self.write_poi_version(robot_id, version)
+
+    # --- readers (any worker) ------------------------------------------
+
+    def read(self, robot_id: str):
+        offset = self.offsets.get(robot_id)
+        if offset is None:
+            return None
+
+        buf = self.shm.buf
+        for _ in range(READ_RETRIES):
+            seq, x, y, yaw, pose_ts, battery_ts, poi_version, poi_ts, length = HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                continue
+            battery = bytes(buf[offset + HEADER.size:offset + HEADER.size + min(length, BATTERY_BYTES)])
+            if struct.unpack_from("<Q", buf, offset)[0] == seq:
+                break
+        else:
+            return None
+
+        return {
+            "pose": {"x": x, "y": y, "yaw": yaw} if pose_ts else None,
+            "pose_ts": pose_ts or None,
+            "battery": json.loads(battery) if battery_ts else None,
+            "battery_ts": battery_ts or None,
+            "poi_version": poi_version,
+            "poi_ts": poi_ts or None,
+        }
+
+    def read_arm(self):
+        """The poller's arm channel entries (see ArmStateCache.export), or None."""
+        buf = self.shm.buf
+        offset = self.arm_offset
+        for _ in range(READ_RETRIES):
+            seq, length = ARM_HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                continue
+            blob = bytes(buf[offset + ARM_HEADER.size:offset + ARM_HEADER.size + min(length, ARM_BYTES)])
+            if struct.unpack_from("<Q", buf, offset)[0] == seq:
+                break
+        else:
+            return None
+        return json.loads(blob) if seq else None
+
+    def read_pois(self, robot_id: str):
+        try:
+            with open(self.pois_path(robot_id), "rb") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def attach_from_env(robot_ids):
+    """Attach to the segment named in ROS_WEBHOOK_SHM, or None in single-process mode."""
+    name = os.environ.get(SHM_ENV)
+    if not name:
+        return None
+    try:
+        return SharedRobotState.attach(robot_ids, name)
+    except FileNotFoundError:
+        print(f"❌ Shared robot state {name} not found, falling back to direct polling")
+        return None
+
+
+# --- poller ----------------------------------------------------------------
+
+async def _every(interval: float, poll):
+    while True:
+        try:
+            await poll()
+        except Exception as e:
+            # Nothing may end a poll loop, the workers would read stale state forever
+            print(f"Poller error: {e!r}")
+        await asyncio.sleep(interval)
+
+
+async def _poll_robot(state: SharedRobotState, robot):
+    client = robot.client
+
+    async def pose():
+        resp = await client.get(robot.fetch_position)
+        resp.raise_for_status()
+        data = resp.json()
+        if isinstance(data, dict) and None not in (data.get("x"), data.get("y"), data.get("yaw")):
+            state.write_pose(robot.robot_id, float(data["x"]), float(data["y"]), float(data["yaw"]))
+
+    async def battery():
+        resp = await client.get(robot.fetch_battery_status)
+        resp.raise_for_status()
+        state.write_battery(robot.robot_id, resp.json())
+
+    async def pois():
+        # The version is a content hash of the POI list
+        resp = await client.get(robot.fetch_pois)
+        resp.raise_for_status()
+        digest = hashlib.blake2b(resp.content, digest_size=8).digest()
+        version = int.from_bytes(digest, "little")
+        if version != state._local[robot.robot_id][5]:
+            state.write_pois(robot.robot_id, resp.content, version)
+
+    await asyncio.gather(
+        _every(POSE_INTERVAL, pose),
+        _every(BATTERY_INTERVAL, battery),
+        _every(POI_INTERVAL, pois),
+    )
+
+
+async def _guarded(coro):
+    # A failure there must not take the pose/battery/POI polls down with it
+    try:
+        await coro
+    except Exception as e:
+        print(f"Poller background work failed: {e!r}")
+
+
+def run_poller(name: str, robots_file: str, default_base_url: str, background=None):
+    """Entry point of the designated poller process. background(state), if
+    given, returns a coroutine of the other upstream work done once for all
+    workers (arm channels, outbox delivery)."""
+    registry = RobotRegistry.from_file(robots_file, default_base_url=default_base_url, share=admission_share_from_env())
+    state = SharedRobotState.attach(list(registry.robots), name)
+    print(f"✅ Poller writing robot state for {list(registry.robots)}")
+
+    async def main():
+        tasks = [_poll_robot(state, robot) for robot in registry.robots.values()]
+        if background is not None:
+            tasks.append(_guarded(background(state)))
+        await asyncio.gather(*tasks)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for robot_id in registry.robots:
+            try:
+                os.remove(state.pois_path(robot_id))
+            except FileNotFoundError:
+                pass
+        state.close()
@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+import httpx
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request
+
+from flight_recorder import FLIGHT_RECORDER_DIR, extract
+from idempotency import idempotency_store
+import poi_registry
+from outbox import OUTBOX_ENV, OUTBOX_FILE, Outbox
+from profiling import PROFILE_ENV
+from robot_registry import Robot
+from shared_state import SHM_ENV
+
+# Capture: with ROS_WEBHOOK_CAPTURE=<file> (webhook_server --capture) every
+# incoming webhook request is written as one JSON line with its arrival time.
+# Websocket frames need no extra capture, the flight recorder already keeps
+# them with timestamps. Replay drives webhook_server and websocket consumers
+# from both, time-scaled, against local stubs.
+CAPTURE_ENV = "ROS_WEBHOOK_CAPTURE"
+CAPTURE_MAX_BYTES = 20 * 1024 * 1024
+CAPTURE_BACKUP_COUNT = 3
+MAX_BODY_BYTES = 64 * 1024
+CAPTURED_HEADERS = {"content-type", "idempotency-key", "x-robot-id", "x-request-id"}
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 9310
+WS_PORT = 9311
+
+
+class CaptureMiddleware:
+    """Pure ASGI, records the request as received (before robot routing strips the prefix)."""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.logger = logging.getLogger("traffic_capture")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=CAPTURE_MAX_BYTES, backupCount=CAPTURE_BACKUP_COUNT)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        arrived = time.time()
+        chunks = []
+        size = 0
+
+        async def capturing_receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                if size < MAX_BODY_BYTES:
+                    chunks.append(body[:MAX_BODY_BYTES - size])
+                size += len(body)
+                if not message.get("more_body"):
+                    self._write(scope, arrived, b"".join(chunks), size > MAX_BODY_BYTES)
+            return message
+
+        if scope["method"] in ("GET", "HEAD", "OPTIONS", "DELETE"):
+            self._write(scope, arrived, b"", False)
+            return await self.app(scope, receive, send)
+        return await self.app(scope, capturing_receive, send)
+
+    def _write(self, scope, arrived: float, body: bytes, truncated: bool):
+        headers = {}
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").lower()
+            if name in CAPTURED_HEADERS:
+                headers[name] = value.decode("latin-1")
+        self.logger.info(json.dumps({
+            "kind": "http",
+            "t": arrived,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "headers": headers,
+            "body": body.decode(errors="replace"),
+            "truncated": truncated,
+        }))
+
+
+def capture_path_from_env():
+    return os.environ.get(CAPTURE_ENV) or None
+
+
+def load_capture(path: str, since: float = None, until: float = None) -> list:
+    events = []
+    for name in [f"{path}.{i}" for i in range(CAPTURE_BACKUP_COUNT, 0, -1)] + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if (since is None or event["t"] >= since) and (until is None or event["t"] <= until):
+                    events.append(event)
+    return events
+
+
+def load_frames(directory: str, channels=None, since: float = None, until: float = None) -> list:
+    return [
+        {"kind": "ws", "t": record["t"], "channel": record["channel"], "frame": record["frame"]}
+        for record in extract(directory, channels, since, until)
+    ]
+
+
+# --- stubs -------------------------------------------------------------
+
+stub = FastAPI()
+
+
+STUB_POSE = {"x": 1.0, "y": 2.0, "yaw": 0.5}
+
+
+@stub.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def stub_any(path: str, request: Request):
+    # Answers every SLAMTEC and medicalbot call the webhook handlers make
+    await asyncio.sleep(stub.state.latency)
+    if path.endswith("artifact/v1/pois") and request.method == "GET":
+        # A POI list like SLAMTEC's; Robot.fetch_position reads the pose from the
+        # same URL, so --stub-position-from-pois answers with the pose instead
+        if stub.state.position_from_pois:
+            return STUB_POSE
+        return [{"id": "stub-poi", "metadata": {"display_name": "stub", "type": "Slot"}, "pose": STUB_POSE}]
+    if path.endswith("power/status"):
+        return {"batteryPercentage": 80, "dockingStatus": "not_on_dock", "isCharging": False}
+    return {"status": "ok"}
+
+
+def _serve_stub(latency: float, position_from_pois: bool):
+    stub.state.latency = latency
+    stub.state.position_from_pois = position_from_pois
+    uvicorn.run(stub, host=STUB_HOST, port=STUB_PORT, log_level="warning")
+
+
+def start_stub(latency: float, position_from_pois: bool = False):
+    process = multiprocessing.Process(target=_serve_stub, args=(latency, position_from_pois), daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://{STUB_HOST}:{STUB_PORT}/health")
+            break
+        except httpx.RequestError:
+            time.sleep(0.05)
+    return process
+
+
+def import_webhook_server():
+    """webhook_server for in-process replay, without the deployment settings
+    its import would pick up from the environment: the replay must not be
+    captured, attach to shared state, profile or use the production outbox."""
+    for name in (CAPTURE_ENV, SHM_ENV, PROFILE_ENV, OUTBOX_ENV):
+        os.environ.pop(name, None)
+    import webhook_server
+    return webhook_server
+
+
+@contextmanager
+def sandbox():
+    """Scratch working directory for an in-process replay. Everything the
+    handlers write relative to the working directory (outbox, traces, map
+    cache, profiles) lands there and is discarded afterwards."""
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def point_at_stub(webhook_server, workdir: str):
+    """Re-point the robots and the medicalbot URLs of an imported webhook_server to the stub."""
+    stub_url = f"http://{STUB_HOST}:{STUB_PORT}"
+    registry = webhook_server.robot_registry
+    await registry.close()
+    await webhook_server.close_medicalbot()
+    for robot_id in list(registry.robots):
+        registry.add(Robot(robot_id, f"{stub_url}/{robot_id}"))
+    # Each run starts cold, an earlier run's responses must not be replayed
+    idempotency_store._entries.clear()
+    # No lifespan in-process: load the POI registries from the stub once, as the refresher would
+    for robot in registry.robots.values():
+        poi_registry.registry_for(robot.robot_id).replace([])
+        try:
+            await poi_registry.refresh(robot)
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"POI registry for {robot.robot_id} left empty: {e}")
+    webhook_server.pose_validators.clear()
+    webhook_server.poi_distance_services.clear()
+    # Queued medicalbot writes go to a throwaway outbox, never the production queue
+    webhook_server.medicalbot_outbox.close()
+    webhook_server.medicalbot_outbox = Outbox(os.path.join(workdir, OUTBOX_FILE))
+    for name, value in vars(webhook_server).items():
+        if isinstance(value, str) and value.startswith(webhook_server.base_url + "/"):
+            setattr(webhook_server, name, stub_url + value[len(webhook_server.base_url):])
+
+
+# --- replay ------------------------------------------------------------
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+
+
+def summarize(latencies, lags, errors: int, elapsed: float) -> dict:
+    return {
+        "count": len(latencies),
+        "per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_lag_ms": round(max(lags) * 1000, 1) if lags else None,
+        "errors": errors,
+    }
+
+
+async def replay(events, speed: float, concurrency: int, target: str = None,
+                 webhook_server=None, workdir: str = None) -> dict:
+    """Send every event at its scaled offset (speed 0 = as fast as possible),
+    to target or else in-process to webhook_server inside workdir (sandbox())."""
+    http_events = [event for event in events if event["kind"] == "http"]
+    ws_events = [event for event in events if event["kind"] == "ws"]
+    if not events:
+        return {}
+    first = min(event["t"] for event in events)
+
+    if target:
+        client = httpx.AsyncClient(base_url=target, timeout=30)
+    else:
+        await point_at_stub(webhook_server, workdir)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=webhook_server.app), base_url="http://gateway", timeout=30)
+
+    http_latency = defaultdict(list)
+    http_lag = defaultdict(list)
+    http_errors = defaultdict(int)
+    ws_latency = defaultdict(list)
+    ws_lag = defaultdict(list)
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+
+    def due(event):
+        return start + (event["t"] - first) / speed if speed else start
+
+    async def wait_until(at):
+        delay = at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send_request(event):
+        route = f"{event['method']} {event['path']}"
+        async with semaphore:
+            sent = time.monotonic()
+            http_lag[route].append(max(0.0, sent - due(event)))
+            try:
+                response = await client.request(
+                    event["method"], event["path"] + (f"?{event['query']}" if event.get("query") else ""),
+                    content=event.get("body", "").encode(), headers=event.get("headers", {}),
+                )
+                if response.status_code >= 500:
+                    http_errors[route] += 1
+            except httpx.HTTPError:
+                http_errors[route] += 1
+            http_latency[route].append(time.monotonic() - sent)
+
+    async def drive_http():
+        tasks = []
+        for event in sorted(http_events, key=lambda event: event["t"]):
+            await wait_until(due(event))
+            tasks.append(asyncio.create_task(send_request(event)))
+        await asyncio.gather(*tasks)
+
+    by_channel = defaultdict(list)
+    for event in sorted(ws_events, key=lambda event: event["t"]):
+        by_channel[event["channel"]].append(event)
+    ready = {channel: asyncio.Event() for channel in by_channel}
+    in_flight = {channel: deque() for channel in by_channel}
+
+    async def serve_frames(websocket, *args):
+        # One connection per channel, channel taken from the request path
+        path = websocket.request.path if hasattr(websocket, "request") else args[0]
+        channel = path.strip("/").split("/")[-1]
+        for event in by_channel.get(channel, []):
+            await wait_until(due(event))
+            in_flight[channel].append(due(event))
+            ws_lag[channel].append(max(0.0, time.monotonic() - due(event)))
+            await websocket.send(event["frame"].decode(errors="replace"))
+        await websocket.close()
+
+    async def consume(channel):
+        # Same decode work the *_rec.py receivers do per frame
+        uri = f"ws://{STUB_HOST}:{WS_PORT}/ws/socket-server/{channel}/"
+        async with websockets.connect(uri, max_queue=None) as websocket:
+            ready[channel].set()
+            async for message in websocket:
+                json.loads(message)
+                ws_latency[channel].append(time.monotonic() - in_flight[channel].popleft())
+
+    async with websockets.serve(serve_frames, STUB_HOST, WS_PORT):
+        consumers = [asyncio.create_task(consume(channel)) for channel in by_channel]
+        await asyncio.gather(drive_http(), *consumers)
+    await client.aclose()
+    if not target:
+        await webhook_server.robot_registry.close()
+        await webhook_server.close_medicalbot()
+        webhook_server.medicalbot_outbox.close()
+    elapsed = time.monotonic() - start
+
+    report = {"elapsed_s": round(elapsed, 2), "http": {}, "ws": {}}
+    all_latency = [v for values in http_latency.values() for v in values]
+    all_lag = [v for values in http_lag.values() for v in values]
+    if all_latency:
+        report["http"]["all"] = summarize(all_latency, all_lag, sum(http_errors.values()), elapsed)
+    for route in sorted(http_latency):
+        report["http"][route] = summarize(http_latency[route], http_lag[route], http_errors[route], elapsed)
+    for channel in sorted(ws_latency):
+        report["ws"][channel] = summarize(ws_latency[channel], ws_lag[channel], 0, elapsed)
+    return report
+
+
+def _parse_speed(value: str) -> float:
+    if value == "max":
+        return 0.0
+    return float(value.rstrip("x"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured webhook and websocket traffic against local stubs")
+    parser.add_argument("--capture", help="webhook capture file (webhook_server --capture)")
+    parser.add_argument("--frames", default=FLIGHT_RECORDER_DIR, help="flight recorder directory for websocket frames ('' to skip)")
+    parser.add_argument("--channel", action="append", help="only replay these websocket channels")
+    parser.add_argument("--since", type=float, help="epoch seconds")
+    parser.add_argument("--until", type=float, help="epoch seconds")
+    parser.add_argument("--speed", nargs="+", default=["1"], help="1, 10, ... or max; several run one after another")
+    parser.add_argument("--concurrency", type=int, default=32, help="max webhook requests in flight")
+    parser.add_argument("--stub-latency", type=float, default=0.01, help="seconds per stubbed upstream call")
+    parser.add_argument("--stub-position-from-pois", action="store_true",
+                        help="answer GET artifact/v1/pois with the pose, as Robot.fetch_position expects")
+    parser.add_argument("--target", help="replay against a running webhook_server instead of in-process")
+    args = parser.parse_args()
+
+    events = load_capture(args.capture, args.since, args.until) if args.capture else []
+    if args.frames and os.path.isdir(args.frames):
+        events += load_frames(args.frames, args.channel, args.since, args.until)
+    if not events:
+        parser.error("Nothing to replay")
+
+    import request_tracing
+    request_tracing.TRACE_SAMPLE_RATE = 0
+    process = start_stub(args.stub_latency, args.stub_position_from_pois)
+    webhook_server = None if args.target else import_webhook_server()
+    try:
+        for speed in args.speed:
+            with sandbox() as workdir:
+                report = asyncio.run(replay(events, _parse_speed(speed), args.concurrency, args.target, webhook_server, workdir))
+            print(json.dumps({"speed": speed, **report}, indent=2))
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,72 @@
 from fastapi import FastAPI, Request
 import uvicorn
 import httpx
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from starlette import status
 from fastapi.middleware.cors import CORSMiddleware
 import random
 import traceback
-import uuid
-
-app = FastAPI()
+import argparse
+import hashlib
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from idempotency import current_poi_id, idempotent
+from request_tracing import span, trace_headers, tracing_middleware
+from occupancy_map import StcmError, fetch_map, open_latest
+from poi_distances import PoiDistanceService, parse_pois
+from admission import AdmissionController, AdmissionMiddleware, AdmissionTransport, admission_controllers, shed_handled
+import arm_state as arm_state_module
+from arm_state import arm_state
+import battery_telemetry
+from outbox import Outbox, run_flusher
+from profiling import PROFILE_ENV, ProfilerConfig, ProfilingMiddleware, profiler, watchdog
+from http_caching import CachingMiddleware
+import poi_reanchor
+import poi_registry
+from pose_trajectory import read_range
+from pose_validation import ACCEPT, DUPLICATE_RADIUS, MAX_DUPLICATE_RADIUS, REJECT, UNVALIDATED, PoseValidator
+from traffic_capture import CAPTURE_ENV, CaptureMiddleware, capture_path_from_env
+from robot_registry import (ADMISSION_SHARE_ENV, ROBOTS_FILE, RobotRegistry, RobotRoutingMiddleware,
+                            admission_share_from_env, current_robot)
+import shared_state as shared_state_module
+
+@asynccontextmanager
+async def lifespan(app):
+    # Battery history for /webhook/battery-health/, sampled off the request path
+    sampler = asyncio.create_task(battery_telemetry.run_sampler(robot_registry, shared_state))
+    # Local POI registry behind /webhook/pois/
+    refresher = asyncio.create_task(poi_registry.run_refresher(robot_registry, shared_state))
+    # Map for capture validation, so it does not wait for a /webhook/map/ call
+    maps = asyncio.create_task(load_maps())
+    background = []
+    if shared_state is None:
+        # Live arm/joint state for the room entry/exit readiness check
+        background.append(asyncio.create_task(arm_state_module.run_arm_channels()))
+        # Queued medicalbot writes, delivered in batches with retry
+        background.append(asyncio.create_task(run_flusher(medicalbot_outbox, medicalbot_session)))
+    else:
+        # Multi-worker: the poller process follows the arm and delivers the outbox for all workers
+        arm_state.source = shared_state
+    # Stack snapshot whenever the loop is blocked (see profiling.py)
+    loop_watchdog = asyncio.create_task(watchdog.run())
+    yield
+    sampler.cancel()
+    refresher.cancel()
+    maps.cancel()
+    for task in background:
+        task.cancel()
+    loop_watchdog.cancel()
+    await robot_registry.close()
+    await close_medicalbot()
+    medicalbot_outbox.close()
+    if shared_state is not None:
+        shared_state.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # base_url = 'http://192.168.1.33:8000'
 base_url = 'https://192.168.11.200'
@@ -16,11 +74,104 @@ create_slot_position_api = f"{base_url}/api/medicalbot/bed/data/slot/position/cr
 create_room_entry_position_api = f"{base_url}/api/medicalbot/bed/data/room/entry-point/position/create/"
 create_room_exit_position_api = f"{base_url}/api/medicalbot/bed/data/room/exit-point/position/create/"
 
+# One pooled client for the medicalbot backend, admitted through its own
+# priority queue like each robot's SLAMTEC controller (see admission.py)
+MEDICALBOT_MAX_CONCURRENCY = 8
+medicalbot_admission = AdmissionController("medicalbot", MEDICALBOT_MAX_CONCURRENCY)
+_medicalbot_client = None
+
+@asynccontextmanager
+async def medicalbot_session():
+    global _medicalbot_client
+    if _medicalbot_client is None:
+        transport = AdmissionTransport(medicalbot_admission, httpx.AsyncHTTPTransport(verify=False))
+        _medicalbot_client = httpx.AsyncClient(timeout=10, transport=transport)
+    yield _medicalbot_client
+
+async def close_medicalbot():
+    global _medicalbot_client
+    if _medicalbot_client is not None:
+        await _medicalbot_client.aclose()
+        _medicalbot_client = None
+
+# Slot and room-position writes are committed here first, so a backend
+# outage delays them instead of failing the capture (see outbox.py)
+medicalbot_outbox = Outbox()
+
+# Default SLAMTEC controller, used when robots.json does not list a fleet.
+# Per-robot endpoints (fetch_position, save_location_data, ...) live on Robot.
 slam_tech_base_url = 'http://192.168.11.1:1448'
-fetch_position = f"{slam_tech_base_url}/api/core/artifact/v1/pois"
-fetch_battery_status = f"{slam_tech_base_url}/api/core/system/v1/power/status"
-save_location_data = f"{slam_tech_base_url}/api/core/slam/v1/pois"
-fetch_map_file = f"{slam_tech_base_url}/api/core/slam/v1/maps/stcm"
+# In multi-worker mode each worker admits its share of every robot's max_concurrency
+robot_registry = RobotRegistry.from_file(ROBOTS_FILE, default_base_url=slam_tech_base_url, share=admission_share_from_env())
+
+# Set in multi-worker mode (see __main__): pose, battery and POI version are
+# read from shared memory written by a single poller process
+shared_state = shared_state_module.attach_from_env(list(robot_registry.robots))
+BATTERY_MAX_AGE = 10
+
+# robot_id -> PoiDistanceService for that robot's current map
+poi_distance_services = {}
+
+# robot_id -> PoseValidator for that robot's current map
+pose_validators = {}
+
+async def pose_validator(robot):
+    # Cache lookups and the obstacle dilation are file IO and grid work; keep them off the loop
+    occupancy = await asyncio.to_thread(open_latest, robot.robot_id)
+    if occupancy is None:
+        return None
+    validator = pose_validators.get(robot.robot_id)
+    if validator is None or validator.occupancy.map_hash != occupancy.map_hash:
+        validator = pose_validators[robot.robot_id] = await asyncio.to_thread(PoseValidator, occupancy)
+    return validator
+
+async def load_maps():
+    """Open each robot's cached map, fetching it when none is cached yet."""
+    for robot in robot_registry.robots.values():
+        try:
+            if await asyncio.to_thread(open_latest, robot.robot_id) is None:
+                await fetch_map(robot)
+            await pose_validator(robot)
+        except (httpx.HTTPError, StcmError, OSError) as e:
+            print(f"⚠️ No map for {robot.robot_id}, captures are unvalidated until /webhook/map/ succeeds: {e}")
+
+async def validate_capture(robot, x, y, display_name, radius=DUPLICATE_RADIUS):
+    """Check a captured pose against the cached map and the robot's POIs.
+    The decision is UNVALIDATED when there is no map to check against yet."""
+    validator = await pose_validator(robot)
+    if validator is None:
+        return {"decision": UNVALIDATED, "reasons": ["no_map"], "nearest_poi": None, "nearest_distance": None}
+    registry = poi_registry.registry_for(robot.robot_id)
+    if registry.loaded:
+        pois = list(registry.pois.values())
+    else:
+        try:
+            async with robot.session() as client:
+                with span("fetch_pois"):
+                    slam_resp = await client.get(robot.fetch_pois, headers=trace_headers())
+                slam_resp.raise_for_status()
+                pois = slam_resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            # Validated against no POIs instead; this must not turn the capture into a 429
+            shed_handled(e)
+            pois = []
+    names, xy = parse_pois(pois if isinstance(pois, list) else [])
+    with span("validate_pose"):
+        return validator.check(x, y, names, xy, radius=radius, exclude_names=display_name.strip().lower())[0]
+
+def rejected_pose(decision):
+    return JSONResponse(
+        {'status': 'rejected', 'message': f"Captured pose rejected: {', '.join(decision['reasons'])}", 'data': decision},
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+def log_unaccepted_pose(decision):
+    """Log a capture that goes ahead with a warning or without validation."""
+    if decision["decision"] != ACCEPT:
+        print(f"⚠️ Captured pose {decision['decision']}: {', '.join(decision['reasons'])}")
+
+# Innermost: sampled per-request profiles, off unless enabled (see profiling.py)
+app.add_middleware(ProfilingMiddleware)
 
 # ✅ Add CORS middleware
 app.add_middleware(
@@ -29,14 +180,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # or restrict like ["POST", "GET"]
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag", "Last-Modified"],
 )
 
+# gzip/brotli with a cache of compressed bodies, ETag/Last-Modified and 304s on GET
+app.add_middleware(CachingMiddleware)
+
+# Request id + per-hop spans, see request_tracing.py for the trace CLI
+app.middleware("http")(tracing_middleware)
+
+# Priority class per route, sheds with 429 when an upstream queue is full
+app.add_middleware(AdmissionMiddleware)
+
+# Outermost: picks the robot from /robots/<id>/... or X-Robot-ID
+app.add_middleware(RobotRoutingMiddleware, registry=robot_registry)
+
+# Traffic capture for replay (see traffic_capture.py), off unless --capture is given
+if capture_path_from_env():
+    app.add_middleware(CaptureMiddleware, path=capture_path_from_env())
+
 @app.post("/webhook/trigger-slot-position/")
+@idempotent("slot_id")
 async def webhook_receiver(request: Request):
+    robot = current_robot()
     try:
         # Parse JSON payload
         try:
-            payload_rec = await request.json()
+            with span("json_parse"):
+                payload_rec = await request.json()
         except Exception:
             return JSONResponse(
                 {'status': 'error', 'message': 'Invalid JSON payload.', 'data': None},
@@ -59,9 +230,10 @@ async def webhook_receiver(request: Request):
             )
         
         # Fetch x, y, yaw from SLAM API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
-                slam_resp = await client.get(fetch_position)
+                with span("fetch_position"):
+                    slam_resp = await client.get(robot.fetch_position, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
             except httpx.HTTPStatusError as e:
@@ -86,6 +258,12 @@ async def webhook_receiver(request: Request):
                 status_code=status.HTTP_502_BAD_GATEWAY
             )
 
+        # Validate against the map and existing POIs before any upstream write
+        decision = await validate_capture(robot, x, y, f"{room_name}_{bed_name}")
+        if decision["decision"] == REJECT and not payload_rec.get("force"):
+            return rejected_pose(decision)
+        log_unaccepted_pose(decision)
+
         # Construct payload for forwarding
         payload = {
             "slot_id": value,
@@ -94,28 +272,13 @@ async def webhook_receiver(request: Request):
             "yaw": float(yaw)
         }
 
-        # Forward request to external API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
-            try:
-                response = await client.post(create_slot_position_api, json=payload)
-                response.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                return JSONResponse(
-                    {'status': 'error', 'message': f'API returned {e.response.status_code}', 'data': e.response.text},
-                    status_code=status.HTTP_502_BAD_GATEWAY
-                )
-            except httpx.RequestError as e:
-                return JSONResponse(
-                    {'status': 'error', 'message': f'Failed to reach API: {str(e)}', 'data': None},
-                    status_code=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            
         # Save position and data name to SLAM tech
         payload_slam = {
-            "id": str(uuid.uuid4()),
+            "id": current_poi_id(),
             "metadata": {
                 "display_name": f"{room_name}_{bed_name}",
-                "type": "Slot"
+                "type": "Slot",
+                "slot_id": value
             },
             "pose": {
                 "x": x,
@@ -124,17 +287,14 @@ async def webhook_receiver(request: Request):
             }
         }
 
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
                 # Send POST request instead of GET
-                slam_resp = await client.post(save_location_data, json=payload_slam)
+                with span("save_location_data"):
+                    slam_resp = await client.post(robot.save_location_data, json=payload_slam, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
-
-                return JSONResponse(
-                    {"status": "success", "message": "SLAM data saved successfully", "data": slam_data},
-                    status_code=status.HTTP_200_OK
-                )
+                poi_registry.registry_for(robot.robot_id).upsert(payload_slam)
 
             except httpx.HTTPStatusError as e:
                 return JSONResponse(
@@ -156,12 +316,21 @@ async def webhook_receiver(request: Request):
                     status_code=status.HTTP_504_GATEWAY_TIMEOUT,
                 )
 
-
-        print("Forwarded to API:", response.status_code, response.text)
+        # Queue the medicalbot write only once SLAM has the POI, so a failed
+        # capture leaves nothing behind to deliver; the outbox flusher sends it
+        try:
+            with span("outbox_enqueue"):
+                outbox_id = await medicalbot_outbox.put(create_slot_position_api, value, payload, trace_headers())
+        except sqlite3.Error as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to queue API write: {str(e)}', 'data': None},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        print("Queued for API:", outbox_id)
 
         return JSONResponse(
-            {'status': 'success', 'message': 'Slot created successfully.', 'data': payload},
-            status_code=status.HTTP_201_CREATED
+            {"status": "success", "message": "SLAM data saved successfully", "data": slam_data, "validation": decision},
+            status_code=status.HTTP_200_OK
         )
 
     except Exception as e:
@@ -171,11 +340,14 @@ async def webhook_receiver(request: Request):
         )
     
 @app.post("/webhook/create-room-entry-position/")
+@idempotent("room_pos_id")
 async def create_room_entry_point(request: Request):
+    robot = current_robot()
     try:
         # Parse JSON payload
         try:
-            payload_rec = await request.json()
+            with span("json_parse"):
+                payload_rec = await request.json()
         except Exception:
             return JSONResponse(
                 {'status': 'error', 'message': 'Invalid JSON payload.', 'data': None},
@@ -193,18 +365,26 @@ async def create_room_entry_point(request: Request):
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
             )
         
-        arm_status = True
+        arm_ready, arm_reason = arm_state.check()
 
-        if not arm_status:
+        if arm_ready == arm_state_module.NOT_READY:
             return JSONResponse(
-                {'status': 'reposition', 'message': 'Need to reposition robot', 'data': None},
+                {'status': 'reposition', 'message': f'Need to reposition robot ({arm_reason})', 'data': None},
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
             )
+        if arm_ready == arm_state_module.UNKNOWN:
+            if arm_state_module.unknown_policy() == arm_state_module.REFUSE and not payload_rec.get("force"):
+                return JSONResponse(
+                    {'status': 'error', 'message': f'Arm state unavailable: {arm_reason}', 'data': None},
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+            print(f"⚠️ Arm state unknown ({arm_reason}), capturing anyway")
 
         # Fetch x, y, yaw from SLAM API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
-                slam_resp = await client.get(fetch_position)
+                with span("fetch_position"):
+                    slam_resp = await client.get(robot.fetch_position, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
             except httpx.HTTPStatusError as e:
@@ -229,6 +409,12 @@ async def create_room_entry_point(request: Request):
                 status_code=status.HTTP_502_BAD_GATEWAY
             )
 
+        # Validate against the map and existing POIs before any upstream write
+        decision = await validate_capture(robot, x, y, f"{room_name}_entry_poi")
+        if decision["decision"] == REJECT and not payload_rec.get("force"):
+            return rejected_pose(decision)
+        log_unaccepted_pose(decision)
+
         # Construct payload for forwarding
         payload = {
             "room_pos_id": value,
@@ -237,28 +423,13 @@ async def create_room_entry_point(request: Request):
             "yaw": float(yaw)
         }
 
-        # Forward request to external API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
-            try:
-                response = await client.post(create_room_entry_position_api, json=payload)  # use `json` not `data`
-                response.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                return JSONResponse(
-                    {'status': 'error', 'message': f'API returned {e.response.status_code}', 'data': e.response.text},
-                    status_code=status.HTTP_502_BAD_GATEWAY
-                )
-            except httpx.RequestError as e:
-                return JSONResponse(
-                    {'status': 'error', 'message': f'Failed to reach API: {str(e)}', 'data': None},
-                    status_code=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            
         # Save position and data name to SLAM tech
         payload_slam = {
-            "id": str(uuid.uuid4()),
+            "id": current_poi_id(),
             "metadata": {
                 "display_name": f"{room_name}_entry_poi",
-                "type": "Room_entry"
+                "type": "Room_entry",
+                "room_pos_id": value
             },
             "pose": {
                 "x": x,
@@ -267,17 +438,14 @@ async def create_room_entry_point(request: Request):
             }
         }
 
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
                 # Send POST request instead of GET
-                slam_resp = await client.post(save_location_data, json=payload_slam)
+                with span("save_location_data"):
+                    slam_resp = await client.post(robot.save_location_data, json=payload_slam, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
-
-                return JSONResponse(
-                    {"status": "success", "message": "SLAM data saved successfully", "data": slam_data},
-                    status_code=status.HTTP_200_OK
-                )
+                poi_registry.registry_for(robot.robot_id).upsert(payload_slam)
 
             except httpx.HTTPStatusError as e:
                 return JSONResponse(
@@ -299,11 +467,21 @@ async def create_room_entry_point(request: Request):
                     status_code=status.HTTP_504_GATEWAY_TIMEOUT,
                 )
 
-        print("📡 Forwarded to API:", response.status_code, response.text)
+        # Queue the medicalbot write only once SLAM has the POI, so a failed
+        # capture leaves nothing behind to deliver; the outbox flusher sends it
+        try:
+            with span("outbox_enqueue"):
+                outbox_id = await medicalbot_outbox.put(create_room_entry_position_api, value, payload, trace_headers())
+        except sqlite3.Error as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to queue API write: {str(e)}', 'data': None},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        print("Queued for API:", outbox_id)
 
         return JSONResponse(
-            {'status': 'success', 'message': 'Entry point position created successfully.', 'data': payload},
-            status_code=status.HTTP_201_CREATED
+            {"status": "success", "message": "SLAM data saved successfully", "data": slam_data, "validation": decision},
+            status_code=status.HTTP_200_OK
         )
 
     except Exception as e:
@@ -313,11 +491,14 @@ async def create_room_entry_point(request: Request):
         )
     
 @app.post("/webhook/create-room-exit-position/")
+@idempotent("room_pos_id")
 async def create_room_exit_point(request: Request):
+    robot = current_robot()
     try:
         # Parse JSON payload
         try:
-            payload_rec = await request.json()
+            with span("json_parse"):
+                payload_rec = await request.json()
         except Exception:
             return JSONResponse(
                 {'status': 'error', 'message': 'Invalid JSON payload.', 'data': None},
@@ -335,18 +516,26 @@ async def create_room_exit_point(request: Request):
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
             )
         
-        arm_status = True
+        arm_ready, arm_reason = arm_state.check()
 
-        if not arm_status:
+        if arm_ready == arm_state_module.NOT_READY:
             return JSONResponse(
-                {'status': 'reposition', 'message': 'Need to reposition robot', 'data': None},
+                {'status': 'reposition', 'message': f'Need to reposition robot ({arm_reason})', 'data': None},
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
             )
+        if arm_ready == arm_state_module.UNKNOWN:
+            if arm_state_module.unknown_policy() == arm_state_module.REFUSE and not payload_rec.get("force"):
+                return JSONResponse(
+                    {'status': 'error', 'message': f'Arm state unavailable: {arm_reason}', 'data': None},
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+            print(f"⚠️ Arm state unknown ({arm_reason}), capturing anyway")
 
         # Fetch x, y, yaw from SLAM API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
-                slam_resp = await client.get(fetch_position)
+                with span("fetch_position"):
+                    slam_resp = await client.get(robot.fetch_position, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
             except httpx.HTTPStatusError as e:
@@ -373,6 +562,12 @@ async def create_room_exit_point(request: Request):
                 status_code=status.HTTP_502_BAD_GATEWAY
             )
 
+        # Validate against the map and existing POIs before any upstream write
+        decision = await validate_capture(robot, x, y, f"{room_name}_exit_poi")
+        if decision["decision"] == REJECT and not payload_rec.get("force"):
+            return rejected_pose(decision)
+        log_unaccepted_pose(decision)
+
         # Construct payload for forwarding
         payload = {
             "room_pos_id": value,
@@ -381,28 +576,13 @@ async def create_room_exit_point(request: Request):
             "yaw": float(yaw)
         }
 
-        # Forward request to external API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
-            try:
-                response = await client.post(create_room_exit_position_api, json=payload)
-                response.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                return JSONResponse(
-                    {'status': 'error', 'message': f'API returned {e.response.status_code}', 'data': e.response.text},
-                    status_code=status.HTTP_502_BAD_GATEWAY
-                )
-            except httpx.RequestError as e:
-                return JSONResponse(
-                    {'status': 'error', 'message': f'Failed to reach API: {str(e)}', 'data': None},
-                    status_code=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            
         # Save position and data name to SLAM tech
         payload_slam = {
-            "id": str(uuid.uuid4()),
+            "id": current_poi_id(),
             "metadata": {
                 "display_name": f"{room_name}_exit_poi",
-                "type": "Room_exit"
+                "type": "Room_exit",
+                "room_pos_id": value
             },
             "pose": {
                 "x": x,
@@ -411,17 +591,14 @@ async def create_room_exit_point(request: Request):
             }
         }
 
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
                 # Send POST request instead of GET
-                slam_resp = await client.post(save_location_data, json=payload_slam)
+                with span("save_location_data"):
+                    slam_resp = await client.post(robot.save_location_data, json=payload_slam, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
-
-                return JSONResponse(
-                    {"status": "success", "message": "SLAM data saved successfully", "data": slam_data},
-                    status_code=status.HTTP_200_OK
-                )
+                poi_registry.registry_for(robot.robot_id).upsert(payload_slam)
 
             except httpx.HTTPStatusError as e:
                 return JSONResponse(
@@ -443,11 +620,21 @@ async def create_room_exit_point(request: Request):
                     status_code=status.HTTP_504_GATEWAY_TIMEOUT,
                 )
 
-        print("📡 Forwarded to API:", response.status_code, response.text)
+        # Queue the medicalbot write only once SLAM has the POI, so a failed
+        # capture leaves nothing behind to deliver; the outbox flusher sends it
+        try:
+            with span("outbox_enqueue"):
+                outbox_id = await medicalbot_outbox.put(create_room_exit_position_api, value, payload, trace_headers())
+        except sqlite3.Error as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to queue API write: {str(e)}', 'data': None},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        print("Queued for API:", outbox_id)
 
         return JSONResponse(
-            {'status': 'success', 'message': 'Entry point position created successfully.', 'data': payload},
-            status_code=status.HTTP_201_CREATED
+            {"status": "success", "message": "SLAM data saved successfully", "data": slam_data, "validation": decision},
+            status_code=status.HTTP_200_OK
         )
 
     except Exception as e:
@@ -492,7 +679,8 @@ async def skip_slot_receiver(request: Request):
     try:
         # Parse JSON payload
         try:
-            payload_rec = await request.json()
+            with span("json_parse"):
+                payload_rec = await request.json()
         except Exception:
             return JSONResponse(
                 {'status': 'error', 'message': 'Invalid JSON payload.', 'data': None},
@@ -555,7 +743,8 @@ async def demo_completed_receiver(request: Request):
     try:
         # Parse JSON payload
         try:
-            payload_rec = await request.json()
+            with span("json_parse"):
+                payload_rec = await request.json()
         except Exception:
             return JSONResponse(
                 {'status': 'error', 'message': 'Invalid JSON payload.', 'data': None},
@@ -594,7 +783,8 @@ async def demo_volume_receiver(request: Request):
     try:
         # Parse JSON payload
         try:
-            payload_rec = await request.json()
+            with span("json_parse"):
+                payload_rec = await request.json()
         except Exception:
             return JSONResponse(
                 {'status': 'error', 'message': 'Invalid JSON payload.', 'data': None},
@@ -669,13 +859,414 @@ async def health_check():
         status_code=status.HTTP_200_OK
     )
 
+@app.get("/webhook/admission/")
+async def admission_metrics():
+    return JSONResponse(
+        {'status': 'success', 'message': 'Admission metrics', 'data': {name: controller.metrics() for name, controller in admission_controllers.items()}},
+        status_code=status.HTTP_200_OK
+    )
+
+@app.get("/webhook/arm-state/")
+async def arm_state_status():
+    arm_ready, arm_reason = arm_state.check()
+    return JSONResponse(
+        {'status': 'success', 'message': 'Arm state', 'data': {'state': arm_ready, 'reason': arm_reason, 'channels': arm_state.snapshot()}},
+        status_code=status.HTTP_200_OK
+    )
+
+@app.get("/webhook/outbox/")
+async def outbox_status():
+    return JSONResponse(
+        {'status': 'success', 'message': 'Medicalbot outbox', 'data': {**medicalbot_outbox.stats(), 'dead_entries': medicalbot_outbox.dead()}},
+        status_code=status.HTTP_200_OK
+    )
+
+@app.get("/webhook/profiling/")
+async def profiling_status():
+    return JSONResponse(
+        {'status': 'success', 'message': 'Profiler and loop watchdog', 'data': {
+            'config': profiler.config.as_dict(),
+            'profiles': list(profiler.profiles),
+            'watchdog': watchdog.summary(),
+        }},
+        status_code=status.HTTP_200_OK
+    )
+
+@app.post("/webhook/profiling/")
+async def configure_profiling(request: Request):
+    try:
+        payload_rec = await request.json()
+        profiler.config = ProfilerConfig(
+            float(payload_rec.get("sample_rate", 0.0)),
+            payload_rec.get("routes") or [],
+            float(payload_rec.get("interval_ms", profiler.config.interval * 1000)) / 1000,
+        )
+        if "stall_ms" in payload_rec:
+            watchdog.threshold = float(payload_rec["stall_ms"]) / 1000
+    except Exception as e:
+        return JSONResponse(
+            {'status': 'error', 'message': f'Invalid profiling config: {str(e)}', 'data': None},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    return JSONResponse(
+        {'status': 'success', 'message': 'Profiling updated for this worker', 'data': profiler.config.as_dict()},
+        status_code=status.HTTP_200_OK
+    )
+
+@app.get("/webhook/robots/")
+async def robots_health():
+    return JSONResponse(
+        {'status': 'success', 'message': 'Robot registry', 'data': [robot.health() for robot in robot_registry.robots.values()]},
+        status_code=status.HTTP_200_OK
+    )
+
+@app.get("/webhook/map/")
+async def map_info():
+    robot = current_robot()
+    try:
+        # Decoded once per map hash, later calls open the cached grid
+        try:
+            with span("fetch_map_file"):
+                occupancy = await fetch_map(robot)
+        except httpx.HTTPStatusError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'SLAM API returned {e.response.status_code}', 'data': e.response.text},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+        except httpx.RequestError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to reach SLAM API: {str(e)}', 'data': None},
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        except StcmError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Could not decode map: {str(e)}', 'data': None},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+
+        return JSONResponse(
+            {'status': 'success', 'message': 'Map fetched', 'data': occupancy.meta()},
+            status_code=status.HTTP_200_OK
+        )
+    except Exception as e:
+        return JSONResponse(
+            {'status': 'error', 'message': f'Unexpected error: {str(e)}', 'data': None},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@app.get("/webhook/pois/")
+async def list_pois(request: Request):
+    """POIs from the local registry. ?type= (repeatable or comma separated,
+    matches metadata.type), ?prefix= on the display name, ?limit= and the
+    ?cursor= returned as next_cursor by the previous page."""
+    registry = poi_registry.registry_for(current_robot().robot_id)
+    if not registry.loaded:
+        return JSONResponse(
+            {'status': 'error', 'message': 'POI list not loaded yet', 'data': None},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(poi_registry.RETRY_SECONDS)}
+        )
+
+    params = request.query_params
+    types = [t for value in params.getlist("type") for t in value.split(",") if t]
+    try:
+        limit = min(max(1, int(params.get("limit", poi_registry.DEFAULT_PAGE_SIZE))), poi_registry.MAX_PAGE_SIZE)
+        with span("poi_query"):
+            items, next_cursor, total = registry.query(types, params.get("prefix"), params.get("cursor"), limit)
+    except ValueError:
+        return JSONResponse(
+            {'status': 'error', 'message': 'Invalid limit or cursor', 'data': None},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Same registry content and same query -> same ETag
+    etag = f'"{registry.etag}-{hashlib.blake2b(str(request.url.query).encode(), digest_size=4).hexdigest()}"'
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    return JSONResponse(
+        {'status': 'success', 'message': f'{len(items)} of {total} POIs', 'data': {'items': items, 'next_cursor': next_cursor, 'total': total}},
+        status_code=status.HTTP_200_OK,
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@app.get("/webhook/trajectory/")
+async def trajectory(request: Request):
+    """Recorded poses between ?start= and ?end= (epoch seconds, end defaults
+    to now), written by `python pose_trajectory.py record`."""
+    robot = current_robot()
+    try:
+        try:
+            end = float(request.query_params.get("end", time.time()))
+            start = float(request.query_params.get("start", end - 3600))
+        except ValueError:
+            return JSONResponse(
+                {'status': 'error', 'message': 'start and end must be epoch seconds', 'data': None},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        with span("read_trajectory"):
+            samples = await asyncio.to_thread(read_range, robot.robot_id, start, end)
+
+        return JSONResponse(
+            {'status': 'success', 'message': f"{len(samples['t'])} poses", 'data': {key: column.tolist() for key, column in samples.items()}},
+            status_code=status.HTTP_200_OK
+        )
+    except Exception as e:
+        return JSONResponse(
+            {'status': 'error', 'message': f'Unexpected error: {str(e)}', 'data': None},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@app.get("/webhook/poi-distances/")
+async def poi_distances():
+    robot = current_robot()
+    try:
+        try:
+            occupancy = await asyncio.to_thread(open_latest, robot.robot_id)
+            async with robot.session() as client:
+                if occupancy is None:
+                    with span("fetch_map_file"):
+                        occupancy = await fetch_map(robot)
+                with span("fetch_pois"):
+                    slam_resp = await client.get(robot.fetch_pois, headers=trace_headers())
+                slam_resp.raise_for_status()
+                pois = slam_resp.json()
+        except httpx.HTTPStatusError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'SLAM API returned {e.response.status_code}', 'data': e.response.text},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+        except httpx.RequestError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to reach SLAM API: {str(e)}', 'data': None},
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        except StcmError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Could not decode map: {str(e)}', 'data': None},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+
+        if not isinstance(pois, list):
+            return JSONResponse(
+                {'status': 'error', 'message': 'SLAM API did not return a POI list.', 'data': pois},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+
+        service = poi_distance_services.get(robot.robot_id)
+        if service is None or service.occupancy.map_hash != occupancy.map_hash:
+            service = poi_distance_services[robot.robot_id] = PoiDistanceService(occupancy)
+
+        # Only new or moved POIs are recomputed; keep the wavefront off the event loop
+        names, xy = parse_pois(pois)
+        with span("poi_distance_update"):
+            await asyncio.to_thread(service.update, names, xy)
+
+        return JSONResponse(
+            {'status': 'success', 'message': 'POI distances computed', 'data': service.as_dict()},
+            status_code=status.HTTP_200_OK
+        )
+    except Exception as e:
+        return JSONResponse(
+            {'status': 'error', 'message': f'Unexpected error: {str(e)}', 'data': None},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@app.post("/webhook/validate-poses/")
+async def validate_poses(request: Request):
+    robot = current_robot()
+    try:
+        try:
+            with span("json_parse"):
+                payload_rec = await request.json()
+            poses = payload_rec["poses"]
+            xs = [float(pose["x"]) for pose in poses]
+            ys = [float(pose["y"]) for pose in poses]
+            radius = float(payload_rec.get("radius", DUPLICATE_RADIUS))
+        except Exception:
+            return JSONResponse(
+                {'status': 'error', 'message': 'Expected {"poses": [{"x": .., "y": ..}, ...], "radius": ..}', 'data': None},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < radius <= MAX_DUPLICATE_RADIUS:
+            return JSONResponse(
+                {'status': 'error', 'message': f'radius must be greater than 0 and at most {MAX_DUPLICATE_RADIUS} m', 'data': None},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        validator = await pose_validator(robot)
+        if validator is None:
+            return JSONResponse(
+                {'status': 'error', 'message': 'No map cached yet, call /webhook/map/ first', 'data': None},
+                status_code=status.HTTP_409_CONFLICT
+            )
+
+        try:
+            async with robot.session() as client:
+                with span("fetch_pois"):
+                    slam_resp = await client.get(robot.fetch_pois, headers=trace_headers())
+                slam_resp.raise_for_status()
+                pois = slam_resp.json()
+        except httpx.HTTPStatusError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'SLAM API returned {e.response.status_code}', 'data': e.response.text},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+        except httpx.RequestError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to reach SLAM API: {str(e)}', 'data': None},
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+
+        names, xy = parse_pois(pois if isinstance(pois, list) else [])
+        with span("validate_pose"):
+            decisions = validator.check(xs, ys, names, xy, radius=radius)
+
+        return JSONResponse(
+            {'status': 'success', 'message': 'Poses validated', 'data': decisions},
+            status_code=status.HTTP_200_OK
+        )
+    except Exception as e:
+        return JSONResponse(
+            {'status': 'error', 'message': f'Unexpected error: {str(e)}', 'data': None},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@app.post("/webhook/reanchor-pois/")
+async def reanchor_pois(request: Request):
+    """Move every POI by one rigid transform after re-mapping. Body is either
+    {"transform": {"x", "y", "yaw"}} or {"anchors": [{"name", "x", "y"}, ...]}
+    with the new positions of at least two known POIs; dry_run (default true)
+    only returns the diff."""
+    robot = current_robot()
+    try:
+        try:
+            with span("json_parse"):
+                payload_rec = await request.json()
+            transform = payload_rec.get("transform")
+            anchors = payload_rec.get("anchors")
+            dry_run = bool(payload_rec.get("dry_run", True))
+            if transform is not None:
+                tx, ty, theta = float(transform["x"]), float(transform["y"]), float(transform["yaw"])
+            elif not anchors:
+                raise ValueError
+        except Exception:
+            return JSONResponse(
+                {'status': 'error', 'message': 'Expected {"transform": {"x", "y", "yaw"}} or {"anchors": [{"name", "x", "y"}, ...]}', 'data': None},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            async with robot.session() as client:
+                with span("fetch_pois"):
+                    slam_resp = await client.get(robot.fetch_pois, headers=trace_headers())
+                slam_resp.raise_for_status()
+                pois = slam_resp.json()
+        except httpx.HTTPStatusError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'SLAM API returned {e.response.status_code}', 'data': e.response.text},
+                status_code=status.HTTP_502_BAD_GATEWAY
+            )
+        except httpx.RequestError as e:
+            return JSONResponse(
+                {'status': 'error', 'message': f'Failed to reach SLAM API: {str(e)}', 'data': None},
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        pois = pois if isinstance(pois, list) else []
+
+        if transform is None:
+            names, xy = parse_pois(pois)
+            try:
+                src = [xy[names.index(str(anchor["name"]).strip().lower())] for anchor in anchors]
+                dst = [(float(anchor["x"]), float(anchor["y"])) for anchor in anchors]
+                tx, ty, theta = poi_reanchor.estimate_rigid_transform(src, dst)
+            except (KeyError, TypeError, ValueError) as e:
+                return JSONResponse(
+                    {'status': 'error', 'message': f'Cannot estimate transform from anchors: {e}', 'data': None},
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+
+        with span("reanchor_plan"):
+            changes = poi_reanchor.plan(pois, tx, ty, theta)
+        data = {'transform': {'x': tx, 'y': ty, 'yaw': theta}, 'dry_run': dry_run, 'changes': changes}
+
+        if dry_run:
+            return JSONResponse(
+                {'status': 'success', 'message': f'{len(changes)} POIs would move', 'data': data},
+                status_code=status.HTTP_200_OK
+            )
+
+        backend_urls = {
+            "Slot": create_slot_position_api,
+            "Room_entry": create_room_entry_position_api,
+            "Room_exit": create_room_exit_position_api,
+        }
+        with span("reanchor_push", pois=len(changes)):
+            data['results'] = await poi_reanchor.push(robot, changes, backend_urls, medicalbot_outbox)
+        registry = poi_registry.registry_for(robot.robot_id)
+        for change, result in zip(changes, data['results']):
+            if result['slam'] == 'ok':
+                registry.upsert({"id": change["id"], "metadata": change["metadata"], "pose": change["after"]})
+
+        summary = data['summary'] = poi_reanchor.summarize(data['results'])
+        message = f"{len(changes) - summary['failed']} of {len(changes)} POIs re-anchored"
+        if summary['unlinked']:
+            # Moved in SLAM, but medicalbot still has the old pose for these
+            message += f", {summary['unlinked']} not updated in medicalbot (no slot_id/room_pos_id, capture them again)"
+        return JSONResponse(
+            {
+                'status': 'error' if summary['failed'] else 'partial' if summary['unlinked'] else 'success',
+                'message': message,
+                'data': data,
+            },
+            status_code=status.HTTP_207_MULTI_STATUS if summary['failed'] or summary['unlinked'] else status.HTTP_200_OK
+        )
+    except Exception as e:
+        return JSONResponse(
+            {'status': 'error', 'message': f'Unexpected error: {str(e)}', 'data': None},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@app.get("/webhook/robot-state/")
+async def robot_state():
+    snapshot = shared_state.read(current_robot().robot_id) if shared_state is not None else None
+    if snapshot is None:
+        return JSONResponse(
+            {'status': 'error', 'message': 'Shared robot state is not available', 'data': None},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return JSONResponse(
+        {'status': 'success', 'message': 'Robot state fetched', 'data': snapshot},
+        status_code=status.HTTP_200_OK
+    )
+
 @app.get("/webhook/battery-status/")
 async def battery_status():
+    robot = current_robot()
     try:
+        # Serve the poller's copy when it is fresh enough, no upstream call
+        if shared_state is not None:
+            snapshot = shared_state.read(robot.robot_id)
+            if snapshot and snapshot["battery_ts"] and time.time() - snapshot["battery_ts"] < BATTERY_MAX_AGE:
+                return JSONResponse(
+                    {'status': 'success', 'message': 'Battery status fetched', 'data': snapshot["battery"]},
+                    status_code=status.HTTP_200_OK
+                )
+
+        # Then the sampler's latest reading
+        history = battery_telemetry.history_for(robot.robot_id)
+        if history.latest is not None and time.time() - history.last_t() < BATTERY_MAX_AGE:
+            return JSONResponse(
+                {'status': 'success', 'message': 'Battery status fetched', 'data': history.latest},
+                status_code=status.HTTP_200_OK
+            )
+
          # Fetch x, y, yaw from SLAM API
-        async with httpx.AsyncClient(verify=False, timeout=10) as client:
+        async with robot.session() as client:
             try:
-                slam_resp = await client.get(fetch_battery_status)
+                with span("fetch_battery_status"):
+                    slam_resp = await client.get(robot.fetch_battery_status, headers=trace_headers())
                 slam_resp.raise_for_status()
                 slam_data = slam_resp.json()
             except httpx.HTTPStatusError as e:
@@ -700,26 +1291,16 @@ async def battery_status():
         )
     
 @app.get("/webhook/battery-health/")
-async def battery_status():
+async def battery_health():
     try:
-        
-        charge = 80
-        voltage = 23
-        current = 64
-        power = 23
-        temperature = 32
-        time_left = 1234
-        count = 134
-
-        battery_data = {
-        "charge": charge,
-        "voltage": voltage,
-        "current": current,
-        "power": power,
-        "temperature": temperature,
-        "time_left": time_left,
-        "count": count
-    }
+        # Aggregates over the sampled history only, never an upstream call
+        with span("battery_health"):
+            battery_data = battery_telemetry.history_for(current_robot().robot_id).health()
+        if battery_data is None:
+            return JSONResponse(
+                {'status': 'error', 'message': 'No battery samples yet', 'data': None},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
         return JSONResponse(
             {'status': 'success', 'message': 'Battery status fetched', 'data': battery_data},
@@ -731,5 +1312,69 @@ async def battery_status():
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+async def run_poller_background(state):
+    """Upstream work the poller process does once for all workers."""
+    arm_state.listener = state.write_arm
+    outbox = Outbox()
+    try:
+        await asyncio.gather(arm_state_module.run_arm_channels(), run_flusher(outbox, medicalbot_session))
+    finally:
+        outbox.close()
+        await close_medicalbot()
+
+def run_multi_worker(workers: int, host: str, port: int):
+    robot_ids = list(robot_registry.robots)
+    state = shared_state_module.SharedRobotState.create(robot_ids)
+    # Every worker and the poller call the robots; split each robot's limit among them
+    share = workers + 1
+    os.environ[ADMISSION_SHARE_ENV] = str(share)
+    for robot in robot_registry.robots.values():
+        if robot.max_concurrency < share:
+            print(f"⚠️ {robot.robot_id}: max_concurrency {robot.max_concurrency} is below {share} processes, "
+                  f"it may see up to {share} concurrent calls; use fewer workers")
+    poller = multiprocessing.Process(
+        target=shared_state_module.run_poller,
+        args=(state.shm.name, ROBOTS_FILE, slam_tech_base_url, run_poller_background),
+        name="robot-state-poller",
+        daemon=True,
+    )
+    poller.start()
+
+    # Workers re-import this module and attach to the segment by name
+    os.environ[shared_state_module.SHM_ENV] = state.shm.name
+    try:
+        uvicorn.run("webhook_server:app", host=host, port=port, workers=workers)
+    finally:
+        poller.terminate()
+        state.close()
+        state.unlink()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Robot webhook server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="more than 1 starts a shared-memory state poller and that many uvicorn workers")
+    parser.add_argument("--capture", metavar="FILE", help="record incoming webhook requests for traffic_capture.py replay")
+    parser.add_argument("--profile", metavar="RATE[:ROUTES]", help="profile this fraction of requests, optionally only these comma-separated routes")
+    parser.add_argument("--arm-unknown", choices=[arm_state_module.PROCEED, arm_state_module.REFUSE],
+                        help="room entry/exit captures while the arm state is unknown: proceed with a warning (default) or refuse unless forced")
+    args = parser.parse_args()
+
+    if args.capture:
+        # Through the environment so multi-worker processes pick it up too
+        os.environ[CAPTURE_ENV] = args.capture
+        if args.workers == 1:
+            app.add_middleware(CaptureMiddleware, path=args.capture)
+
+    if args.arm_unknown:
+        os.environ[arm_state_module.ARM_UNKNOWN_ENV] = args.arm_unknown
+
+    if args.profile:
+        os.environ[PROFILE_ENV] = args.profile
+        profiler.config = ProfilerConfig.from_env()
+
+    if args.workers > 1:
+        run_multi_worker(args.workers, args.host, args.port)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
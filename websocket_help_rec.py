@@ -1,22 +1,11 @@
 import asyncio
-import websockets
-import json
+from priority_lane import PRIORITY_CHANNELS, run_channel
 
 async def receive_chars():
-    uri = "ws://192.168.1.57:8000/ws/socket-server/help/"
+    uri = PRIORITY_CHANNELS["help"]
 
-    try:
-        async with websockets.connect(uri, ping_interval=20, ping_timeout=30) as websocket:
-            print("Connected to WebSocket server. Waiting for messages...")
-
-            while True:
-                message = await websocket.recv()
-                data = json.loads(message)
-                print(f"Received: {data}")
-    except websockets.exceptions.ConnectionClosed as e:
-        print(f"WebSocket connection closed: {e.code} - {e.reason}")
-    except Exception as e:
-        print(f"Unhandled error: {e}")
+    # Dedicated connection with immediate dispatch and latency stamping
+    await run_channel("help", uri)
 
 if __name__ == "__main__":
-    asyncio.run(receive_chars())
\ No newline at end of file
+    asyncio.run(receive_chars())
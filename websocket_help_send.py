@@ -1,6 +1,7 @@
 import asyncio
 import websockets
 import json
+from priority_lane import stamp_event
 
 URI = "ws://192.168.1.57:8000/ws/socket-server/help/"
 
@@ -10,6 +11,7 @@ async def send_input(websocket):
         "room": "room_1",
         "bed": "bed_2"
     }
+    payload = stamp_event(payload)
 
     await websocket.send(json.dumps(payload))
     print(f"Sent: {payload}")
@@ -1,9 +1,11 @@
 import asyncio
 import websockets
 import json
+from flight_recorder import open_recorder
 
 async def receive_chars():
     uri = "ws://192.168.1.73:8000/ws/socket-server/joint-position-value/"
+    recorder = open_recorder("joint-position-value")
 
     try:
         async with websockets.connect(uri, ping_interval=20, ping_timeout=30) as websocket:
@@ -11,6 +13,8 @@ async def receive_chars():
 
             while True:
                 message = await websocket.recv()
+                if recorder:
+                    recorder.record(message)
                 data = json.loads(message)
                 print(f"Received: {data}")
     except websockets.exceptions.ConnectionClosed as e:
@@ -1,9 +1,18 @@
 import asyncio
 import websockets
 import json
+import time
+from flight_recorder import open_recorder
+from joint_stats import JointStats
+
+VELOCITY_LIMIT = 3.0       # rad/s, per joint
+REPORT_SECONDS = 10.0
 
 async def receive_chars():
     uri = "ws://192.168.1.73:8000/ws/socket-server/joint-velocity-value/"
+    recorder = open_recorder("joint-velocity-value")
+    stats = JointStats("velocity", limits=VELOCITY_LIMIT)
+    last_report = time.monotonic()
 
     try:
         async with websockets.connect(uri, ping_interval=20, ping_timeout=30) as websocket:
@@ -11,8 +20,17 @@ async def receive_chars():
 
             while True:
                 message = await websocket.recv()
+                if recorder:
+                    recorder.record(message)
                 data = json.loads(message)
                 print(f"Received: {data}")
+
+                # Rolling stats across all joints at once, flags as soon as a sample is off
+                for event in stats.update_from(data):
+                    print(f"⚠️ {event['type']} {event['field']} joint {event['joint']}: {event}")
+                if time.monotonic() - last_report >= REPORT_SECONDS:
+                    print(f"Stats: {stats.snapshot()}")
+                    last_report = time.monotonic()
     except websockets.exceptions.ConnectionClosed as e:
         print(f"WebSocket connection closed: {e.code} - {e.reason}")
     except Exception as e: